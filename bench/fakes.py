@@ -0,0 +1,147 @@
+import time
+import zlib
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Any, Dict
+
+from aiohttp import web
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMediaGroup, SendMessage, SendPhoto
+from aiogram.types import CallbackQuery, Chat, Message, PhotoSize, Update, User
+
+_update_ids = itertools.count(1)
+_file_ids = itertools.count(1)
+
+
+class FakeSession(BaseSession):
+    """Сессия бота без сети: отвечает правдоподобными объектами и считает вызовы"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+
+    def _photo(self) -> PhotoSize:
+        return PhotoSize(file_id=f"FID{next(_file_ids)}", file_unique_id="u", width=128, height=192)
+
+    async def make_request(self, bot, method, timeout=None) -> Any:
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat = Chat(id=getattr(method, 'chat_id', None) or 1, type='private')
+        now = datetime.now()
+        if isinstance(method, SendPhoto):
+            return Message(message_id=1, date=now, chat=chat, photo=[self._photo()])
+        if isinstance(method, SendMediaGroup):
+            return [
+                Message(message_id=i, date=now, chat=chat, photo=[self._photo()])
+                for i, _ in enumerate(method.media)
+            ]
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return Message(message_id=1, date=now, chat=chat, text=method.text)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self) -> None:
+        pass
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name=f"user{user_id}")
+
+
+def message_update(user_id: int, text: str) -> Update:
+    update_id = next(_update_ids)
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=datetime.now(),
+        chat=Chat(id=user_id, type='private'),
+        from_user=_user(user_id),
+        text=text
+    ))
+
+
+def callback_update(user_id: int, data: str) -> Update:
+    update_id = next(_update_ids)
+    return Update(update_id=update_id, callback_query=CallbackQuery(
+        id=str(update_id),
+        chat_instance=str(user_id),
+        from_user=_user(user_id),
+        data=data,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type='private'),
+            from_user=User(id=1, is_bot=True, first_name='bot'),
+            text='menu'
+        )
+    ))
+
+
+class StubGoogleBooks:
+    """Локальный HTTP-сервер в формате Google Books с заданной задержкой ответа"""
+
+    def __init__(self, latency: float = 0.0, total_items: int = 400):
+        self.latency = latency
+        self.total_items = total_items
+        self.requests = 0
+        self._runner = None
+        self.url = ''
+
+    def _volume(self, query: str, index: int) -> Dict:
+        return {
+            "id": f"{zlib.crc32(query.encode()):08x}-{index}",
+            "volumeInfo": {
+                "title": f"{query.split(':')[-1].title()} volume {index}",
+                "authors": [f"Author {index % 37}"],
+                "pageCount": 100 + index,
+                "description": f"A synthetic english description of volume {index} for load testing.",
+                "imageLinks": {"thumbnail": f"http://covers.invalid/{index}.jpg"}
+            }
+        }
+
+    async def _volumes(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        query = request.query['q']
+        start = int(request.query.get('startIndex', 0))
+        count = int(request.query.get('maxResults', 40))
+        if start >= self.total_items:
+            return web.json_response({"totalItems": self.total_items})
+        items = [self._volume(query, index) for index in range(start, min(start + count, self.total_items))]
+        return web.json_response({"totalItems": self.total_items, "items": items})
+
+    async def start(self, host: str = '127.0.0.1') -> str:
+        app = web.Application()
+        app.router.add_get('/volumes', self._volumes)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/volumes"
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+
+class StubTranslator:
+    """Замена синхронного переводчика: спит заданное время и переворачивает текст"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, text: str, target_lang: str) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return text[::-1]
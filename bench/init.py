@@ -0,0 +1,3 @@
+from .fakes import FakeSession, StubGoogleBooks, StubTranslator, message_update, callback_update
+
+__all__ = ['FakeSession', 'StubGoogleBooks', 'StubTranslator', 'message_update', 'callback_update']
@@ -0,0 +1,257 @@
+"""
+Нагрузочный прогон настоящего диспетчера на синтетических пользователях.
+
+Каждый пользователь проходит сценарий /start -> жанр -> «Следующая» x N -> описание -> в избранное.
+Telegram, Google Books и переводчик заменены локальными заглушками, хранилища пишут во временный каталог.
+
+    python -m bench.load_test --users 2000 --concurrency 200
+    python -m bench.load_test --storage sqlite --workers 4
+    python -m bench.load_test --save-baseline bench/baseline.json
+    python -m bench.load_test --baseline bench/baseline.json
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+
+import bot as bot_module
+import services.api_client as api_client
+import utils.translator as translator
+from bench.fakes import FakeSession, StubGoogleBooks, StubTranslator, callback_update, message_update
+from keyboards.builders import BOOK_BUTTONS
+from keyboards.callback_data import GENRE_NAMES, BookAction, GenreCallback
+from services.database import JSONDatabase
+from services.fsm_storage import SQLiteStorage
+from services.genre_cache import genre_cache
+from services.sender import send_scheduler
+from services.sqlite_database import SQLiteDatabase
+from utils.metrics import storage_flush_duration
+
+# Метрики, по которым сравнение с базовой линией: больше - лучше или меньше - лучше
+HIGHER_IS_BETTER = {'updates_per_sec'}
+COMPARED = ('updates_per_sec', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb', 'storage_bytes_written')
+
+BUTTONS = {action: ru_text for action, ru_text, _ in BOOK_BUTTONS}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[index]
+
+
+def written_bytes() -> Optional[int]:
+    """Байты, записанные процессом в файлы (Linux, /proc/self/io)"""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('write_bytes:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+
+async def run_user(dp, bot: Bot, user_id: int, next_count: int, latencies: List[float]) -> None:
+    """Сценарий одного пользователя; обновления одного чата идут строго по очереди, как в Telegram"""
+    genre_id = user_id % len(GENRE_NAMES)
+    updates = [
+        lambda: message_update(user_id, '/start'),
+        lambda: callback_update(user_id, GenreCallback(id=genre_id).pack()),
+        *[lambda: message_update(user_id, BUTTONS[BookAction.NEXT])] * next_count,
+        lambda: message_update(user_id, BUTTONS[BookAction.DESCRIPTION]),
+        lambda: message_update(user_id, BUTTONS[BookAction.ADD_FAVORITE]),
+    ]
+    for make_update in updates:
+        update = make_update()
+        started = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_shard(args, data_dir: Path, shard: int = 0, barrier=None) -> Dict:
+    """Прогон доли пользователей (user_id % workers == shard) через отдельный диспетчер"""
+    stub = StubGoogleBooks(latency=args.upstream_latency)
+    # Общий клиент направляется на заглушку, кэш переводов - во временный каталог
+    api_client.books_client.base_url = await stub.start()
+    api_client.books_client.api_key = None
+    stub_translator = StubTranslator(latency=args.translate_latency)
+    translator._translate = stub_translator
+    translator.translation_cache = bot_module.translation_cache = translator.TranslationCache(
+        data_dir / f'translations{shard}.json'
+    )
+    # Кэш жанров общий для процессов прогона, как и у воркеров бота
+    genre_cache.filename = data_dir / 'genre_cache.sqlite'
+
+    if args.storage == 'sqlite':
+        # Как и воркеры бота, процессы бенчмарка пишут в общие файлы SQLite
+        db = SQLiteDatabase(data_dir / 'books_data.sqlite', shared=args.workers > 1)
+    else:
+        db = JSONDatabase(data_dir / 'books_data.json')
+    storage = SQLiteStorage(data_dir / 'fsm.sqlite')
+
+    session = FakeSession(latency=args.send_latency)
+    bot = Bot(token='42:TEST', session=session)
+    if args.scheduler:
+        bot.session.middleware(send_scheduler)
+    dp = bot_module.create_dispatcher(db, storage)
+    background = await bot_module.start_services(db, storage, warm=shard == 0)
+
+    latencies: List[float] = []
+    # --concurrency общий на прогон, иначе с воркерами одновременно активных пользователей в N раз больше
+    semaphore = asyncio.Semaphore(max(1, args.concurrency // args.workers))
+
+    async def limited(user_id: int) -> None:
+        async with semaphore:
+            await run_user(dp, bot, user_id, args.next, latencies)
+
+    user_ids = [100000 + index for index in range(args.users) if index % args.workers == shard]
+    if barrier is not None:
+        # Все процессы начинают одновременно, иначе время прогона включит их запуск
+        await asyncio.to_thread(barrier.wait)
+    io_before = written_bytes()
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+
+    await bot_module.stop_services(background, bot, db, storage)
+    await stub.close()
+    io_after = written_bytes()
+
+    return {
+        'latencies': latencies,
+        'elapsed': elapsed,
+        # ru_maxrss в Linux - килобайты
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'bytes_written': io_after - io_before if io_before is not None and io_after is not None else None,
+        'upstream_requests': stub.requests,
+        'translate_calls': stub_translator.calls,
+        'telegram_calls': sum(session.calls.values()),
+        # Фиксации хранилища: в режиме воркеров - на каждую запись, под общей блокировкой файла
+        'commits': storage_flush_duration.count(),
+        'commit_sec': storage_flush_duration.count() * storage_flush_duration.average(),
+    }
+
+
+def shard_process(args, data_dir: Path, shard: int, barrier, results) -> None:
+    """Точка входа процесса бенчмарка"""
+    results.put(asyncio.run(run_shard(args, data_dir, shard, barrier)))
+
+
+def run_processes(args, data_dir: Path) -> List[Dict]:
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=shard_process, args=(args, data_dir, shard, barrier, results))
+        for shard in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    # Результаты забираются до join, иначе процесс может не завершиться с непустой очередью
+    shards = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return shards
+
+
+def run(args) -> Dict:
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix='bookbot-bench-'))
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.workers > 1:
+        shards = run_processes(args, data_dir)
+    else:
+        shards = [asyncio.run(run_shard(args, data_dir))]
+
+    latencies = sorted(latency for shard in shards for latency in shard['latencies'])
+    # Процессы стартуют одновременно, время прогона - по самому медленному
+    elapsed = max(shard['elapsed'] for shard in shards)
+    written = [shard['bytes_written'] for shard in shards]
+    result = {
+        'users': args.users,
+        'workers': args.workers,
+        'updates': len(latencies),
+        'elapsed_sec': round(elapsed, 3),
+        'updates_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        # Суммарно по всем процессам
+        'peak_rss_mb': round(sum(shard['peak_rss_mb'] for shard in shards), 1),
+        'storage_bytes_written': sum(written) if None not in written else directory_size(data_dir),
+        'storage_bytes_on_disk': directory_size(data_dir),
+        'upstream_requests': sum(shard['upstream_requests'] for shard in shards),
+        'translate_calls': sum(shard['translate_calls'] for shard in shards),
+        'telegram_calls': sum(shard['telegram_calls'] for shard in shards),
+        'storage_commits': sum(shard['commits'] for shard in shards),
+        'storage_commit_ms_total': round(sum(shard['commit_sec'] for shard in shards) * 1000, 1),
+        'storage': args.storage,
+    }
+    if not args.keep_data and not args.data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return result
+
+
+def compare(result: Dict, baseline: Dict) -> List[str]:
+    lines = []
+    for key in COMPARED:
+        old, new = baseline.get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        better = change > 0 if key in HIGHER_IS_BETTER else change < 0
+        mark = '+' if better else ('-' if abs(change) >= 1 else ' ')
+        lines.append(f"{mark} {key:<24} {old:>14} -> {new:<14} ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон диспетчера бота')
+    parser.add_argument('--users', type=int, default=1000, help='число синтетических пользователей')
+    parser.add_argument('--concurrency', type=int, default=100, help='одновременно активных пользователей')
+    parser.add_argument('--next', type=int, default=10, help='сколько раз пользователь листает книги')
+    parser.add_argument('--storage', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--workers', type=int, default=1, help='число процессов, пользователи делятся по user_id')
+    parser.add_argument('--scheduler', action='store_true', help='пропускать отправки через очередь с лимитами Telegram')
+    parser.add_argument('--upstream-latency', type=float, default=0.05, help='задержка заглушки Google Books, с')
+    parser.add_argument('--translate-latency', type=float, default=0.1, help='задержка заглушки переводчика, с')
+    parser.add_argument('--send-latency', type=float, default=0.0, help='задержка ответа Telegram, с')
+    parser.add_argument('--data-dir', help='каталог для файлов хранилища (по умолчанию временный)')
+    parser.add_argument('--keep-data', action='store_true', help='не удалять временный каталог')
+    parser.add_argument('--baseline', help='JSON с результатами предыдущего прогона для сравнения')
+    parser.add_argument('--save-baseline', help='сохранить результаты прогона в JSON')
+    args = parser.parse_args()
+    if args.workers > 1 and args.storage != 'sqlite':
+        parser.error('--workers > 1 требует --storage sqlite')
+
+    result = run(args)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nСравнение с {args.baseline}:")
+        print("\n".join(compare(result, baseline)))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,376 @@
+import os
+import json
+import time
+import signal
 import asyncio
 import logging
+import multiprocessing
+import multiprocessing.connection
+from queue import Empty
+from typing import List, Optional
+
+from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage
+from aiogram.fsm.storage.memory import SimpleEventIsolation
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 
-from config.settings import TELEGRAM_TOKEN
+from config.settings import (
+    TELEGRAM_TOKEN,
+    BOT_MODE,
+    BOT_WORKERS,
+    BOT_WORKER_MIN_UPTIME,
+    STORAGE_BACKEND,
+    SEND_GLOBAL_RATE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_SHUTDOWN_TIMEOUT,
+    METRICS_HOST,
+    METRICS_PORT,
+    LOG_FILE
+)
+from middlewares.language import LanguageMiddleware
+from middlewares.log_context import LogContextMiddleware
+from middlewares.metrics import HandlerTimingMiddleware
 from routers import commands, callbacks
+from services.api_client import books_client
+from services.broadcast import broadcaster
+from services.database import Database, create_database
+from services.fsm_storage import SQLiteStorage, create_fsm_storage
+from services.genre_cache import genre_cache
+from services.prefetch import GenreWarmer
+from services.recommendations import co_favorites
+from services.sender import TokenBucket, send_scheduler
 from utils.logger import setup_logger
+from utils.metrics import registry
+from utils.translator import translation_cache
 
+logger = logging.getLogger(__name__)
 
-async def main():
-    # Настройка логгера
-    setup_logger()
-    
-    # Инициализация бота и диспетчера
-    bot = Bot(token=TELEGRAM_TOKEN)
-    dp = Dispatcher()
-    
-    # Подключение роутеров
-    dp.include_router(commands.router) 
+# Фоновые задачи, запущенные вместе с приложением вебхука
+BACKGROUND_TASKS = web.AppKey('background', list)
+
+
+def create_dispatcher(
+    db: Database,
+    storage: BaseStorage,
+    events_isolation: Optional[BaseEventIsolation] = None
+) -> Dispatcher:
+    """Диспетчер с подключенными роутерами и общим хранилищем в DI"""
+    dp = Dispatcher(storage=storage, events_isolation=events_isolation, db=db)
+    # Язык пользователя читается один раз на обновление
+    dp.update.outer_middleware(LanguageMiddleware())
+    # Контекст логов: обновление и пользователь, затем имя выбранного хендлера
+    log_context = LogContextMiddleware()
+    dp.update.outer_middleware(log_context)
+    dp.message.middleware(log_context)
+    dp.callback_query.middleware(log_context)
+    # Время работы каждого хендлера
+    timing = HandlerTimingMiddleware()
+    dp.message.middleware(timing)
+    dp.callback_query.middleware(timing)
+    dp.include_router(commands.router)
     dp.include_router(callbacks.router)
+    return dp
+
+
+async def start_services(db: Database, storage: BaseStorage, warm: bool = True) -> List[asyncio.Task]:
+    """Запуск общих ресурсов и фоновых задач"""
+    # Пул соединений к Google Books живет все время работы бота
+    await books_client.start()
+
+    # Фоновая запись накопленных изменений
+    background = [
+        asyncio.create_task(db.flush_periodically()),
+        asyncio.create_task(translation_cache.save_periodically()),
+        # Индекс рекомендаций живет в памяти и собирается из избранного при каждом запуске
+        asyncio.create_task(co_favorites.rebuild(db)),
+    ]
+    if warm:
+        # Прогрев и обновление кэша жанров до того, как он истечет
+        background.append(asyncio.create_task(GenreWarmer(db).run()))
+    if isinstance(storage, SQLiteStorage):
+        background.append(asyncio.create_task(storage.flush_periodically()))
+        background.append(asyncio.create_task(storage.evict_periodically()))
+    return background
+
+
+async def stop_services(background: List[asyncio.Task], bot: Bot, db: Database, storage: BaseStorage) -> None:
+    """Остановка фоновых задач и сброс всех данных на диск"""
+    # Рассылка останавливается первой: ее прогресс сохранен, после запуска она продолжится
+    await broadcaster.stop()
+    for task in background:
+        task.cancel()
+    db.close()
+    await storage.close()
+    translation_cache.save()
+    genre_cache.close()
+    await books_client.close()
+    await send_scheduler.close()
+    await bot.session.close()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Метрики процесса в текстовом формате Prometheus"""
+    return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+
+async def start_metrics_server(port: int = METRICS_PORT) -> web.AppRunner:
+    """Отдельный локальный сервер /metrics для режима polling"""
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, port).start()
+    logger.info(f"Метрики доступны на {METRICS_HOST}:{port}/metrics")
+    return runner
 
-    
-    
-    # Запуск поллинга
+
+async def run_polling(bot: Bot, dp: Dispatcher, db: Database, storage: BaseStorage) -> None:
+    background = await start_services(db, storage)
+    broadcaster.resume(bot, db)
+    metrics_runner = await start_metrics_server() if METRICS_PORT else None
     try:
         await dp.start_polling(bot)
     finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await stop_services(background, bot, db, storage)
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, db: Database, storage: BaseStorage) -> web.Application:
+    """aiohttp-приложение для приема обновлений вебхуком"""
+    app = web.Application()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'send_queue': send_scheduler.queue_depth})
+
+    async def on_startup(app: web.Application) -> None:
+        app[BACKGROUND_TASKS] = await start_services(db, storage)
+        broadcaster.resume(bot, db)
+        if WEBHOOK_URL:
+            await bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET or None)
+
+    async def on_cleanup(app: web.Application) -> None:
+        # on_cleanup выполняется после того, как сервер дождался обработки текущих запросов
+        await stop_services(app[BACKGROUND_TASKS], bot, db, storage)
+
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', metrics_handler)
+    # Обработка внутри запроса: незавершенные хендлеры дожидаются при остановке сервера
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=WEBHOOK_SECRET or None
+    ).register(app, path=WEBHOOK_PATH)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, db: Database, storage: BaseStorage) -> None:
+    app = create_webhook_app(bot, dp, db, storage)
+    runner = web.AppRunner(app, shutdown_timeout=WEBHOOK_SHUTDOWN_TIMEOUT)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info(f"Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+def shard_of(update: Update, count: int) -> int:
+    """Номер воркера для обновления: все обновления одного пользователя попадают в один процесс"""
+    event = getattr(update, update.event_type, None) if update.event_type else None
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id % count
+    chat = getattr(event, 'chat', None)
+    return chat.id % count if chat is not None else 0
+
+
+def run_worker(index: int, count: int, updates: multiprocessing.Queue) -> None:
+    """Точка входа процесса-воркера"""
+    # Ctrl+C получает вся группа процессов; воркер завершается по сигналу от главного процесса
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(worker_main(index, count, updates))
+
+
+async def worker_main(index: int, count: int, updates: multiprocessing.Queue) -> None:
+    """Воркер: обрабатывает свою долю пользователей из очереди главного процесса"""
+    # Свой файл логов по номеру, даже если воркер запущен не лаунчером
+    setup_logger(LOG_FILE.with_name(f"bot.worker{index}.log"))
+    # Общий SQLite-файл: каждая запись фиксируется сразу и видна остальным воркерам
+    db = create_database(shared=True)
+    storage = create_fsm_storage()
+
+    bot = Bot(token=TELEGRAM_TOKEN)
+    # Глобальный лимит Telegram делится между воркерами, лимиты чатов - нет: чат живет в одном воркере
+    rate = SEND_GLOBAL_RATE / count
+    send_scheduler.global_bucket = TokenBucket(rate, rate)
+    bot.session.middleware(send_scheduler)
+    # Обновления одного пользователя обрабатываются строго по очереди
+    dp = create_dispatcher(db, storage, events_isolation=SimpleEventIsolation())
+
+    # Жанры прогревает только первый воркер, чтобы не умножать запросы к Google Books
+    background = await start_services(db, storage, warm=index == 0)
+    # Индекс рекомендаций у каждого воркера свой: избранное остальных подхватывается из общего файла
+    background.append(asyncio.create_task(co_favorites.follow_workers(db, index, count)))
+    # Прерванную рассылку продолжает воркер администратора, который ее начал
+    if broadcaster.state and broadcaster.state['admin_chat_id'] % count == index:
+        broadcaster.resume(bot, db)
+    metrics_runner = await start_metrics_server(METRICS_PORT + 1 + index) if METRICS_PORT else None
+    logger.info(f"Воркер {index + 1}/{count} запущен")
+
+    in_progress = set()
+    try:
+        while True:
+            raw = await asyncio.to_thread(updates.get)
+            if raw is None:
+                break
+            task = asyncio.create_task(dp.feed_raw_update(bot, json.loads(raw)))
+            in_progress.add(task)
+            task.add_done_callback(in_progress.discard)
+        await asyncio.gather(*in_progress, return_exceptions=True)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await stop_services(background, bot, db, storage)
+        logger.info(f"Воркер {index + 1}/{count} остановлен")
+
+
+async def run_workers(count: int) -> None:
+    """Лаунчер: главный процесс получает обновления поллингом и раздает их воркерам по user_id"""
+    if STORAGE_BACKEND != 'sqlite':
+        raise ValueError("Для BOT_WORKERS > 1 нужен STORAGE_BACKEND=sqlite: JSON-файл нельзя делить между процессами")
+    if BOT_MODE == 'webhook':
+        raise ValueError("BOT_WORKERS > 1 поддерживается только в режиме polling")
+
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue() for _ in range(count)]
+    started = [0.0] * count
+
+    def spawn(index: int) -> multiprocessing.Process:
+        # Номер воркера попадает в окружение дочернего процесса и задает его файлы логов и кэша
+        os.environ['BOT_WORKER_INDEX'] = str(index)
+        process = context.Process(target=run_worker, args=(index, count, queues[index]), name=f"bot-worker-{index}")
+        process.start()
+        os.environ.pop('BOT_WORKER_INDEX', None)
+        started[index] = time.monotonic()
+        return process
+
+    processes = [spawn(index) for index in range(count)]
+
+    # Диспетчер главного процесса нужен только, чтобы узнать используемые типы обновлений
+    router_dp = Dispatcher()
+    router_dp.include_routers(commands.router, callbacks.router)
+    allowed_updates = router_dp.resolve_used_update_types()
+
+    bot = Bot(token=TELEGRAM_TOKEN)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    stopping = asyncio.create_task(stop.wait())
+
+    async def supervise() -> None:
+        """Перезапуск упавших воркеров: иначе их доля пользователей молча осталась бы без ответов"""
+        while not stop.is_set():
+            sentinels = {process.sentinel: index for index, process in enumerate(processes)}
+            # Короткий таймаут, чтобы поток ожидания завершился вместе с лаунчером
+            ready = await asyncio.to_thread(multiprocessing.connection.wait, list(sentinels), 1.0)
+            for sentinel in ready:
+                if stop.is_set():
+                    return
+                index = sentinels[sentinel]
+                process = processes[index]
+                # Сигнал готов раньше, чем код завершения забран у системы
+                await asyncio.to_thread(process.join)
+                uptime = time.monotonic() - started[index]
+                logger.error(f"{process.name} завершился с кодом {process.exitcode} через {uptime:.0f} с")
+                if uptime < BOT_WORKER_MIN_UPTIME:
+                    stop.set()
+                    raise RuntimeError(f"{process.name} падает сразу после запуска - лаунчер остановлен")
+                # Упавший процесс мог держать блокировку чтения очереди - новому воркеру новая очередь,
+                # а ожидающие обновления переносятся, если старую очередь еще можно прочитать
+                old, queues[index] = queues[index], context.Queue()
+                try:
+                    while True:
+                        queues[index].put(old.get_nowait())
+                except Empty:
+                    pass
+                processes[index] = spawn(index)
+
+    supervisor = asyncio.create_task(supervise())
+
+    offset = None
+    try:
+        while not stop.is_set():
+            polling = asyncio.create_task(bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates))
+            await asyncio.wait({polling, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            if not polling.done():
+                polling.cancel()
+                break
+            try:
+                received = polling.result()
+            except Exception as e:
+                logger.error(f"Ошибка получения обновлений: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in received:
+                queues[shard_of(update, count)].put(update.model_dump_json(exclude_unset=True))
+                offset = update.update_id + 1
+    finally:
+        stop.set()
+        crash, = await asyncio.gather(supervisor, return_exceptions=True)
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            await asyncio.to_thread(process.join, WEBHOOK_SHUTDOWN_TIMEOUT)
+            if process.is_alive():
+                logger.warning(f"{process.name} не завершился вовремя, останавливаем принудительно")
+                process.terminate()
         await bot.session.close()
+    if isinstance(crash, Exception):
+        # Ненулевой код выхода, чтобы менеджер процессов увидел сбой
+        raise crash
+
+
+async def main():
+    # Настройка логгера
+    setup_logger()
+
+    if BOT_WORKERS > 1:
+        await run_workers(BOT_WORKERS)
+        return
+
+    # Единое хранилище на весь процесс, передается в хендлеры через DI
+    db = create_database()
+
+    # Сессии пользователей переживают перезапуск и не растут в памяти без ограничений
+    storage = create_fsm_storage()
+
+    # Инициализация бота и диспетчера
+    bot = Bot(token=TELEGRAM_TOKEN)
+    # Все исходящие запросы идут через общую очередь с лимитами Telegram
+    bot.session.middleware(send_scheduler)
+    dp = create_dispatcher(db, storage)
+
+    if BOT_MODE == 'webhook':
+        await run_webhook(bot, dp, db, storage)
+    else:
+        await run_polling(bot, dp, db, storage)
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
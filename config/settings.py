@@ -9,8 +9,127 @@ BASE_DIR = Path(__file__).parent.parent
 # Конфигурация
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY")
+GOOGLE_BOOKS_API_URL = os.getenv("GOOGLE_BOOKS_API_URL", "https://www.googleapis.com/books/v1/volumes")
 ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS", "").split(",") if id]
 DATA_FILE = BASE_DIR / 'storage' / 'books_data.json'
+SQLITE_FILE = BASE_DIR / 'storage' / 'books_data.sqlite'
+
+# Бэкенд хранилища: "json" или "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+
+# Режим получения обновлений: "polling" или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Число процессов-воркеров: при BOT_WORKERS > 1 главный процесс получает обновления
+# и распределяет их по воркерам по user_id; нужен STORAGE_BACKEND=sqlite
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+# Воркер, упавший раньше, чем через BOT_WORKER_MIN_UPTIME секунд после запуска, не перезапускается:
+# лаунчер останавливается, чтобы не крутить перезапуски при ошибке конфигурации
+BOT_WORKER_MIN_UPTIME = float(os.getenv("BOT_WORKER_MIN_UPTIME", 30))
+# Номер воркера задает лаунчер; у каждого воркера свои файлы логов и кэша переводов
+WORKER_INDEX = os.getenv("BOT_WORKER_INDEX", "")
+WORKER_SUFFIX = f".worker{WORKER_INDEX}" if WORKER_INDEX else ""
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", 30))
+
+# Хранилище: журнал изменений + периодическое сжатие в снимок
+STORAGE_JOURNAL = os.getenv("STORAGE_JOURNAL", "1") == "1"
+JOURNAL_COMPACT_SIZE = int(os.getenv("JOURNAL_COMPACT_SIZE", 4 * 1024 * 1024))
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", 1.0))
+
+# FSM-хранилище сессий: "sqlite", "redis" или "memory"
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_STORAGE_FILE = BASE_DIR / 'storage' / 'fsm.sqlite'
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+FSM_SESSION_TTL = int(os.getenv("FSM_SESSION_TTL", 7 * 24 * 3600))
+FSM_MAX_RESIDENT = int(os.getenv("FSM_MAX_RESIDENT", 10000))
+# Изменения сессий пишутся в SQLite одной транзакцией раз в FSM_FLUSH_INTERVAL секунд
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 1.0))
+
+# Клиент Google Books
+GOOGLE_BOOKS_CONCURRENCY = int(os.getenv("GOOGLE_BOOKS_CONCURRENCY", 8))
+GOOGLE_BOOKS_TIMEOUT = float(os.getenv("GOOGLE_BOOKS_TIMEOUT", 10))
+GOOGLE_BOOKS_RETRIES = int(os.getenv("GOOGLE_BOOKS_RETRIES", 3))
+
+# Исходящие сообщения: глобальный лимит и лимит на чат (сообщений в секунду)
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", 5))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", 8))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 3))
+# Flood wait сразу в SEND_GLOBAL_FLOOD_CHATS разных чатах за SEND_GLOBAL_FLOOD_WINDOW секунд -
+# это общий лимит бота, и паузу получают все отправки, а не только эти чаты
+SEND_GLOBAL_FLOOD_CHATS = int(os.getenv("SEND_GLOBAL_FLOOD_CHATS", 3))
+SEND_GLOBAL_FLOOD_WINDOW = float(os.getenv("SEND_GLOBAL_FLOOD_WINDOW", 5))
+
+# Рассылка: пользователи читаются порциями, прогресс сохраняется после каждой порции;
+# BROADCAST_CONCURRENCY - сколько сообщений рассылки одновременно ждут в очереди отправки
+BROADCAST_FILE = BASE_DIR / 'storage' / 'broadcast.json'
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", 500))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 20))
+
+# Избранное показывается страницами; обложки уходят альбомом (не больше 10)
+FAVORITES_PAGE_SIZE = min(int(os.getenv("FAVORITES_PAGE_SIZE", 10)), 10)
+
+# Рекомендации «читатели также сохранили»: сколько соседей хранится для каждой книги и
+# со сколькими последними книгами пользователя связывается новая книга из избранного
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", 10))
+RECOMMENDATIONS_USER_WINDOW = int(os.getenv("RECOMMENDATIONS_USER_WINDOW", 100))
+# Режим воркеров: как часто индекс подхватывает избранное пользователей других процессов, секунд
+RECOMMENDATIONS_SYNC_INTERVAL = float(os.getenv("RECOMMENDATIONS_SYNC_INTERVAL", 5))
+
+# Кэш жанров: время жизни, фоновое обновление до истечения TTL, подгрузка страниц
+GENRE_CACHE_TTL = int(os.getenv("GENRE_CACHE_TTL", 24 * 3600))
+# Отдельный от данных пользователей файл; устаревшие страницы отдаются до GENRE_CACHE_MAX_AGE,
+# память и диск ограничены по байтам (в памяти - несжатый JSON, на диске - сжатый)
+GENRE_CACHE_FILE = BASE_DIR / 'storage' / 'genre_cache.sqlite'
+GENRE_CACHE_MAX_AGE = int(os.getenv("GENRE_CACHE_MAX_AGE", 7 * 24 * 3600))
+GENRE_CACHE_MEMORY_BYTES = int(os.getenv("GENRE_CACHE_MEMORY_BYTES", 8 * 1024 * 1024))
+GENRE_CACHE_DISK_BYTES = int(os.getenv("GENRE_CACHE_DISK_BYTES", 64 * 1024 * 1024))
+GENRE_REFRESH_MARGIN = int(os.getenv("GENRE_REFRESH_MARGIN", 3600))
+GENRE_REFRESH_JITTER = int(os.getenv("GENRE_REFRESH_JITTER", 600))
+GENRE_WARM_CONCURRENCY = int(os.getenv("GENRE_WARM_CONCURRENCY", 2))
+GENRE_PAGE_SIZE = 40
+GENRE_MAX_PAGES = int(os.getenv("GENRE_MAX_PAGES", 10))
+PREFETCH_MARGIN = 5
+
+# Поиск: локальный индекс по кэшу, Google Books - если найдено меньше SEARCH_MIN_LOCAL
+SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", 20))
+SEARCH_MIN_LOCAL = int(os.getenv("SEARCH_MIN_LOCAL", 5))
+
+# Перевод описаний
+TRANSLATE_MAX_CHARS = 500
+TRANSLATION_CACHE_FILE = BASE_DIR / 'storage' / f'translations{WORKER_SUFFIX}.json'
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 5000))
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", 30 * 24 * 3600))
+
+# Резервные копии: сжатый полный снимок и дельты к нему, без кэша жанров;
+# хранятся BACKUP_KEEP_FULL последних полных снимков вместе с их дельтами
+BACKUP_DIR = BASE_DIR / 'storage' / 'backups'
+BACKUP_DELTAS_PER_FULL = int(os.getenv("BACKUP_DELTAS_PER_FULL", 6))
+BACKUP_KEEP_FULL = int(os.getenv("BACKUP_KEEP_FULL", 3))
+BACKUP_COMPRESS_LEVEL = int(os.getenv("BACKUP_COMPRESS_LEVEL", 6))
+
+# Метрики в формате Prometheus; в режиме polling отдельный HTTP-сервер (0 - выключен),
+# в режиме вебхука /metrics висит на том же сервере
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# Логи: запись в файл идет в отдельном потоке, файл ротируется по размеру или по времени
+LOG_FILE = BASE_DIR / 'utils' / f'bot{WORKER_SUFFIX}.log'
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Уровни по модулям: "aiogram.event=WARNING,services.api_client=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "text" или "json" (JSON-строки с update_id, user_id и именем хендлера)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+# Если задано (например, "midnight"), ротация по времени вместо размера
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
 
 # Локализация
 LANGUAGES = {
@@ -33,8 +152,49 @@ LANGUAGES = {
         "book_title": "📖 <b>{}</b>",
         "book_author": "👤 {}",
         "translated_description": "\n\n🇷🇺 Перевод описания:\n{}",
-        "backup_created": "✅ Резервная копия создана",
+        "backup_started": "⏳ Создаю резервную копию...",
+        "backup_running": "⏳ Резервная копия уже создается",
+        "backup_created": "✅ Резервная копия создана: {}, {:.1f} КБ, {:.1f} с",
+        "backup_failed": "❌ Ошибка создания бэкапа",
+        "backup_full": "полный снимок",
+        "backup_delta": "изменения",
         "cache_cleared": "✅ Кэш очищен",
+        "cache_panel": "🗂 Кэш жанров\nВ памяти: {} стр., {:.0f} из {:.0f} КБ\nНа диске: {} стр., {:.0f} из {:.0f} КБ\nВыберите жанр для очистки:",
+        "genre_cache_cleared": "✅ Кэш жанра «{}» очищен, удалено страниц: {}",
+        "broadcast_prompt": "📣 Отправьте текст рассылки одним сообщением (форматирование сохранится):",
+        "broadcast_confirm": "{}\n\n———\n📣 Получателей: {}. Начать рассылку?",
+        "broadcast_started": "🚀 Рассылка запущена. Ход рассылки - в админ-панели, кнопка «📣 Рассылка»",
+        "broadcast_already_running": "⏳ Рассылка уже идет",
+        "broadcast_cancelled": "⛔ Рассылка остановлена",
+        "broadcast_draft_cancelled": "Рассылка отменена",
+        "broadcast_invalid_html": "❌ Telegram не принял форматирование текста. Исправьте его и отправьте текст еще раз",
+        "broadcast_status": "📣 Рассылка ({}): {} из {} ({:.0f}%)\n✅ Доставлено: {}\n🚫 Заблокировали бота: {}\n❌ Ошибок: {}\n⚡ Скорость: {:.1f} сообщ./с\n⏱ Осталось: {}",
+        "broadcast_status_running": "идет",
+        "broadcast_status_done": "завершена",
+        "broadcast_status_cancelled": "отменена",
+        "broadcast_status_failed": "прервана ошибкой",
+        "broadcast_failed": "❌ Рассылка прервана ошибкой: обработано {} из {}. Продолжить можно в админ-панели, кнопка «📣 Рассылка»",
+        "broadcast_resumed": "▶ Рассылка продолжена",
+        "broadcast_idle": "📣 Рассылок еще не было. Новая рассылка: /broadcast",
+        "broadcast_finished": "✅ Рассылка завершена: доставлено {}, заблокировали бота {}, ошибок {}",
+        "recommendations": "👥 Читатели, сохранившие эту книгу, также сохранили:",
+        "recommendation_readers": "👥 Сохранили вместе: {}",
+        "no_recommendations": "Эту книгу пока никто не сохранял вместе с другими 🤷",
+        "recommendations_started": "⏳ Пересчитываю рекомендации...",
+        "recommendations_running": "⏳ Рекомендации уже пересчитываются",
+        "recommendations_rebuilt": "✅ Рекомендации пересчитаны: книг {}, пар {}, {:.1f} с",
+        "favorites_page": "⭐ Избранное: страница {} из {}",
+        "search_prompt": "🔎 Введите название книги или автора:",
+        "search_running": "🔎 Ищу «{}»...",
+        "search_not_found": "Ничего не найдено 😢 Попробуйте другой запрос.",
+        "no_title": "Без названия",
+        "unknown_author": "Неизвестен",
+        "not_specified": "Не указано",
+        "metrics_handlers": "⏱ Хендлеры: {} вызовов, p95 {:.0f} мс, ошибок {:.0f}",
+        "metrics_google": "🌐 Google Books: {:.0f} запросов, среднее {:.0f} мс",
+        "metrics_cache": "🗂 Из кэша: жанры {:.0f}%, поиск {:.0f}%, переводы {:.0f}%, сессии {:.0f}%",
+        "metrics_sender": "📨 Отправка: в очереди {}, отправлено {:.0f}, ошибок {:.0f}, задержка {:.0f} мс",
+        "metrics_storage": "💾 Сброс хранилища: {} раз, среднее {:.1f} мс, сжатий журнала {:.0f}",
     },
     "en": {
         "start": "📚 I'm a book bot! Choose a genre or view favorites:",
@@ -55,8 +215,49 @@ LANGUAGES = {
         "book_title": "📖 <b>{}</b>",
         "book_author": "👤 {}",
         "translated_description": "\n\n🇷🇺 Russian translation:\n{}",
-        "backup_created": "✅ Backup created",
+        "backup_started": "⏳ Creating backup...",
+        "backup_running": "⏳ Backup is already in progress",
+        "backup_created": "✅ Backup created: {}, {:.1f} KB, {:.1f} s",
+        "backup_failed": "❌ Backup error",
+        "backup_full": "full snapshot",
+        "backup_delta": "changes",
         "cache_cleared": "✅ Cache cleared",
+        "cache_panel": "🗂 Genre cache\nIn memory: {} pages, {:.0f} of {:.0f} KB\nOn disk: {} pages, {:.0f} of {:.0f} KB\nChoose a genre to clear:",
+        "genre_cache_cleared": "✅ Cache of “{}” cleared, pages removed: {}",
+        "broadcast_prompt": "📣 Send the broadcast text as one message (formatting is kept):",
+        "broadcast_confirm": "{}\n\n———\n📣 Recipients: {}. Start the broadcast?",
+        "broadcast_started": "🚀 Broadcast started. Track it in the admin panel, “📣 Broadcast” button",
+        "broadcast_already_running": "⏳ A broadcast is already running",
+        "broadcast_cancelled": "⛔ Broadcast stopped",
+        "broadcast_draft_cancelled": "Broadcast cancelled",
+        "broadcast_invalid_html": "❌ Telegram rejected the text formatting. Fix it and send the text again",
+        "broadcast_status": "📣 Broadcast ({}): {} of {} ({:.0f}%)\n✅ Delivered: {}\n🚫 Blocked the bot: {}\n❌ Failed: {}\n⚡ Rate: {:.1f} msg/s\n⏱ Remaining: {}",
+        "broadcast_status_running": "running",
+        "broadcast_status_done": "finished",
+        "broadcast_status_cancelled": "cancelled",
+        "broadcast_status_failed": "failed",
+        "broadcast_failed": "❌ Broadcast failed: {} of {} processed. Resume it from the admin panel, “📣 Broadcast” button",
+        "broadcast_resumed": "▶ Broadcast resumed",
+        "broadcast_idle": "📣 No broadcasts yet. New broadcast: /broadcast",
+        "broadcast_finished": "✅ Broadcast finished: delivered {}, blocked the bot {}, failed {}",
+        "recommendations": "👥 Readers who saved this book also saved:",
+        "recommendation_readers": "👥 Saved together: {}",
+        "no_recommendations": "Nobody has saved this book together with others yet 🤷",
+        "recommendations_started": "⏳ Rebuilding recommendations...",
+        "recommendations_running": "⏳ Recommendations are already being rebuilt",
+        "recommendations_rebuilt": "✅ Recommendations rebuilt: {} books, {} pairs, {:.1f} s",
+        "favorites_page": "⭐ Favorites: page {} of {}",
+        "search_prompt": "🔎 Enter a book title or author:",
+        "search_running": "🔎 Searching for “{}”...",
+        "search_not_found": "Nothing found 😢 Try another query.",
+        "no_title": "No title",
+        "unknown_author": "Unknown",
+        "not_specified": "Not specified",
+        "metrics_handlers": "⏱ Handlers: {} calls, p95 {:.0f} ms, errors {:.0f}",
+        "metrics_google": "🌐 Google Books: {:.0f} requests, average {:.0f} ms",
+        "metrics_cache": "🗂 Served from cache: genres {:.0f}%, search {:.0f}%, translations {:.0f}%, sessions {:.0f}%",
+        "metrics_sender": "📨 Sending: queued {}, sent {:.0f}, failed {:.0f}, latency {:.0f} ms",
+        "metrics_storage": "💾 Storage flushes: {}, average {:.1f} ms, journal compactions {:.0f}",
     }
 }
 
@@ -1,22 +1,61 @@
+from functools import lru_cache
+from typing import Dict, Optional
+
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.types import ReplyKeyboardMarkup, InlineKeyboardMarkup
-from config.settings import GENRES, LANGUAGES
+from config.settings import LANGUAGES
+from keyboards.callback_data import (
+    GENRE_NAMES,
+    AdminAction,
+    BookAction,
+    BroadcastAction,
+    ALL_GENRES,
+    AdminCallback,
+    BroadcastCallback,
+    CacheCallback,
+    FavoritesCallback,
+    GenreCallback,
+    LanguageCallback
+)
+
+# Тексты кнопок на разных языках и действия, которые они вызывают
+BOOK_BUTTONS = [
+    (BookAction.PAGES, "📄 Страницы", "📄 Pages"),
+    (BookAction.DESCRIPTION, "📝 Описание", "📝 Description"),
+    (BookAction.ADD_FAVORITE, "⭐ В избранное", "⭐ Add to favorites"),
+    (BookAction.RECOMMEND, "👥 Также сохранили", "👥 Readers also saved"),
+    (BookAction.NEXT, "➡ Следующая", "➡ Next"),
+    (BookAction.NEW_GENRE, "🎲 Новый жанр", "🎲 New genre")
+]
+ADMIN_BUTTONS = [
+    (AdminAction.STATS, "📊 Статистика", "📊 Statistics"),
+    (AdminAction.BACKUP, "🗄️ Создать бэкап", "🗄️ Create backup"),
+    (AdminAction.CLEAR_CACHE, "🧹 Очистить кэш", "🧹 Clear cache"),
+    (AdminAction.BROADCAST, "📣 Рассылка", "📣 Broadcast"),
+    (AdminAction.RECOMMENDATIONS, "🔄 Пересчитать рекомендации", "🔄 Rebuild recommendations"),
+    (AdminAction.BACK, "🔙 Назад", "🔙 Back")
+]
+
+# Текст кнопки reply-клавиатуры на любом языке -> действие
+BOOK_BUTTON_ACTIONS: Dict[str, BookAction] = {
+    text: action for action, *texts in BOOK_BUTTONS for text in texts
+}
 
 
-def get_genres_keyboard(user_id: int, lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_genres_keyboard(lang: str) -> InlineKeyboardMarkup:
     """
     Создает inline-клавиатуру с жанрами книг и кнопкой избранного
     """
     builder = InlineKeyboardBuilder()
     
     # Добавляем кнопки для каждого жанра
-    for genre in GENRES.keys():
-        builder.button(text=genre, callback_data=f"genre_{genre}")
+    for genre_id, genre in enumerate(GENRE_NAMES):
+        builder.button(text=genre, callback_data=GenreCallback(id=genre_id))
     
     # Кнопка избранного
     builder.button(
         text="⭐ Избранное" if lang == 'ru' else "⭐ Favorites", 
-        callback_data="show_favorites"
+        callback_data=FavoritesCallback(page=0)
     )
     
     # Распределение кнопок по 2 в ряд
@@ -24,51 +63,34 @@ def get_genres_keyboard(user_id: int, lang: str = 'ru') -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_book_keyboard(user_id: int, lang: str = 'ru') -> ReplyKeyboardMarkup:
+def _build_book_keyboard(lang: str) -> ReplyKeyboardMarkup:
     """
     Создает reply-клавиатуру для взаимодействия с книгой
     """
     builder = ReplyKeyboardBuilder()
     
-    # Тексты кнопок на разных языках
-    buttons = [
-        ("📄 Страницы", "📄 Pages"),
-        ("📝 Описание", "📝 Description"),
-        ("⭐ В избранное", "⭐ Add to favorites"),
-        ("➡ Следующая", "➡ Next"),
-        ("🎲 Новый жанр", "🎲 New genre")
-    ]
-    
     # Добавляем кнопки в соответствии с языком пользователя
-    for ru_text, en_text in buttons:
+    for _, ru_text, en_text in BOOK_BUTTONS:
         text = ru_text if lang == 'ru' else en_text
         builder.button(text=text)
     
     # Оптимальное расположение кнопок
-    builder.adjust(2, 2, 1)
+    builder.adjust(2, 2, 2)
     return builder.as_markup(resize_keyboard=True)
 
 
-def get_admin_keyboard(user_id: int, lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_admin_keyboard(lang: str) -> InlineKeyboardMarkup:
     """
     Создает inline-клавиатуру для админ-панели
     """
     builder = InlineKeyboardBuilder()
     
-    # Тексты кнопок на разных языках
-    buttons = [
-        ("📊 Статистика", "📊 Statistics"),
-        ("🗄️ Создать бэкап", "🗄️ Create backup"),
-        ("🧹 Очистить кэш", "🧹 Clear cache"),
-        ("🔙 Назад", "🔙 Back")
-    ]
-    
     # Добавляем кнопки в соответствии с языком пользователя
-    for ru_text, en_text in buttons:
+    for action, ru_text, en_text in ADMIN_BUTTONS:
         text = ru_text if lang == 'ru' else en_text
         builder.button(
             text=text, 
-            callback_data=f"admin_{ru_text.split()[0]}"
+            callback_data=AdminCallback(action=action)
         )
     
     # Вертикальное расположение кнопок
@@ -76,18 +98,83 @@ def get_admin_keyboard(user_id: int, lang: str = 'ru') -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_language_keyboard() -> InlineKeyboardMarkup:
+def _build_cache_keyboard(lang: str) -> InlineKeyboardMarkup:
+    """
+    Создает inline-клавиатуру очистки кэша по жанрам
+    """
+    builder = InlineKeyboardBuilder()
+    for genre_id, genre in enumerate(GENRE_NAMES):
+        builder.button(text=genre, callback_data=CacheCallback(genre=genre_id))
+    builder.button(
+        text="🧹 Весь кэш" if lang == 'ru' else "🧹 All cache",
+        callback_data=CacheCallback(genre=ALL_GENRES)
+    )
+    builder.button(
+        text="🔙 Назад" if lang == 'ru' else "🔙 Back",
+        callback_data=AdminCallback(action=AdminAction.BACK)
+    )
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def _build_broadcast_confirm_keyboard(lang: str) -> InlineKeyboardMarkup:
+    """
+    Создает inline-клавиатуру подтверждения рассылки
+    """
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text="✅ Отправить" if lang == 'ru' else "✅ Send",
+        callback_data=BroadcastCallback(action=BroadcastAction.CONFIRM)
+    )
+    builder.button(
+        text="✖ Отмена" if lang == 'ru' else "✖ Cancel",
+        callback_data=BroadcastCallback(action=BroadcastAction.CANCEL)
+    )
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def _build_broadcast_stop_keyboard(lang: str) -> InlineKeyboardMarkup:
+    """
+    Создает кнопку остановки идущей рассылки
+    """
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text="⛔ Остановить рассылку" if lang == 'ru' else "⛔ Stop broadcast",
+        callback_data=BroadcastCallback(action=BroadcastAction.STOP)
+    )
+    return builder.as_markup()
+
+
+def _build_broadcast_resume_keyboard(lang: str) -> InlineKeyboardMarkup:
+    """
+    Создает кнопки продолжения и отмены прерванной рассылки
+    """
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text="▶ Продолжить" if lang == 'ru' else "▶ Resume",
+        callback_data=BroadcastCallback(action=BroadcastAction.RESUME)
+    )
+    builder.button(
+        text="⛔ Отменить" if lang == 'ru' else "⛔ Cancel",
+        callback_data=BroadcastCallback(action=BroadcastAction.STOP)
+    )
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def _build_language_keyboard() -> InlineKeyboardMarkup:
     """
     Создает inline-клавиатуру для выбора языка
     """
     builder = InlineKeyboardBuilder()
-    builder.button(text="🇷🇺 Русский", callback_data="lang_ru")
-    builder.button(text="🇬🇧 English", callback_data="lang_en")
+    builder.button(text="🇷🇺 Русский", callback_data=LanguageCallback(code="ru"))
+    builder.button(text="🇬🇧 English", callback_data=LanguageCallback(code="en"))
     builder.adjust(2)
     return builder.as_markup()
 
 
-def get_back_to_genres_keyboard(user_id: int, lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_back_to_genres_keyboard(lang: str) -> InlineKeyboardMarkup:
     """
     Создает кнопку для возврата к выбору жанра
     """
@@ -96,4 +183,104 @@ def get_back_to_genres_keyboard(user_id: int, lang: str = 'ru') -> InlineKeyboar
         text="← К жанрам" if lang == 'ru' else "← To genres",
         callback_data="back_to_genres"
     )
-    return builder.as_markup()                                                         
\ No newline at end of file
+    return builder.as_markup()
+
+
+@lru_cache(maxsize=256)
+def get_favorites_keyboard(page: int, pages: int) -> Optional[InlineKeyboardMarkup]:
+    """
+    Создает inline-клавиатуру для листания страниц избранного
+    """
+    if pages <= 1:
+        return None
+
+    builder = InlineKeyboardBuilder()
+    if page > 0:
+        builder.button(text="◀", callback_data=FavoritesCallback(page=page - 1))
+    if page < pages - 1:
+        builder.button(text="▶", callback_data=FavoritesCallback(page=page + 1))
+    return builder.as_markup()
+
+
+# Статические клавиатуры собираются один раз на язык при импорте и отдаются всем
+# пользователям одним и тем же объектом, поэтому изменять их нельзя
+_GENRES_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {lang: _build_genres_keyboard(lang) for lang in LANGUAGES}
+_BOOK_KEYBOARDS: Dict[str, ReplyKeyboardMarkup] = {lang: _build_book_keyboard(lang) for lang in LANGUAGES}
+_ADMIN_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {lang: _build_admin_keyboard(lang) for lang in LANGUAGES}
+_CACHE_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {lang: _build_cache_keyboard(lang) for lang in LANGUAGES}
+_BROADCAST_CONFIRM_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {
+    lang: _build_broadcast_confirm_keyboard(lang) for lang in LANGUAGES
+}
+_BROADCAST_STOP_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {
+    lang: _build_broadcast_stop_keyboard(lang) for lang in LANGUAGES
+}
+_BROADCAST_RESUME_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {
+    lang: _build_broadcast_resume_keyboard(lang) for lang in LANGUAGES
+}
+_BACK_TO_GENRES_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {
+    lang: _build_back_to_genres_keyboard(lang) for lang in LANGUAGES
+}
+_LANGUAGE_KEYBOARD = _build_language_keyboard()
+
+
+def get_genres_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Готовая клавиатура жанров для языка
+    """
+    return _GENRES_KEYBOARDS.get(lang, _GENRES_KEYBOARDS['ru'])
+
+
+def get_book_keyboard(lang: str = 'ru') -> ReplyKeyboardMarkup:
+    """
+    Готовая клавиатура действий с книгой для языка
+    """
+    return _BOOK_KEYBOARDS.get(lang, _BOOK_KEYBOARDS['ru'])
+
+
+def get_admin_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Готовая клавиатура админ-панели для языка
+    """
+    return _ADMIN_KEYBOARDS.get(lang, _ADMIN_KEYBOARDS['ru'])
+
+
+def get_cache_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Готовая клавиатура очистки кэша для языка
+    """
+    return _CACHE_KEYBOARDS.get(lang, _CACHE_KEYBOARDS['ru'])
+
+
+def get_broadcast_confirm_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Готовая клавиатура подтверждения рассылки для языка
+    """
+    return _BROADCAST_CONFIRM_KEYBOARDS.get(lang, _BROADCAST_CONFIRM_KEYBOARDS['ru'])
+
+
+def get_broadcast_stop_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Готовая кнопка остановки рассылки для языка
+    """
+    return _BROADCAST_STOP_KEYBOARDS.get(lang, _BROADCAST_STOP_KEYBOARDS['ru'])
+
+
+def get_broadcast_resume_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Готовые кнопки прерванной рассылки для языка
+    """
+    return _BROADCAST_RESUME_KEYBOARDS.get(lang, _BROADCAST_RESUME_KEYBOARDS['ru'])
+
+
+def get_back_to_genres_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Готовая кнопка возврата к жанрам для языка
+    """
+    return _BACK_TO_GENRES_KEYBOARDS.get(lang, _BACK_TO_GENRES_KEYBOARDS['ru'])
+
+
+def get_language_keyboard() -> InlineKeyboardMarkup:
+    """
+    Готовая клавиатура выбора языка
+    """
+    return _LANGUAGE_KEYBOARD
@@ -0,0 +1,64 @@
+from enum import IntEnum
+from typing import Dict, List
+
+from aiogram.filters.callback_data import CallbackData
+
+from config.settings import GENRES
+
+# Жанр в callback_data передается номером: порядок GENRES менять нельзя,
+# иначе кнопки в уже отправленных сообщениях будут вести в другой жанр
+GENRE_NAMES: List[str] = list(GENRES)
+GENRE_IDS: Dict[str, int] = {name: genre_id for genre_id, name in enumerate(GENRE_NAMES)}
+
+
+class AdminAction(IntEnum):
+    STATS = 1
+    BACKUP = 2
+    CLEAR_CACHE = 3
+    BACK = 4
+    BROADCAST = 5
+    RECOMMENDATIONS = 6
+
+
+class BookAction(IntEnum):
+    PAGES = 1
+    DESCRIPTION = 2
+    ADD_FAVORITE = 3
+    NEXT = 4
+    NEW_GENRE = 5
+    RECOMMEND = 6
+
+
+class BroadcastAction(IntEnum):
+    CONFIRM = 1
+    CANCEL = 2
+    STOP = 3
+    RESUME = 4
+
+
+class GenreCallback(CallbackData, prefix="g"):
+    id: int
+
+
+class FavoritesCallback(CallbackData, prefix="f"):
+    page: int
+
+
+class LanguageCallback(CallbackData, prefix="l"):
+    code: str
+
+
+class AdminCallback(CallbackData, prefix="a"):
+    action: AdminAction
+
+
+# Очистка кэша одного жанра по номеру; ALL_GENRES - весь кэш
+ALL_GENRES = -1
+
+
+class CacheCallback(CallbackData, prefix="c"):
+    genre: int
+
+
+class BroadcastCallback(CallbackData, prefix="b"):
+    action: BroadcastAction
@@ -2,12 +2,48 @@ from .builders import (
     get_genres_keyboard,
     get_book_keyboard,
     get_admin_keyboard,
-    get_language_keyboard
+    get_cache_keyboard,
+    get_broadcast_confirm_keyboard,
+    get_broadcast_stop_keyboard,
+    get_broadcast_resume_keyboard,
+    get_language_keyboard,
+    get_favorites_keyboard,
+    BOOK_BUTTON_ACTIONS
+)
+from .callback_data import (
+    GENRE_NAMES,
+    ALL_GENRES,
+    AdminAction,
+    BookAction,
+    BroadcastAction,
+    AdminCallback,
+    BroadcastCallback,
+    CacheCallback,
+    FavoritesCallback,
+    GenreCallback,
+    LanguageCallback
 )
 
 __all__ = [
     'get_genres_keyboard',
     'get_book_keyboard',
     'get_admin_keyboard',
-    'get_language_keyboard'
-]
\ No newline at end of file
+    'get_cache_keyboard',
+    'get_broadcast_confirm_keyboard',
+    'get_broadcast_stop_keyboard',
+    'get_broadcast_resume_keyboard',
+    'get_language_keyboard',
+    'get_favorites_keyboard',
+    'BOOK_BUTTON_ACTIONS',
+    'GENRE_NAMES',
+    'ALL_GENRES',
+    'AdminAction',
+    'BookAction',
+    'BroadcastAction',
+    'AdminCallback',
+    'BroadcastCallback',
+    'CacheCallback',
+    'FavoritesCallback',
+    'GenreCallback',
+    'LanguageCallback'
+]
@@ -0,0 +1,5 @@
+from .language import LanguageMiddleware
+from .log_context import LogContextMiddleware
+from .metrics import HandlerTimingMiddleware
+
+__all__ = ['LanguageMiddleware', 'LogContextMiddleware', 'HandlerTimingMiddleware']
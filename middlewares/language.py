@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from utils.texts import DEFAULT_LANGUAGE, get_texts
+
+
+class LanguageMiddleware(BaseMiddleware):
+    """Язык пользователя определяется один раз на обновление и передается в хендлеры как lang и texts"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        lang = data["db"].get_user_language(user.id) if user else DEFAULT_LANGUAGE
+        data["lang"] = lang
+        data["texts"] = get_texts(lang)
+        return await handler(event, data)
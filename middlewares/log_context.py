@@ -0,0 +1,31 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from utils.logger import update_id_var, user_id_var, handler_var
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Контекст для логов: id обновления и пользователя на уровне update, имя хендлера - на уровне события"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        tokens = []
+        if isinstance(event, Update):
+            tokens.append((update_id_var, update_id_var.set(event.update_id)))
+        user = data.get("event_from_user")
+        if user is not None:
+            tokens.append((user_id_var, user_id_var.set(user.id)))
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            tokens.append((handler_var, handler_var.set(handler_object.callback.__name__)))
+        try:
+            return await handler(event, data)
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
@@ -0,0 +1,35 @@
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils.metrics import handler_duration, handler_errors
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Время работы и ошибки каждого хендлера с разбивкой по роутеру, имени и действию кнопки"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        callback = data["handler"].callback
+        name = callback.__name__
+        # Общий хендлер кнопок книги: действие, найденное фильтром, входит в имя,
+        # чтобы медленный путь (например, описание с переводом) был виден отдельно
+        action = data.get("action")
+        if isinstance(action, IntEnum):
+            name = f"{name}.{action.name.lower()}"
+        labels = {'router': callback.__module__, 'handler': name}
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(**labels)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, **labels)
@@ -1,220 +1,393 @@
+import html
+import asyncio
+import logging
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
 
-from services.database import JSONDatabase
+from services.database import Database
 from services.api_client import get_books
+from services.backup import backup_manager
+from services.broadcast import broadcaster
+from services.genre_cache import genre_cache
+from services.recommendations import co_favorites
+from services.cursor import GenreCursor, cursor_from_state
+from services.sender import send_scheduler
 from keyboards.builders import (
     get_genres_keyboard,
-    get_book_keyboard,
-    get_admin_keyboard,
-    get_language_keyboard
+    get_cache_keyboard,
+    get_broadcast_confirm_keyboard,
+    BOOK_BUTTON_ACTIONS
 )
+from keyboards.callback_data import (
+    GENRE_NAMES,
+    ALL_GENRES,
+    AdminAction,
+    BookAction,
+    BroadcastAction,
+    AdminCallback,
+    BroadcastCallback,
+    CacheCallback,
+    FavoritesCallback,
+    GenreCallback,
+    LanguageCallback
+)
+from routers.common import (
+    get_current_book,
+    show_current_book,
+    run_search,
+    send_favorites_page,
+    send_broadcast_status
+)
+from states.admin_states import AdminStates
 from states.book_states import BookStates
-from config.settings import LANGUAGES, GENRES, ADMIN_IDS
+from config.settings import (
+    LANGUAGES,
+    GENRES,
+    ADMIN_IDS
+)
+from utils.texts import Texts, get_texts
 from utils.translator import translate_description
+from utils import metrics
 
-router = Router()
-db = JSONDatabase()
+logger = logging.getLogger(__name__)
 
-async def show_current_book(message: Message, state: FSMContext):
-    """Показ текущей книги"""
-    data = await state.get_data()
-    books = data.get("books", [])
-    current_index = data.get("current_index", 0)
-    
-    if not books or current_index >= len(books):
-        lang = db.get_user_language(message.from_user.id)
-        await message.answer(LANGUAGES[lang]["no_books"])
-        return
-
-    book = books[current_index]
-    info = book["volumeInfo"]
-    lang = db.get_user_language(message.from_user.id)
-    
-    title = info.get("title", "Без названия" if lang == 'ru' else "No title")
-    authors = ", ".join(info.get("authors", ["Неизвестен"] if lang == 'ru' else ["Unknown"]))
-    cover_url = info.get('imageLinks', {}).get('thumbnail', '')
-    
-    if cover_url:
-        await message.answer_photo(
-            photo=cover_url,
-            caption=f"{LANGUAGES[lang]['book_title'].format(title)}\n{LANGUAGES[lang]['book_author'].format(authors)}",
-            parse_mode="HTML",
-            reply_markup=get_book_keyboard(message.from_user.id, lang)
-        )
-    else:
-        await message.answer(
-            f"{LANGUAGES[lang]['book_title'].format(title)}\n{LANGUAGES[lang]['book_author'].format(authors)}",
-            parse_mode="HTML",
-            reply_markup=get_book_keyboard(message.from_user.id, lang)
-        )
+router = Router()
 
-@router.callback_query(F.data.startswith("genre_"))
-async def process_genre(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(GenreCallback.filter())
+async def process_genre(
+    callback: CallbackQuery,
+    callback_data: GenreCallback,
+    state: FSMContext,
+    db: Database,
+    texts: Texts
+):
     """Обработка выбора жанра"""
-    genre = callback.data.split('_')[1]
+    if not 0 <= callback_data.id < len(GENRE_NAMES):
+        return
+    genre = GENRE_NAMES[callback_data.id]
     genre_query = GENRES[genre]
-    lang = db.get_user_language(callback.from_user.id)
     
-    await callback.message.answer(LANGUAGES[lang]["searching"].format(genre))
-    books = await get_books(genre_query, genre)
+    await callback.message.answer(texts["searching"].format(genre))
+    books = await get_books(genre_query, genre, db)
     
     if not books:
-        await callback.message.answer(LANGUAGES[lang]["no_books"])
+        await callback.message.answer(texts["no_books"])
         return
     
-    await state.set_data({
-        "books": books,
-        "current_index": 0
-    })
-    await show_current_book(callback.message, state)
+    # В FSM только положение курсора, страницы жанра читаются из кэша по требованию
+    await state.set_data(GenreCursor(genre).to_state())
+    await show_current_book(callback.message, state, db, texts)
     await state.set_state(BookStates.waiting_for_book_choice)
 
-@router.message(
-    F.text.in_(["➡ Следующая", "➡ Next"]), 
-    BookStates.waiting_for_book_choice
-)
-async def next_book_handler(message: Message, state: FSMContext):
+@router.message(BookStates.waiting_for_search_query, F.text)
+async def search_query_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
+    """Обработка текста поискового запроса"""
+    await run_search(message, state, message.text, db, texts)
+
+async def next_book_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
     """Обработка кнопки следующей книги"""
-    data = await state.get_data()
-    current_index = data["current_index"]
-    books = data["books"]
-    
-    new_index = (current_index + 1) % len(books)
-    await state.update_data(current_index=new_index)
-    await show_current_book(message, state)
+    cursor = cursor_from_state(await state.get_data())
+    if cursor is not None:
+        await cursor.advance(db)
+        await state.update_data(cursor.to_state())
+    await show_current_book(message, state, db, texts)
 
-@router.message(
-    F.text.in_(["📄 Страницы", "📄 Pages"]), 
-    BookStates.waiting_for_book_choice
-)
-async def show_pages_handler(message: Message, state: FSMContext):
+async def show_pages_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
     """Обработка кнопки показа страниц"""
-    data = await state.get_data()
-    book = data["books"][data["current_index"]]
-    info = book["volumeInfo"]
-    lang = db.get_user_language(message.from_user.id)
+    book = await get_current_book(state, db)
+    if not book:
+        await message.answer(texts["no_books"])
+        return
     
-    pages = info.get("pageCount", "Не указано" if lang == 'ru' else "Not specified")
-    await message.answer(LANGUAGES[lang]["pages"].format(pages))
+    pages = book.page_count or texts["not_specified"]
+    await message.answer(texts["pages"].format(pages))
 
-@router.message(
-    F.text.in_(["📝 Описание", "📝 Description"]), 
-    BookStates.waiting_for_book_choice
-)
-async def show_description_handler(message: Message, state: FSMContext):
+async def show_description_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
     """Обработка кнопки показа описания"""
-    data = await state.get_data()
-    book = data["books"][data["current_index"]]
-    info = book["volumeInfo"]
-    lang = db.get_user_language(message.from_user.id)
+    book = await get_current_book(state, db)
+    if not book:
+        await message.answer(texts["no_books"])
+        return
     
-    description = info.get("description", LANGUAGES[lang]["no_description"])
-    msg = LANGUAGES[lang]["description"].format(description[:500] + ("..." if len(description) > 500 else ""))
+    description = book.description or texts["no_description"]
+    msg = texts["description"].format(description[:500] + ("..." if len(description) > 500 else ""))
     
-    if lang == 'ru' and description and len(description) > 10:
+    if texts.lang == 'ru' and description and len(description) > 10:
         translated = await translate_description(description)
         if translated:
-            msg += LANGUAGES[lang]["translated_description"].format(translated[:500] + ("..." if len(translated) > 500 else ""))
+            msg += texts["translated_description"].format(translated[:500] + ("..." if len(translated) > 500 else ""))
     
     await message.answer(msg)
 
-@router.message(
-    F.text.in_(["⭐ В избранное", "⭐ Add to favorites"]), 
-    BookStates.waiting_for_book_choice
-)
-async def add_to_favorites_handler(message: Message, state: FSMContext):
+async def add_to_favorites_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
     """Обработка добавления в избранное"""
-    data = await state.get_data()
-    book = data["books"][data["current_index"]]
-    lang = db.get_user_language(message.from_user.id)
+    book = await get_current_book(state, db)
+    if not book:
+        await message.answer(texts["no_books"])
+        return
     
     if db.add_to_favorites(message.from_user.id, book):
-        await message.answer(LANGUAGES[lang]["added_to_favorites"])
+        co_favorites.record_favorite(db, message.from_user.id)
+        await message.answer(texts["added_to_favorites"])
     else:
-        await message.answer(LANGUAGES[lang]["already_in_favorites"])
+        await message.answer(texts["already_in_favorites"])
 
-@router.message(
-    F.text.in_(["🎲 Новый жанр", "🎲 New genre"]), 
-    BookStates.waiting_for_book_choice
-)
-async def new_genre_handler(message: Message, state: FSMContext):
+async def show_recommendations_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
+    """Обработка кнопки «также сохранили»: готовый топ соседей книги из индекса"""
+    book = await get_current_book(state, db)
+    if not book:
+        await message.answer(texts["no_books"])
+        return
+
+    recommended = co_favorites.recommend(book.id)
+    if not recommended:
+        await message.answer(texts["no_recommendations"])
+        return
+
+    lines = [
+        # Названия из Google Books могут содержать & и <, а ответ уходит с parse_mode="HTML"
+        f"{texts.caption(html.escape(other['title']), html.escape(other['author']))}\n"
+        f"{texts['recommendation_readers'].format(count)}"
+        for other, count in recommended
+    ]
+    await message.answer("\n\n".join([texts["recommendations"], *lines]), parse_mode="HTML")
+
+async def new_genre_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
     """Обработка кнопки нового жанра"""
-    lang = db.get_user_language(message.from_user.id)
     await state.clear()
     await message.answer(
-        LANGUAGES[lang]["choose_genre"],
-        reply_markup=get_genres_keyboard(message.from_user.id, lang)
+        texts["choose_genre"],
+        reply_markup=get_genres_keyboard(texts.lang)
     )
 
-@router.callback_query(F.data == "show_favorites")
-async def show_favorites_handler(callback: CallbackQuery):
-    """Обработка кнопки избранного"""
-    lang = db.get_user_language(callback.from_user.id)
-    favorites = db.get_favorites(callback.from_user.id)
-    
-    if not favorites:
-        await callback.message.answer(LANGUAGES[lang]["favorites_empty"])
-        return
-    
-    for book in favorites:
-        if book['cover_url']:
-            await callback.message.answer_photo(
-                photo=book['cover_url'],
-                caption=f"{LANGUAGES[lang]['book_title'].format(book['title'])}\n{LANGUAGES[lang]['book_author'].format(book['author'])}",
-                parse_mode="HTML"
-            )
-        else:
-            await callback.message.answer(
-                f"{LANGUAGES[lang]['book_title'].format(book['title'])}\n{LANGUAGES[lang]['book_author'].format(book['author'])}",
-                parse_mode="HTML"
-            )
+# Действие кнопки книги -> обработчик
+BOOK_ACTION_HANDLERS = {
+    BookAction.PAGES: show_pages_handler,
+    BookAction.DESCRIPTION: show_description_handler,
+    BookAction.ADD_FAVORITE: add_to_favorites_handler,
+    BookAction.RECOMMEND: show_recommendations_handler,
+    BookAction.NEXT: next_book_handler,
+    BookAction.NEW_GENRE: new_genre_handler
+}
 
-@router.callback_query(F.data.startswith("lang_"))
-async def set_language(callback: CallbackQuery):
+@router.message(
+    BookStates.waiting_for_book_choice,
+    F.text.func(BOOK_BUTTON_ACTIONS.get).as_("action")
+)
+async def book_action_handler(
+    message: Message,
+    action: BookAction,
+    state: FSMContext,
+    db: Database,
+    texts: Texts
+):
+    """Обработка кнопок книги: текст кнопки на любом языке находится одним поиском в словаре"""
+    await BOOK_ACTION_HANDLERS[action](message, state, db, texts)
+
+@router.callback_query(FavoritesCallback.filter())
+async def favorites_page_handler(
+    callback: CallbackQuery,
+    callback_data: FavoritesCallback,
+    db: Database,
+    texts: Texts
+):
+    """Обработка кнопки избранного и листания его страниц"""
+    await send_favorites_page(callback.message, callback.from_user.id, callback_data.page, db, texts)
+
+@router.callback_query(LanguageCallback.filter())
+async def set_language(callback: CallbackQuery, callback_data: LanguageCallback, db: Database):
     """Обработка смены языка"""
-    language = callback.data.split('_')[1]
+    language = callback_data.code
+    if language not in LANGUAGES:
+        return
     db.set_user_language(callback.from_user.id, language)
-    lang = db.get_user_language(callback.from_user.id)
+    # Язык из middleware уже устарел - берем тексты нового
+    texts = get_texts(language)
     
     await callback.message.edit_text(
-        LANGUAGES[lang]["start"],
-        reply_markup=get_genres_keyboard(callback.from_user.id, lang)
+        texts["start"],
+        reply_markup=get_genres_keyboard(texts.lang)
     )
 
-@router.callback_query(F.data.startswith("admin_"))
-async def admin_actions(callback: CallbackQuery):
+# Задачи резервного копирования держатся здесь, чтобы их не собрал сборщик мусора
+_backup_tasks = set()
+
+async def _run_backup(progress: Message, db: Database, texts: Texts):
+    """Фоновое создание копии; итог пишется в сообщение о ходе работы"""
+    try:
+        entry = await backup_manager.create_backup(db)
+    except Exception as e:
+        logger.error(f"Ошибка создания резервной копии: {e}")
+        await progress.edit_text(texts["backup_failed"])
+        return
+
+    await progress.edit_text(texts["backup_created"].format(
+        texts[f"backup_{entry['kind']}"], entry['size'] / 1024, entry['elapsed']
+    ))
+
+async def create_backup(message: Message, db: Database, texts: Texts):
+    """Резервная копия в фоне: обработчик сразу освобождается, ход работы виден в сообщении"""
+    if backup_manager.running or _backup_tasks:
+        await message.answer(texts["backup_running"])
+        return
+
+    progress = await message.answer(texts["backup_started"])
+    task = asyncio.create_task(_run_backup(progress, db, texts))
+    _backup_tasks.add(task)
+    task.add_done_callback(_backup_tasks.discard)
+
+async def rebuild_recommendations(message: Message, db: Database, texts: Texts):
+    """Полная перестройка индекса рекомендаций по хранилищу"""
+    if co_favorites.rebuilding:
+        await message.answer(texts["recommendations_running"])
+        return
+
+    progress = await message.answer(texts["recommendations_started"])
+    result = await co_favorites.rebuild(db)
+    if result is None:
+        await progress.edit_text(texts["recommendations_running"])
+        return
+    await progress.edit_text(texts["recommendations_rebuilt"].format(result['books'], result['pairs'], result['elapsed']))
+
+@router.callback_query(AdminCallback.filter())
+async def admin_actions(callback: CallbackQuery, callback_data: AdminCallback, db: Database, texts: Texts):
     """Обработка действий администратора"""
     if callback.from_user.id not in ADMIN_IDS:
         return
     
-    action = callback.data.split('_')[1]
-    lang = db.get_user_language(callback.from_user.id)
+    action = callback_data.action
     
-    if action == "📊":
+    if action == AdminAction.STATS:
         stats = db.get_stats()
-        text = (
-            f"{LANGUAGES[lang]['stats']}\n"
-            f"{LANGUAGES[lang]['total_users'].format(stats['total_users'])}\n"
-            f"{LANGUAGES[lang]['total_favorites'].format(stats['total_favorites'])}"
-        )
+        sender = send_scheduler.stats()
+        text = "\n".join([
+            texts['stats'],
+            texts['total_users'].format(stats['total_users']),
+            texts['total_favorites'].format(stats['total_favorites']),
+            texts['metrics_handlers'].format(
+                metrics.handler_duration.count(),
+                metrics.handler_duration.quantile(0.95) * 1000,
+                metrics.handler_errors.total()
+            ),
+            texts['metrics_google'].format(
+                metrics.google_books_requests.total(),
+                metrics.google_books_duration.average() * 1000
+            ),
+            texts['metrics_cache'].format(*map(metrics.hit_rate, ('genre', 'search', 'translation', 'fsm'))),
+            texts['metrics_sender'].format(
+                sender['queue_depth'], sender['sent'], sender['failed'], sender['latency_avg'] * 1000
+            ),
+            texts['metrics_storage'].format(
+                metrics.storage_flush_duration.count(),
+                metrics.storage_flush_duration.average() * 1000,
+                metrics.storage_compactions.total()
+            )
+        ])
         await callback.message.answer(text)
     
-    elif action == "🗄️":
-        if db.create_backup():
-            await callback.message.answer(LANGUAGES[lang]["backup_created"])
-        else:
-            await callback.message.answer("❌ Ошибка создания бэкапа / Backup error")
+    elif action == AdminAction.BACKUP:
+        await create_backup(callback.message, db, texts)
     
-    elif action == "🧹":
-        if db.clear_cache():
-            await callback.message.answer(LANGUAGES[lang]["cache_cleared"])
-        else:
-            await callback.message.answer("❌ Ошибка очистки кэша / Cache clearing error")
+    elif action == AdminAction.CLEAR_CACHE:
+        stats = genre_cache.stats()
+        await callback.message.answer(
+            texts["cache_panel"].format(
+                stats['memory_entries'], stats['memory_bytes'] / 1024, genre_cache.memory_bytes / 1024,
+                stats['disk_entries'], stats['disk_bytes'] / 1024, genre_cache.disk_bytes / 1024
+            ),
+            reply_markup=get_cache_keyboard(texts.lang)
+        )
+    
+    elif action == AdminAction.BROADCAST:
+        await send_broadcast_status(callback.message, texts)
     
-    elif action == "🔙":
+    elif action == AdminAction.RECOMMENDATIONS:
+        await rebuild_recommendations(callback.message, db, texts)
+    
+    elif action == AdminAction.BACK:
         await callback.message.edit_text(
-            LANGUAGES[lang]["start"],
-            reply_markup=get_genres_keyboard(callback.from_user.id, lang)
-        )                                                        
\ No newline at end of file
+            texts["start"],
+            reply_markup=get_genres_keyboard(texts.lang)
+        )
+
+@router.callback_query(CacheCallback.filter())
+async def clear_cache_handler(callback: CallbackQuery, callback_data: CacheCallback, texts: Texts):
+    """Очистка кэша одного жанра или всего кэша"""
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+
+    if callback_data.genre == ALL_GENRES:
+        genre_cache.clear()
+        await callback.message.answer(texts["cache_cleared"])
+    elif 0 <= callback_data.genre < len(GENRE_NAMES):
+        genre = GENRE_NAMES[callback_data.genre]
+        removed = genre_cache.invalidate_genre(genre)
+        await callback.message.answer(texts["genre_cache_cleared"].format(genre, removed))
+
+@router.message(AdminStates.waiting_for_broadcast_text, F.text)
+async def broadcast_text_handler(message: Message, state: FSMContext, db: Database, texts: Texts):
+    """Черновик рассылки: текст с форматированием и подтверждение с числом получателей"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    await state.update_data(broadcast_text=message.html_text)
+    # Предпросмотр проверяет разметку тем же разбором, что и отправка получателям:
+    # текст, который Telegram не принял, иначе ушел бы в ошибки у каждого пользователя
+    try:
+        await message.answer(
+            texts["broadcast_confirm"].format(message.html_text, db.count_active_users()),
+            parse_mode="HTML",
+            reply_markup=get_broadcast_confirm_keyboard(texts.lang)
+        )
+    except TelegramBadRequest as e:
+        logger.warning(f"Текст рассылки отклонен: {e}")
+        await message.answer(texts["broadcast_invalid_html"])
+        return
+    await state.set_state(None)
+
+@router.callback_query(BroadcastCallback.filter())
+async def broadcast_action_handler(
+    callback: CallbackQuery,
+    callback_data: BroadcastCallback,
+    state: FSMContext,
+    db: Database,
+    texts: Texts
+):
+    """Запуск, отмена черновика и остановка рассылки"""
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+
+    action = callback_data.action
+
+    if action == BroadcastAction.STOP:
+        if await broadcaster.cancel():
+            await callback.message.edit_reply_markup(reply_markup=None)
+            await callback.message.answer(texts["broadcast_cancelled"])
+        else:
+            await send_broadcast_status(callback.message, texts)
+        return
+
+    if action == BroadcastAction.RESUME:
+        # Продолжается только рассылка, прерванная ошибкой: running может идти в другом процессе
+        progress = broadcaster.progress()
+        if progress and progress['status'] == 'failed' and broadcaster.resume(callback.bot, db):
+            await callback.message.edit_reply_markup(reply_markup=None)
+            await callback.message.answer(texts["broadcast_resumed"])
+        else:
+            await send_broadcast_status(callback.message, texts)
+        return
+
+    # Черновик используется один раз: повторное нажатие не запустит вторую рассылку
+    data = await state.get_data()
+    text = data.pop('broadcast_text', None)
+    await state.set_data(data)
+    await callback.message.edit_reply_markup(reply_markup=None)
+
+    if action == BroadcastAction.CANCEL or not text:
+        await callback.message.answer(texts["broadcast_draft_cancelled"])
+    elif broadcaster.start(callback.bot, db, text, callback.from_user.id):
+        await callback.message.answer(texts["broadcast_started"])
+    else:
+        await callback.message.answer(texts["broadcast_already_running"])
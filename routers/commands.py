@@ -1,46 +1,42 @@
 from aiogram import Router, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from services.database import JSONDatabase
+from services.database import Database
+from routers.common import send_favorites_page, send_broadcast_status, run_search
+from services.broadcast import broadcaster
+from states.admin_states import AdminStates
+from states.book_states import BookStates
 from keyboards.builders import get_genres_keyboard, get_language_keyboard, get_admin_keyboard
-from config.settings import LANGUAGES, ADMIN_IDS
+from config.settings import ADMIN_IDS
+from utils.texts import Texts
 
 router = Router()
-db = JSONDatabase()
 
 @router.message(Command("start", "help"))
-async def start(message: types.Message):
+async def start(message: types.Message, db: Database, texts: Texts):
     """Обработка команд /start и /help"""
     db.add_user(message.from_user.id)
-    lang = db.get_user_language(message.from_user.id)
     await message.answer(
-        LANGUAGES[lang]["start"],
-        reply_markup=get_genres_keyboard(message.from_user.id, lang)
+        texts["start"],
+        reply_markup=get_genres_keyboard(texts.lang)
     )
 
 @router.message(Command("favorites"))
-async def show_favorites_cmd(message: types.Message):
+async def show_favorites_cmd(message: types.Message, db: Database, texts: Texts):
     """Обработка команды /favorites - показ избранных книг"""
-    lang = db.get_user_language(message.from_user.id)
-    favorites = db.get_favorites(message.from_user.id)
-    
-    if not favorites:
-        await message.answer(LANGUAGES[lang]["favorites_empty"])
+    await send_favorites_page(message, message.from_user.id, 0, db, texts)
+
+@router.message(Command("search"))
+async def search_cmd(message: types.Message, command: CommandObject, state: FSMContext, db: Database, texts: Texts):
+    """Обработка команды /search - поиск по названию или автору"""
+    if command.args:
+        await run_search(message, state, command.args, db, texts)
         return
-    
-    for book in favorites:
-        if book['cover_url']:
-            await message.answer_photo(
-                photo=book['cover_url'],
-                caption=f"{LANGUAGES[lang]['book_title'].format(book['title'])}\n{LANGUAGES[lang]['book_author'].format(book['author'])}",
-                parse_mode="HTML"
-            )
-        else:
-            await message.answer(
-                f"{LANGUAGES[lang]['book_title'].format(book['title'])}\n{LANGUAGES[lang]['book_author'].format(book['author'])}",
-                parse_mode="HTML"
-            )
+
+    await state.set_state(BookStates.waiting_for_search_query)
+    await message.answer(texts["search_prompt"])
 
 @router.message(Command("language"))
 async def change_language(message: types.Message):
@@ -51,13 +47,25 @@ async def change_language(message: types.Message):
     )
 
 @router.message(Command("admin"))
-async def admin_panel(message: types.Message):
+async def admin_panel(message: types.Message, texts: Texts):
     """Обработка команды /admin - доступ к админ-панели"""
     if message.from_user.id not in ADMIN_IDS:
         return
     
-    lang = db.get_user_language(message.from_user.id)
     await message.answer(
-        LANGUAGES[lang]["admin_panel"],
-        reply_markup=get_admin_keyboard(message.from_user.id, lang)
-    )        
\ No newline at end of file
+        texts["admin_panel"],
+        reply_markup=get_admin_keyboard(texts.lang)
+    )
+
+@router.message(Command("broadcast"))
+async def broadcast_cmd(message: types.Message, state: FSMContext, texts: Texts):
+    """Обработка команды /broadcast - рассылка всем пользователям"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    if broadcaster.running:
+        await send_broadcast_status(message, texts)
+        return
+
+    await state.set_state(AdminStates.waiting_for_broadcast_text)
+    await message.answer(texts["broadcast_prompt"])
@@ -0,0 +1,170 @@
+from datetime import timedelta
+from typing import List, Optional
+
+from aiogram.types import Message, InputMediaPhoto
+from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
+
+from services.database import Database
+from services.api_client import search_books, search_results_key
+from services.broadcast import broadcaster
+from services.books import Book
+from services.cursor import ListCursor, cursor_from_state
+from services.sender import bulk_sends
+from keyboards.builders import (
+    get_book_keyboard,
+    get_favorites_keyboard,
+    get_broadcast_stop_keyboard,
+    get_broadcast_resume_keyboard
+)
+from states.book_states import BookStates
+from config.settings import FAVORITES_PAGE_SIZE
+from utils.texts import Texts
+
+# Общие части обработчиков команд и кнопок: показ книг, избранного, поиска и рассылки
+
+async def get_current_book(state: FSMContext, db: Database) -> Optional[Book]:
+    """Текущая книга по курсору из FSM"""
+    data = await state.get_data()
+    cursor = cursor_from_state(data)
+    if cursor is None:
+        return None
+    book = await cursor.current(db)
+    # Курсор запоминает показанную книгу и находит ее, если страницу жанра переписали
+    cursor_state = cursor.to_state()
+    if any(data.get(key) != value for key, value in cursor_state.items()):
+        await state.update_data(cursor_state)
+    return book
+
+async def answer_cover(message: Message, db: Database, book_id: str, cover_url: str, **kwargs) -> Message:
+    """Отправка обложки: по сохраненному file_id, а при его отсутствии или устаревании - по URL"""
+    file_id = db.get_cover_file_id(book_id)
+    if file_id:
+        try:
+            return await message.answer_photo(photo=file_id, **kwargs)
+        except TelegramBadRequest:
+            db.set_cover_file_id(book_id, None)
+
+    sent = await message.answer_photo(photo=cover_url, **kwargs)
+    if sent.photo:
+        db.set_cover_file_id(book_id, sent.photo[-1].file_id)
+    return sent
+
+async def answer_covers_album(message: Message, db: Database, books: List[dict], captions: List[str]) -> None:
+    """Отправка альбома обложек избранного с повторным использованием file_id"""
+    file_ids = [db.get_cover_file_id(book['book_id']) for book in books]
+    media = [
+        InputMediaPhoto(media=file_id or book['cover_url'], caption=caption, parse_mode="HTML")
+        for book, caption, file_id in zip(books, captions, file_ids)
+    ]
+    try:
+        sent = await message.answer_media_group(media)
+    except TelegramBadRequest:
+        if not any(file_ids):
+            raise
+        # Какой-то file_id устарел: забываем их и отправляем по URL
+        for book, file_id in zip(books, file_ids):
+            if file_id:
+                db.set_cover_file_id(book['book_id'], None)
+        file_ids = [None] * len(books)
+        for item, book in zip(media, books):
+            item.media = book['cover_url']
+        sent = await message.answer_media_group(media)
+
+    for book, file_id, sent_message in zip(books, file_ids, sent):
+        if not file_id and sent_message.photo:
+            db.set_cover_file_id(book['book_id'], sent_message.photo[-1].file_id)
+
+async def show_current_book(message: Message, state: FSMContext, db: Database, texts: Texts):
+    """Показ текущей книги"""
+    book = await get_current_book(state, db)
+
+    if not book:
+        await message.answer(texts["no_books"])
+        return
+
+    caption = texts.book_caption(book)
+    keyboard = get_book_keyboard(texts.lang)
+
+    if book.thumbnail:
+        await answer_cover(
+            message,
+            db,
+            book.id,
+            book.thumbnail,
+            caption=caption,
+            parse_mode="HTML",
+            reply_markup=keyboard
+        )
+    else:
+        await message.answer(caption, parse_mode="HTML", reply_markup=keyboard)
+
+async def run_search(message: Message, state: FSMContext, query: str, db: Database, texts: Texts):
+    """Поиск книг по названию или автору и показ первой найденной"""
+    await message.answer(texts["search_running"].format(query))
+    books = await search_books(query, db)
+
+    if not books:
+        await state.clear()
+        await message.answer(texts["search_not_found"])
+        return
+
+    # Результаты поиска листаются тем же курсором, что и жанры, но по готовому списку id
+    await state.set_data(ListCursor([book.id for book in books], key=search_results_key(query)).to_state())
+    await show_current_book(message, state, db, texts)
+    await state.set_state(BookStates.waiting_for_book_choice)
+
+async def send_favorites_page(message: Message, user_id: int, page: int, db: Database, texts: Texts):
+    """Показ одной страницы избранного: обложки альбомом, остальное текстом"""
+    total = db.count_favorites(user_id)
+
+    if not total:
+        await message.answer(texts["favorites_empty"])
+        return
+
+    pages = (total + FAVORITES_PAGE_SIZE - 1) // FAVORITES_PAGE_SIZE
+    page = max(0, min(page, pages - 1))
+    favorites = db.get_favorites(user_id, offset=page * FAVORITES_PAGE_SIZE, limit=FAVORITES_PAGE_SIZE)
+
+    captions = [texts.caption(book['title'], book['author']) for book in favorites]
+    with_cover = [(book, caption) for book, caption in zip(favorites, captions) if book['cover_url']]
+    # Альбом обложек - массовая отправка, интерактивные ответы идут вперед
+    with bulk_sends():
+        if len(with_cover) > 1:
+            await answer_covers_album(message, db, *map(list, zip(*with_cover)))
+        elif with_cover:
+            book, caption = with_cover[0]
+            await answer_cover(message, db, book['book_id'], book['cover_url'], caption=caption, parse_mode="HTML")
+
+    # Книги без обложек и навигация идут одним сообщением
+    without_cover = [caption for book, caption in zip(favorites, captions) if not book['cover_url']]
+    await message.answer(
+        "\n\n".join([texts["favorites_page"].format(page + 1, pages), *without_cover]),
+        parse_mode="HTML",
+        reply_markup=get_favorites_keyboard(page, pages)
+    )
+
+async def send_broadcast_status(message: Message, texts: Texts):
+    """Ход текущей или последней рассылки: счетчики, скорость и оставшееся время"""
+    progress = broadcaster.progress()
+    if progress is None:
+        await message.answer(texts["broadcast_idle"])
+        return
+
+    processed, total = progress['processed'], max(progress['total'], progress['processed'])
+    eta = str(timedelta(seconds=round(progress['eta']))) if progress['eta'] is not None else "—"
+    if broadcaster.running or progress['status'] == 'running':
+        keyboard = get_broadcast_stop_keyboard(texts.lang)
+    elif progress['status'] == 'failed':
+        keyboard = get_broadcast_resume_keyboard(texts.lang)
+    else:
+        keyboard = None
+    await message.answer(
+        texts["broadcast_status"].format(
+            texts[f"broadcast_status_{progress['status']}"],
+            processed, total, processed / total * 100 if total else 100,
+            progress['sent'], progress['blocked'], progress['failed'],
+            progress['rate'], eta
+        ),
+        reply_markup=keyboard
+    )
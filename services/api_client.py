@@ -1,31 +1,199 @@
+import random
 import asyncio
-import requests
-from config.settings import GOOGLE_BOOKS_API_KEY
-from services.database import JSONDatabase
 import logging
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from config.settings import (
+    GENRE_PAGE_SIZE,
+    GOOGLE_BOOKS_API_KEY,
+    GOOGLE_BOOKS_API_URL,
+    GOOGLE_BOOKS_CONCURRENCY,
+    GOOGLE_BOOKS_TIMEOUT,
+    GOOGLE_BOOKS_RETRIES,
+    SEARCH_RESULTS_LIMIT,
+    SEARCH_MIN_LOCAL
+)
+from services.books import Book, book_store
+from services.database import Database
+from services.genre_cache import genre_cache
+from services.search_index import normalize, search_index
+from utils.metrics import cache_requests, google_books_duration, google_books_requests
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
-db = JSONDatabase()
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GoogleBooksClient:
+    """Долгоживущий HTTP-клиент Google Books с пулом соединений"""
+
+    def __init__(
+        self,
+        base_url: str = GOOGLE_BOOKS_API_URL,
+        api_key: Optional[str] = GOOGLE_BOOKS_API_KEY,
+        max_concurrency: int = GOOGLE_BOOKS_CONCURRENCY,
+        timeout: float = GOOGLE_BOOKS_TIMEOUT,
+        retries: int = GOOGLE_BOOKS_RETRIES
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        """Создание сессии с keep-alive соединениями"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def search(self, query: str, start_index: int = 0, max_results: int = 40) -> Optional[Dict]:
+        """Поиск томов с повтором при 429/5xx и сетевых ошибках"""
+        await self.start()
+        params = {'q': query, 'maxResults': max_results, 'startIndex': start_index}
+        if self.api_key:
+            params['key'] = self.api_key
+
+        for attempt in range(self.retries + 1):
+            delay = 0.5 * 2 ** attempt + random.uniform(0, 0.5)
+            try:
+                async with self._semaphore:
+                    with google_books_duration.time():
+                        async with self._session.get(self.base_url, params=params) as response:
+                            google_books_requests.inc(status=response.status)
+                            if response.status not in RETRY_STATUSES:
+                                response.raise_for_status()
+                                return await response.json()
+                            retry_after = response.headers.get('Retry-After')
+                            if retry_after and retry_after.isdigit():
+                                delay = max(delay, int(retry_after))
+                            logger.warning(f"Google Books ответил {response.status}, попытка {attempt + 1}")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                google_books_requests.inc(status='error')
+                logger.warning(f"Сетевая ошибка Google Books: {e!r}, попытка {attempt + 1}")
+            if attempt < self.retries:
+                await asyncio.sleep(delay)
+        raise RuntimeError(f"Google Books недоступен после {self.retries + 1} попыток")
+
+
+books_client = GoogleBooksClient()
+_in_flight = SingleFlight()
+# Ссылки на фоновые обновления, чтобы задачи не собрал GC
+_refreshes = set()
+# book_store и поисковый индекс держат только страницы из памяти кэша и ограничены тем же бюджетом
+genre_cache.subscribe(book_store.on_page)
+
+
+def cache_key(genre_name: str, start_index: int = 0) -> str:
+    """Ключ кэша для страницы результатов жанра"""
+    return genre_name if not start_index else f"{genre_name}@{start_index}"
+
+
+def search_results_key(query: str) -> str:
+    """Ключ кэша для итоговой выдачи поиска, по нему курсор поиска поднимает книги с диска"""
+    return f"results:{' '.join(normalize(query))}"
+
 
-async def get_books(genre_query, genre_name):
-    cached = db.get_cached_books(genre_name)
-    if cached:
-        return cached
-    
-    url = f"https://www.googleapis.com/books/v1/volumes?q={genre_query}&key={GOOGLE_BOOKS_API_KEY}&maxResults=40"
+def _page_books(key: str, items: List[Dict]) -> List[Book]:
+    """Книги страницы из book_store; страница больше бюджета памяти в него не попадает"""
+    books = book_store.page(key)
+    return books if books is not None else [Book.from_dict(item) for item in items]
+
+
+def _in_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    _refreshes.add(task)
+    task.add_done_callback(_refreshes.discard)
+
+
+async def _fetch_genre(genre_query, genre_name, db: Database, start_index: int = 0):
+    """Запрос страницы жанра у Google Books и запись результата в кэш"""
+    data = await books_client.search(genre_query, start_index=start_index, max_results=GENRE_PAGE_SIZE)
+    key = cache_key(genre_name, start_index)
+
+    if not data.get("items"):
+        if start_index:
+            # Пустая дальняя страница тоже кэшируется, чтобы не запрашивать ее снова
+            await genre_cache.put(key, [])
+            return []
+        return None
+
+    books = [
+        Book.from_volume(volume) for volume in data["items"]
+        if volume['volumeInfo'].get('imageLinks', {}).get('thumbnail')
+    ]
+    if start_index:
+        # Книги, уже попавшие на предыдущие страницы жанра, повторно не показываем
+        seen = set()
+        for earlier in range(0, start_index, GENRE_PAGE_SIZE):
+            entry = genre_cache.get_entry(cache_key(genre_name, earlier))
+            if entry:
+                seen.update(item['id'] for item in entry[0])
+        books = [book for book in books if book.id not in seen]
+    if books or start_index:
+        # В кэш попадает только компактная проекция, а не сырые тома
+        await genre_cache.put(key, [book.to_dict() for book in books])
+        # Те же объекты, что в book_store и поисковом индексе
+        books = book_store.page(key) or books
+    return books
+
+
+async def refresh_genre(genre_query, genre_name, db: Database, start_index: int = 0):
+    """Загрузка страницы жанра с upstream; одновременные вызовы объединяются"""
+    key = cache_key(genre_name, start_index)
     try:
-        response = await asyncio.to_thread(requests.get, url, timeout=10)
-        data = response.json()
-        
-        if not data.get("items"):
-            return None
-        
-        books = [book for book in data["items"] if book['volumeInfo'].get('imageLinks', {}).get('thumbnail')]
-        if books:
-            db.cache_books(genre_name, books)
-        return books
-        
+        return await _in_flight.do(key, lambda: _fetch_genre(genre_query, genre_name, db, start_index))
     except Exception as e:
-        logger.error(f"Ошибка при запросе к Google Books: {e}")
-        return None
\ No newline at end of file
+        logger.error(f"Ошибка при запросе к Google Books ({key}): {e}")
+        return None
+
+
+async def get_books(genre_query, genre_name, db: Database, start_index: int = 0):
+    key = cache_key(genre_name, start_index)
+    entry = genre_cache.get_entry(key)
+    if entry and (entry[0] or start_index):
+        books, fresh = entry
+        cache_requests.inc(cache='genre', result='hit' if fresh else 'stale')
+        # stale-while-revalidate: устаревшие данные отдаем сразу, обновляем в фоне
+        if not fresh and not _in_flight.in_flight(key):
+            _in_background(refresh_genre(genre_query, genre_name, db, start_index))
+        return _page_books(key, books)
+
+    cache_requests.inc(cache='genre', result='miss')
+    # Одновременные промахи по одному жанру ждут один общий запрос
+    return await refresh_genre(genre_query, genre_name, db, start_index)
+
+
+def prefetch_books(genre_query, genre_name, db: Database, start_index: int) -> None:
+    """Фоновая загрузка следующей страницы, если ее еще нет в кэше"""
+    key = cache_key(genre_name, start_index)
+    if _in_flight.in_flight(key) or genre_cache.age(key) is not None:
+        return
+    _in_background(refresh_genre(genre_query, genre_name, db, start_index))
+
+
+async def search_books(query: str, db: Database, limit: int = SEARCH_RESULTS_LIMIT) -> List[Book]:
+    """Поиск по названию и автору: сначала локальный индекс, Google Books - если найдено мало"""
+    found = [book_store.get(book_id) for book_id in search_index.search(query, limit)]
+    found = [book for book in found if book is not None]
+    tokens = normalize(query)
+    cache_requests.inc(cache='search', result='hit' if len(found) >= SEARCH_MIN_LOCAL else 'miss')
+    if len(found) < SEARCH_MIN_LOCAL and tokens:
+        # Ответ upstream кэшируется как обычная страница и сразу попадает в индекс
+        remote = await get_books(query.strip(), f"search:{' '.join(tokens)}", db) or []
+        known = {book.id for book in found}
+        found += [book for book in remote if book.id not in known]
+    found = found[:limit]
+    if found:
+        # Выдача сохраняется страницей кэша: курсор поиска найдет книги и после их вытеснения
+        await genre_cache.put(search_results_key(query), [book.to_dict() for book in found])
+    return found
@@ -0,0 +1,266 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.settings import (
+    BACKUP_DIR,
+    BACKUP_DELTAS_PER_FULL,
+    BACKUP_KEEP_FULL,
+    BACKUP_COMPRESS_LEVEL,
+    DATA_FILE,
+    SQLITE_FILE,
+    STORAGE_BACKEND
+)
+from services.database import Database, JSONDatabase
+from services.sqlite_database import SQLiteDatabase
+from utils.metrics import backup_duration
+
+logger = logging.getLogger(__name__)
+
+
+class BackupError(Exception):
+    """Цепочка резервных копий повреждена или не найдена"""
+
+
+def _canonical(data: Dict) -> bytes:
+    """Однозначная сериализация: одинаковые данные дают одинаковые байты и хэш"""
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _sha256(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def diff(old: Dict, new: Dict) -> Dict:
+    """Дельта между двумя состояниями: измененные и удаленные ключи каждого раздела"""
+    changed, deleted = {}, {}
+    for section in old.keys() | new.keys():
+        before, after = old.get(section, {}), new.get(section, {})
+        updates = {key: value for key, value in after.items() if before.get(key) != value}
+        removed = [key for key in before if key not in after]
+        if updates:
+            changed[section] = updates
+        if removed:
+            deleted[section] = removed
+    return {'set': changed, 'delete': deleted}
+
+
+def apply_delta(data: Dict, delta: Dict) -> Dict:
+    """Применение дельты к состоянию на месте"""
+    for section, updates in delta['set'].items():
+        data.setdefault(section, {}).update(updates)
+    for section, removed in delta['delete'].items():
+        for key in removed:
+            data.get(section, {}).pop(key, None)
+    return data
+
+
+class BackupManager:
+    """Сжатые резервные копии: полный снимок и дельты к нему, с хэшами в манифесте"""
+
+    def __init__(
+        self,
+        directory: Path = BACKUP_DIR,
+        deltas_per_full: int = BACKUP_DELTAS_PER_FULL,
+        keep_full: int = BACKUP_KEEP_FULL,
+        compress_level: int = BACKUP_COMPRESS_LEVEL
+    ):
+        self.directory = Path(directory)
+        self.deltas_per_full = deltas_per_full
+        self.keep_full = keep_full
+        self.compress_level = compress_level
+        self.manifest_file = self.directory / 'manifest.json'
+        self._lock = asyncio.Lock()
+        # Состояние на момент последней копии, чтобы не читать цепочку с диска заново
+        self._last_file: Optional[str] = None
+        self._last_state: Optional[Dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def read_manifest(self) -> List[Dict]:
+        if not self.manifest_file.exists():
+            return []
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)['backups']
+
+    def _write_manifest(self, entries: List[Dict]) -> None:
+        self._write_atomic(self.manifest_file, json.dumps({'backups': entries}, indent=2).encode('utf-8'))
+
+    @staticmethod
+    def _write_atomic(path: Path, payload: bytes) -> None:
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _read_verified(self, entry: Dict) -> Dict:
+        """Чтение файла копии с проверкой хэша"""
+        path = self.directory / entry['file']
+        try:
+            payload = gzip.decompress(path.read_bytes())
+        except (OSError, EOFError) as e:
+            raise BackupError(f"Не удалось прочитать {entry['file']}: {e}")
+        if _sha256(payload) != entry['sha256']:
+            raise BackupError(f"Хэш {entry['file']} не совпадает с манифестом")
+        return json.loads(payload)
+
+    def load(self, until: Optional[str] = None) -> Dict:
+        """Восстановление состояния по цепочке: последний полный снимок и дельты после него"""
+        entries = self.read_manifest()
+        if until is not None:
+            names = [entry['file'] for entry in entries]
+            if until not in names:
+                raise BackupError(f"Копия {until} не найдена в манифесте")
+            entries = entries[:names.index(until) + 1]
+        fulls = [index for index, entry in enumerate(entries) if entry['kind'] == 'full']
+        if not fulls:
+            raise BackupError("Нет ни одного полного снимка")
+
+        data = {}
+        for entry in entries[fulls[-1]:]:
+            content = self._read_verified(entry)
+            data = content if entry['kind'] == 'full' else apply_delta(data, content)
+            # Каждый шаг цепочки сверяется с состоянием, которое было при создании копии
+            if _sha256(_canonical(data)) != entry['state_sha256']:
+                raise BackupError(f"Состояние после {entry['file']} не совпадает с исходным")
+        return data
+
+    def _write_backup(self, data: Dict) -> Dict:
+        """Запись копии (выполняется в отдельном потоке)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = self.read_manifest()
+        last = entries[-1] if entries else None
+        deltas = 0
+        for entry in reversed(entries):
+            if entry['kind'] == 'full':
+                break
+            deltas += 1
+
+        base = None
+        if last and deltas < self.deltas_per_full:
+            try:
+                # Манифест могли обновить из другого процесса - тогда состояние читается с диска
+                base = self._last_state if self._last_file == last['file'] else self.load()
+            except BackupError as e:
+                logger.warning(f"Цепочка копий повреждена, будет создан полный снимок: {e}")
+
+        kind = 'full' if base is None else 'delta'
+        content = data if base is None else diff(base, data)
+        payload = _canonical(content)
+        compressed = gzip.compress(payload, self.compress_level)
+
+        name = f"backup-{datetime.now().strftime('%Y%m%d%H%M%S%f')}.{kind}.json.gz"
+        path = self.directory / name
+        self._write_atomic(path, compressed)
+        # Проверка записанного файла до того, как он попадет в манифест
+        if gzip.decompress(path.read_bytes()) != payload:
+            path.unlink(missing_ok=True)
+            raise BackupError(f"Проверка записанной копии {name} не прошла")
+
+        entry = {
+            'file': name,
+            'kind': kind,
+            'created': datetime.now().isoformat(),
+            'size': len(compressed),
+            'sha256': _sha256(payload),
+            'state_sha256': _sha256(_canonical(data))
+        }
+        entries.append(entry)
+        self._prune(entries)
+        self._last_file, self._last_state = name, data
+        return entry
+
+    def _prune(self, entries: List[Dict]) -> None:
+        """Хранение BACKUP_KEEP_FULL последних полных снимков вместе с их дельтами"""
+        fulls = [index for index, entry in enumerate(entries) if entry['kind'] == 'full']
+        cutoff = fulls[-self.keep_full] if len(fulls) > self.keep_full else 0
+        # Сначала манифест, затем файлы: манифест не должен ссылаться на удаленные копии
+        self._write_manifest(entries[cutoff:])
+        for entry in entries[:cutoff]:
+            (self.directory / entry['file']).unlink(missing_ok=True)
+        if cutoff:
+            logger.info(f"Удалено старых резервных копий: {cutoff}")
+
+    async def create_backup(self, db: Database) -> Dict:
+        """Резервная копия; сжатие и запись идут вне цикла событий"""
+        async with self._lock:
+            started = time.perf_counter()
+            data = await db.export_data()
+            entry = await asyncio.to_thread(self._write_backup, data)
+            elapsed = time.perf_counter() - started
+            backup_duration.observe(elapsed, kind=entry['kind'])
+            entry['elapsed'] = elapsed
+            logger.info(f"Создана резервная копия {entry['file']} ({entry['size']} байт, {elapsed:.2f} с)")
+            return entry
+
+
+backup_manager = BackupManager()
+
+
+async def restore(manager: BackupManager, backend: str, target: Path, until: Optional[str] = None) -> Dict:
+    """Восстановление хранилища из цепочки копий с проверкой результата"""
+    data = manager.load(until)
+    if backend == 'sqlite':
+        db = SQLiteDatabase(target)
+        db.import_data(data)
+        restored = await db.export_data()
+        db.close()
+    else:
+        # Журнал от прежних данных иначе был бы применен поверх восстановленного снимка
+        for path in (target.with_suffix('.log'), target.with_suffix('.log.old')):
+            path.unlink(missing_ok=True)
+        manager._write_atomic(target, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        restored = await JSONDatabase(target, journal=False).export_data()
+
+    expected = (len(data.get('users', {})), sum(map(len, data.get('favorites', {}).values())))
+    actual = (len(restored['users']), sum(map(len, restored['favorites'].values())))
+    if actual != expected:
+        raise BackupError(f"Восстановлено пользователей и избранного {actual}, ожидалось {expected}")
+    return {'users': actual[0], 'favorites': actual[1]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Резервные копии хранилища")
+    parser.add_argument('--dir', default=str(BACKUP_DIR), help="каталог с копиями")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="список копий")
+    verify_parser = commands.add_parser('verify', help="проверка цепочки без восстановления")
+    verify_parser.add_argument('--until', help="последняя применяемая копия")
+    restore_parser = commands.add_parser('restore', help="восстановление хранилища")
+    restore_parser.add_argument('--until', help="последняя применяемая копия")
+    restore_parser.add_argument('--backend', choices=('json', 'sqlite'), default=STORAGE_BACKEND)
+    restore_parser.add_argument('--target', help="файл хранилища (по умолчанию из настроек)")
+    restore_parser.add_argument('--force', action='store_true', help="перезаписать существующий файл")
+    args = parser.parse_args()
+
+    manager = BackupManager(args.dir)
+    try:
+        if args.command == 'list':
+            for entry in manager.read_manifest():
+                print(f"{entry['file']}  {entry['kind']:<5}  {entry['size']:>10} байт  {entry['created']}")
+        elif args.command == 'verify':
+            data = manager.load(args.until)
+            print(f"Цепочка в порядке: пользователей {len(data.get('users', {}))}")
+        else:
+            target = Path(args.target or (SQLITE_FILE if args.backend == 'sqlite' else DATA_FILE))
+            if target.exists():
+                if not args.force:
+                    parser.error(f"{target} уже существует, используйте --force")
+                for path in (target, Path(f"{target}-wal"), Path(f"{target}-shm")):
+                    path.unlink(missing_ok=True)
+            counts = asyncio.run(restore(manager, args.backend, target, args.until))
+            print(f"Восстановлено в {target}: {counts}")
+    except BackupError as e:
+        raise SystemExit(f"Ошибка: {e}")
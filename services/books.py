@@ -0,0 +1,108 @@
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass(slots=True)
+class Book:
+    """Компактная запись книги: только поля, которые читают хендлеры"""
+    id: str
+    title: Optional[str]
+    authors: Tuple[str, ...]
+    thumbnail: str
+    page_count: Optional[int]
+    description: Optional[str]
+
+    @classmethod
+    def from_volume(cls, volume: Dict) -> 'Book':
+        """Создание записи из сырого тома Google Books"""
+        info = volume.get('volumeInfo', {})
+        return cls(
+            id=volume['id'],
+            title=info.get('title'),
+            authors=tuple(info.get('authors', ())),
+            thumbnail=info.get('imageLinks', {}).get('thumbnail', ''),
+            page_count=info.get('pageCount'),
+            description=info.get('description')
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Book':
+        # Кэш старого формата хранит сырые тома
+        if 'volumeInfo' in data:
+            return cls.from_volume(data)
+        return cls(
+            id=data['id'],
+            title=data.get('title'),
+            authors=tuple(data.get('authors', ())),
+            thumbnail=data.get('thumbnail', ''),
+            page_count=data.get('page_count'),
+            description=data.get('description')
+        )
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class BookStore:
+    """Книги страниц, которые сейчас лежат в памяти кэша жанров: одна копия книги на процесс"""
+
+    def __init__(self):
+        self._books: Dict[str, Book] = {}
+        # Сколько страниц в памяти содержат книгу: книга уходит вместе с последней из них
+        self._refs: Dict[str, int] = {}
+        # Ключ страницы кэша -> ее книги
+        self._pages: Dict[str, List[Book]] = {}
+        # Подписчики на появление и удаление книг (например, поисковый индекс)
+        self._listeners: List[Tuple[Callable[[List[Book]], None], Callable[[List[Book]], None]]] = []
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def get(self, book_id: str) -> Optional[Book]:
+        return self._books.get(book_id)
+
+    def page(self, key: str) -> Optional[List[Book]]:
+        """Книги страницы; None, если страницы нет в памяти кэша"""
+        return self._pages.get(key)
+
+    def subscribe(self, added: Callable[[List[Book]], None], removed: Callable[[List[Book]], None]) -> None:
+        self._listeners.append((added, removed))
+
+    def on_page(self, key: str, items: Optional[Iterable[Dict]]) -> None:
+        """Страница кэша попала в память (items) или ушла из нее (None)"""
+        self._release(key)
+        if items is not None:
+            self._load(key, items)
+
+    def _load(self, key: str, items: Iterable[Dict]) -> None:
+        """Книги страницы из записей кэша, уже известные не создаются заново"""
+        page, created = [], []
+        for item in items:
+            book = self._books.get(item['id'])
+            if book is None:
+                book = Book.from_dict(item)
+                self._books[book.id] = book
+                created.append(book)
+            self._refs[book.id] = self._refs.get(book.id, 0) + 1
+            page.append(book)
+        self._pages[key] = page
+        if created:
+            for added, _ in self._listeners:
+                added(created)
+
+    def _release(self, key: str) -> None:
+        removed = []
+        for book in self._pages.pop(key, ()):
+            refs = self._refs[book.id] - 1
+            if refs:
+                self._refs[book.id] = refs
+            else:
+                del self._refs[book.id]
+                del self._books[book.id]
+                removed.append(book)
+        if removed:
+            for _, listener in self._listeners:
+                listener(removed)
+
+
+book_store = BookStore()
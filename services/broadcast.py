@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from config.settings import BROADCAST_FILE, BROADCAST_CHUNK_SIZE, BROADCAST_CONCURRENCY
+from services.database import Database
+from services.sender import bulk_sends
+from utils.metrics import broadcast_messages
+from utils.texts import get_texts
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """Рассылка всем активным пользователям с сохранением прогресса после каждой порции"""
+
+    def __init__(
+        self,
+        filename: Path = BROADCAST_FILE,
+        chunk_size: int = BROADCAST_CHUNK_SIZE,
+        concurrency: int = BROADCAST_CONCURRENCY
+    ):
+        self.filename = Path(filename)
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.state: Optional[Dict] = self._load()
+        self._task: Optional[asyncio.Task] = None
+        # Скорость считается по текущему запуску, без времени простоя между перезапусками
+        self._run_started = 0.0
+        self._run_processed = 0
+
+    def _load(self) -> Optional[Dict]:
+        if not self.filename.exists():
+            return None
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка чтения состояния рассылки: {e}")
+            return None
+
+    def _save(self) -> bool:
+        """Атомарная запись состояния; False, если рассылку уже отменили из другого процесса"""
+        self.filename.parent.mkdir(exist_ok=True)
+        tmp = self.filename.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        # Отмена проверяется непосредственно перед заменой файла, чтобы не затереть ее прогрессом
+        if self.state['status'] != 'cancelled':
+            current = self._load()
+            if current and current['status'] == 'cancelled' and current.get('started') == self.state.get('started'):
+                tmp.unlink()
+                self.state['status'] = 'cancelled'
+                return False
+        os.replace(tmp, self.filename)
+        return True
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def processed(self) -> int:
+        return self.state['sent'] + self.state['blocked'] + self.state['failed'] if self.state else 0
+
+    def start(self, bot: Bot, db: Database, text: str, admin_chat_id: int) -> bool:
+        """Новая рассылка; False, если предыдущая еще не закончена"""
+        if self.running:
+            return False
+        # В режиме воркеров рассылку мог начать другой процесс
+        current = self._load()
+        if current and current['status'] == 'running':
+            return False
+        self.state = {
+            'text': text,
+            'admin_chat_id': admin_chat_id,
+            'status': 'running',
+            'cursor': '',
+            'total': db.count_active_users(),
+            'sent': 0,
+            'blocked': 0,
+            'failed': 0,
+            'started': datetime.now().isoformat()
+        }
+        self._save()
+        self._launch(bot, db)
+        logger.info(f"Рассылка запущена, получателей: {self.state['total']}")
+        return True
+
+    def resume(self, bot: Bot, db: Database) -> bool:
+        """Продолжение рассылки, прерванной остановкой бота или ошибкой"""
+        if self.running or not self.state or self.state['status'] not in ('running', 'failed'):
+            return False
+        self.state['status'] = 'running'
+        self._save()
+        self._launch(bot, db)
+        logger.info(f"Рассылка продолжена: обработано {self.processed} из {self.state['total']}")
+        return True
+
+    def _launch(self, bot: Bot, db: Database) -> None:
+        self._run_started = time.monotonic()
+        self._run_processed = self.processed
+        self._task = asyncio.create_task(self._run(bot, db))
+
+    async def stop(self) -> None:
+        """Остановка вместе с ботом: состояние остается, рассылка продолжится после запуска"""
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def cancel(self) -> bool:
+        """Отмена рассылки администратором, в том числе прерванной или идущей в другом процессе"""
+        if not self.running:
+            self.state = self._load()
+            if not self.state or self.state['status'] not in ('running', 'failed'):
+                return False
+        self.state['status'] = 'cancelled'
+        await self.stop()
+        self._save()
+        logger.info(f"Рассылка отменена: обработано {self.processed} из {self.state['total']}")
+        return True
+
+    def progress(self) -> Optional[Dict]:
+        """Счетчики рассылки, скорость в сообщениях в секунду и оставшееся время"""
+        if not self.running:
+            # Рассылку мог вести другой процесс - берем состояние с диска
+            self.state = self._load()
+        if not self.state:
+            return None
+        rate, eta = 0.0, None
+        if self.running:
+            elapsed = time.monotonic() - self._run_started
+            rate = (self.processed - self._run_processed) / elapsed if elapsed > 0 else 0.0
+            if rate > 0:
+                eta = max(self.state['total'] - self.processed, 0) / rate
+        return {**self.state, 'processed': self.processed, 'rate': rate, 'eta': eta}
+
+    async def _run(self, bot: Bot, db: Database) -> None:
+        state = self.state
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(user_id: str) -> str:
+            # Ограничение числа сообщений рассылки в очереди отправки одновременно
+            async with semaphore:
+                return await self._deliver(bot, db, user_id, state['text'])
+
+        try:
+            # Рассылка уступает очередь интерактивным ответам пользователям
+            with bulk_sends():
+                while True:
+                    user_ids = db.get_active_user_ids(state['cursor'], self.chunk_size)
+                    if not user_ids:
+                        break
+                    for result in await asyncio.gather(*map(deliver, user_ids)):
+                        state[result] += 1
+                    # Курсор сохраняется после порции: при аварии повторится не больше одной порции
+                    state['cursor'] = user_ids[-1]
+                    # Пока шла порция, рассылку могли отменить из другого процесса
+                    if not self._save():
+                        logger.info("Рассылка отменена из другого процесса")
+                        return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Прогресс сохранен: рассылку можно продолжить из админ-панели или после перезапуска
+            logger.error(f"Ошибка рассылки: {e}")
+            state['status'] = 'failed'
+            if not self._save():
+                return
+            await self._notify(bot, db, "broadcast_failed", self.processed, state['total'])
+            return
+
+        state['status'] = 'done'
+        if not self._save():
+            logger.info("Рассылка отменена из другого процесса")
+            return
+        logger.info(
+            f"Рассылка завершена: доставлено {state['sent']}, "
+            f"заблокировали {state['blocked']}, ошибок {state['failed']}"
+        )
+        await self._notify(bot, db, "broadcast_finished", state['sent'], state['blocked'], state['failed'])
+
+    async def _notify(self, bot: Bot, db: Database, key: str, *args) -> None:
+        """Сообщение администратору, начавшему рассылку, на его языке"""
+        admin_chat_id = self.state['admin_chat_id']
+        try:
+            texts = get_texts(db.get_user_language(admin_chat_id))
+            await bot.send_message(admin_chat_id, texts[key].format(*args))
+        except Exception as e:
+            logger.warning(f"Не удалось отправить администратору сообщение о рассылке: {e}")
+
+    @staticmethod
+    async def _deliver(bot: Bot, db: Database, user_id: str, text: str) -> str:
+        """Отправка одному пользователю; результат - имя счетчика"""
+        try:
+            await bot.send_message(int(user_id), text, parse_mode="HTML")
+            result = 'sent'
+        except TelegramForbiddenError:
+            result = 'blocked'
+        except TelegramBadRequest as e:
+            if 'chat not found' not in e.message.lower():
+                logger.warning(f"Рассылка не доставлена user_id {user_id}: {e}")
+                result = 'failed'
+            else:
+                result = 'blocked'
+        except Exception as e:
+            logger.warning(f"Рассылка не доставлена user_id {user_id}: {e}")
+            result = 'failed'
+
+        if result == 'blocked':
+            # Пользователь заблокировал бота или удалил аккаунт - больше ему не пишем
+            db.set_user_active(user_id, False)
+        broadcast_messages.inc(result=result)
+        return result
+
+
+broadcaster = Broadcaster()
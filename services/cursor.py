@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+
+from config.settings import GENRES, GENRE_PAGE_SIZE, GENRE_MAX_PAGES, PREFETCH_MARGIN
+from services.api_client import get_books, prefetch_books
+from services.books import Book, book_store
+from services.database import Database
+from services.genre_cache import genre_cache
+
+
+@dataclass
+class GenreCursor:
+    """Ленивый курсор по страницам жанра: в FSM хранятся жанр, страница, смещение и id показанной книги"""
+    genre: str
+    page: int = 0
+    offset: int = 0
+    # Книга на экране: фоновое обновление может переписать страницу и сдвинуть смещение
+    book_id: Optional[str] = None
+
+    @classmethod
+    def from_state(cls, data: Dict) -> Optional['GenreCursor']:
+        if data.get("genre") not in GENRES:
+            return None
+        return cls(data["genre"], data.get("page", 0), data.get("offset", 0), data.get("book_id"))
+
+    def to_state(self) -> Dict:
+        return {"genre": self.genre, "page": self.page, "offset": self.offset, "book_id": self.book_id}
+
+    async def _load_page(self, db: Database, page: int) -> List[Book]:
+        return await get_books(GENRES[self.genre], self.genre, db, start_index=page * GENRE_PAGE_SIZE) or []
+
+    def _locate(self, books: List[Book]) -> bool:
+        """Сверка смещения с показанной книгой; False, если ее больше нет на странице"""
+        if self.book_id is None or (self.offset < len(books) and books[self.offset].id == self.book_id):
+            return True
+        for index, book in enumerate(books):
+            if book.id == self.book_id:
+                self.offset = index
+                return True
+        return False
+
+    async def current(self, db: Database) -> Optional[Book]:
+        """Книга под курсором; None, если показанная книга пропала из обновленной страницы"""
+        books = await self._load_page(db, self.page)
+        if not self._locate(books) or self.offset >= len(books):
+            return None
+        self.book_id = books[self.offset].id
+        return books[self.offset]
+
+    async def advance(self, db: Database) -> Optional[Book]:
+        """Переход к следующей книге с подгрузкой дальних страниц по требованию"""
+        books = await self._load_page(db, self.page)
+        self._locate(books)
+        self.offset += 1
+
+        next_page = self.page + 1
+        if next_page < GENRE_MAX_PAGES and self.offset >= len(books) - PREFETCH_MARGIN:
+            prefetch_books(GENRES[self.genre], self.genre, db, next_page * GENRE_PAGE_SIZE)
+
+        if self.offset >= len(books):
+            self.offset = 0
+            books = []
+            # Страница могла опустеть после удаления повторов - дальние страницы еще есть
+            while not books and self.page + 1 < GENRE_MAX_PAGES:
+                self.page += 1
+                books = await self._load_page(db, self.page)
+            if not books:
+                # Выдача жанра закончилась - начинаем сначала
+                self.page = 0
+                books = await self._load_page(db, 0)
+
+        book = books[self.offset] if self.offset < len(books) else None
+        self.book_id = book.id if book else None
+        return book
+
+
+@dataclass
+class ListCursor:
+    """Курсор по готовому списку книг, например по результатам поиска"""
+    book_ids: List[str]
+    offset: int = 0
+    # Страница кэша со списком: из нее книги поднимаются, если их уже вытеснили из памяти
+    key: Optional[str] = None
+
+    @classmethod
+    def from_state(cls, data: Dict) -> Optional['ListCursor']:
+        if not data.get("book_ids"):
+            return None
+        return cls(data["book_ids"], data.get("offset", 0), data.get("key"))
+
+    def to_state(self) -> Dict:
+        return {"book_ids": self.book_ids, "offset": self.offset, "key": self.key}
+
+    async def current(self, db: Database) -> Optional[Book]:
+        """Книга под курсором"""
+        if self.offset >= len(self.book_ids):
+            return None
+        book_id = self.book_ids[self.offset]
+        book = book_store.get(book_id)
+        if book is None and self.key:
+            # Подъем страницы в память кэша возвращает ее книги в book_store
+            genre_cache.get_entry(self.key)
+            book = book_store.get(book_id)
+        return book
+
+    async def advance(self, db: Database) -> Optional[Book]:
+        """Переход к следующей книге по кругу"""
+        self.offset = (self.offset + 1) % len(self.book_ids)
+        return await self.current(db)
+
+
+Cursor = Union[GenreCursor, ListCursor]
+
+
+def cursor_from_state(data: Dict) -> Optional[Cursor]:
+    """Курсор жанра или списка по данным FSM"""
+    return GenreCursor.from_state(data) or ListCursor.from_state(data)
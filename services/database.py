@@ -1,46 +1,289 @@
 import os
 import json
+import bisect
+import asyncio
 import logging
-from datetime import datetime
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional, Union
 
-from config.settings import DATA_FILE, LANGUAGES
+from config.settings import (
+    DATA_FILE,
+    LANGUAGES,
+    STORAGE_BACKEND,
+    STORAGE_JOURNAL,
+    JOURNAL_COMPACT_SIZE,
+    STORAGE_FLUSH_INTERVAL
+)
+from services.books import Book
+from services.sqlite_database import SQLiteDatabase
+from utils.metrics import storage_flush_duration, storage_compactions
 
 logger = logging.getLogger(__name__)
 
+
+def _copy_section(value):
+    """Копия раздела данных вместе с вложенными словарями и списками"""
+    if isinstance(value, dict):
+        return {key: item.copy() if isinstance(item, (dict, list)) else item for key, item in value.items()}
+    if isinstance(value, list):
+        return [item.copy() if isinstance(item, (dict, list)) else item for item in value]
+    return value
+
 class JSONDatabase:
-    def __init__(self, filename: str = DATA_FILE):
+    def __init__(
+        self,
+        filename: str = DATA_FILE,
+        journal: bool = STORAGE_JOURNAL,
+        compact_size: int = JOURNAL_COMPACT_SIZE
+    ):
         self.filename = Path(filename)
+        self.journal = journal
+        self.journal_file = self.filename.with_suffix('.log')
+        self.compact_size = compact_size
+        self._journal_fh = None
+        self._journal_size = 0
+        # Изменения, накопленные до следующего сброса на диск
+        self._pending: List[bytes] = []
+        self._dirty = False
+        self._compaction: Optional[threading.Thread] = None
         self.data = self._load_data()
-    
+        # Отсортированные id пользователей: порции рассылки берутся бинарным поиском, без обхода всех
+        self._user_ids: List[str] = sorted(self.data['users'])
+        if self.journal:
+            self._open_journal()
+
+    @staticmethod
+    def _empty_data() -> Dict:
+        """Пустая структура данных"""
+        return {
+            'favorites': {},
+            'users': {},
+            'covers': {},
+            'stats': {
+                'total_users': 0,
+                'total_favorites': 0
+            }
+        }
+
     def _load_data(self) -> Dict:
-        """Загрузка данных из файла"""
+        """Загрузка данных из снимка и журнала"""
         try:
             if self.filename.exists():
                 with open(self.filename, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {
-                'favorites': {}, 
-                'cache': {},
-                'users': {},
-                'stats': {
-                    'total_users': 0,
-                    'total_favorites': 0
-                }
-            }
+                    data = json.load(f)
+            else:
+                data = self._empty_data()
         except Exception as e:
             logger.error(f"Ошибка загрузки данных: {e}")
-            return {
-                'favorites': {}, 
-                'cache': {},
-                'users': {},
-                'stats': {
-                    'total_users': 0,
-                    'total_favorites': 0
-                }
-            }
-    
+            data = self._empty_data()
+
+        # Снимки старого формата не содержат раздела covers, а кэш жанров теперь хранится отдельно
+        data.setdefault('covers', {})
+        data.pop('cache', None)
+
+        if self.journal:
+            # Сначала журнал, оставшийся от незавершенного сжатия, затем текущий
+            for path in (self._old_journal_file, self.journal_file):
+                self._replay_journal(data, path)
+        return data
+
+    @property
+    def _old_journal_file(self) -> Path:
+        return self.journal_file.with_suffix('.log.old')
+
+    def _replay_journal(self, data: Dict, path: Path) -> None:
+        """Применение записей журнала к загруженным данным"""
+        if not path.exists():
+            return
+        self._cut_torn_tail(path)
+        applied = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Оборванная последняя запись после аварийной остановки
+                    logger.warning(f"Пропущена поврежденная запись журнала {path.name}")
+                    continue
+                self._apply(data, record['op'], record['args'])
+                applied += 1
+        if applied:
+            logger.info(f"Из журнала {path.name} восстановлено записей: {applied}")
+
+    @staticmethod
+    def _cut_torn_tail(path: Path) -> None:
+        """Обрезка журнала по последней полной записи: иначе оборванная строка склеится со следующей"""
+        with open(path, 'rb+') as f:
+            end = pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                step = min(pos, 64 * 1024)
+                f.seek(pos - step)
+                newline = f.read(step).rfind(b'\n')
+                if newline != -1:
+                    pos += newline + 1 - step
+                    break
+                pos -= step
+            if pos < end:
+                f.truncate(pos)
+                logger.warning(f"Журнал {path.name} обрезан по последней полной записи: отброшено {end - pos} байт")
+
+    @staticmethod
+    def _apply(data: Dict, op: str, args: List) -> None:
+        """Применение одной мутации к данным"""
+        if op == 'add_user':
+            user_id, language = args
+            data['users'][user_id] = {'language': language}
+            data['stats']['total_users'] = len(data['users'])
+        elif op == 'set_language':
+            user_id, language = args
+            data['users'].setdefault(user_id, {})['language'] = language
+        elif op == 'set_active':
+            user_id, active = args
+            user = data['users'].setdefault(user_id, {})
+            if active:
+                user.pop('active', None)
+            else:
+                user['active'] = False
+        elif op == 'add_favorite':
+            user_id, book_data = args
+            favorites = data['favorites'].setdefault(user_id, [])
+            if not any(b['book_id'] == book_data['book_id'] for b in favorites):
+                favorites.append(book_data)
+                data['stats']['total_favorites'] += 1
+        elif op in ('cache_books', 'clear_cache'):
+            # Записи кэша жанров из журналов старого формата пропускаются
+            pass
+        elif op == 'set_cover':
+            book_id, file_id = args
+            if file_id:
+                data['covers'][book_id] = file_id
+            else:
+                data['covers'].pop(book_id, None)
+        else:
+            raise ValueError(f"Неизвестная операция журнала: {op}")
+
+    def _commit(self, op: str, *args) -> bool:
+        """Применение мутации и постановка ее в очередь на запись"""
+        self._apply(self.data, op, list(args))
+        if not self.journal:
+            self._dirty = True
+            return True
+        line = json.dumps({'op': op, 'args': list(args)}, ensure_ascii=False, separators=(',', ':'))
+        self._pending.append((line + '\n').encode('utf-8'))
+        return True
+
+    def flush(self) -> bool:
+        """Запись накопленных изменений одной операцией"""
+        if not self.journal:
+            if not self._dirty:
+                return True
+            self._dirty = False
+            with storage_flush_duration.time(backend='json'):
+                saved = self._save_data()
+            # Неудачная запись повторится при следующем сбросе
+            self._dirty = not saved
+            return saved
+        if not self._pending:
+            return True
+        batch, self._pending = b''.join(self._pending), []
+        with storage_flush_duration.time(backend='journal'):
+            written = self._append_journal(batch)
+        if not written:
+            # Пачка возвращается в начало очереди, чтобы порядок записей сохранился
+            self._pending.insert(0, batch)
+        return written
+
+    async def flush_periodically(self, interval: float = STORAGE_FLUSH_INTERVAL) -> None:
+        """Фоновый сброс накопленных изменений (единственный писатель)"""
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    def _open_journal(self) -> None:
+        self.filename.parent.mkdir(exist_ok=True)
+        self._journal_fh = open(self.journal_file, 'ab')
+        self._journal_size = self._journal_fh.tell()
+
+    def _append_journal(self, batch: bytes) -> bool:
+        """Дозапись пачки компактных записей в журнал"""
+        try:
+            self._journal_fh.write(batch)
+            self._journal_fh.flush()
+            self._journal_size += len(batch)
+        except Exception as e:
+            logger.error(f"Ошибка записи в журнал: {e}")
+            self._reset_journal()
+            return False
+
+        if self._journal_size >= self.compact_size:
+            self._compact()
+        return True
+
+    def _reset_journal(self) -> None:
+        """Откат недописанной пачки: журнал обрезается до последней записанной целиком"""
+        try:
+            self._journal_fh.close()
+        except Exception:
+            pass
+        try:
+            os.truncate(self.journal_file, self._journal_size)
+            self._open_journal()
+        except Exception as e:
+            logger.error(f"Ошибка восстановления журнала: {e}")
+
+    def _compact(self) -> None:
+        """Запуск фонового сжатия журнала в новый снимок"""
+        if self._compaction and self._compaction.is_alive():
+            return
+
+        storage_compactions.inc()
+        # Копия снимается сейчас, чтобы она соответствовала точке ротации журнала;
+        # сериализация идет в потоке сжатия
+        snapshot = self._snapshot()
+
+        self._journal_fh.close()
+        old = self._old_journal_file
+        if old.exists():
+            # Предыдущее сжатие не завершилось: сохраняем порядок записей
+            with open(old, 'ab') as dst, open(self.journal_file, 'rb') as src:
+                dst.write(src.read())
+            self.journal_file.unlink()
+        else:
+            os.replace(self.journal_file, old)
+        self._open_journal()
+
+        self._compaction = threading.Thread(
+            target=self._write_snapshot,
+            args=(snapshot,),
+            name='journal-compaction',
+            daemon=True
+        )
+        self._compaction.start()
+
+    def _write_snapshot(self, snapshot: Dict) -> None:
+        """Атомарная запись снимка (временный файл + переименование)"""
+        tmp = self.filename.with_suffix('.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.filename)
+            self._old_journal_file.unlink(missing_ok=True)
+            logger.info(f"Журнал сжат в снимок {self.filename.name}")
+        except Exception as e:
+            logger.error(f"Ошибка сжатия журнала: {e}")
+
+    def close(self) -> None:
+        """Сброс изменений, завершение фонового сжатия и закрытие журнала"""
+        self.flush()
+        if self._compaction:
+            self._compaction.join()
+        if self._journal_fh:
+            self._journal_fh.close()
+            self._journal_fh = None
+
     def _save_data(self) -> bool:
         """Сохранение данных в файл"""
         try:
@@ -51,101 +294,128 @@ class JSONDatabase:
         except Exception as e:
             logger.error(f"Ошибка сохранения данных: {e}")
             return False
-    
+
     def add_user(self, user_id: Union[int, str], language: str = 'ru') -> bool:
-        """Добавление пользователя"""
+        """Добавление пользователя; вернувшийся пользователь снова получает рассылки"""
         user_id = str(user_id)
-        if user_id not in self.data['users']:
-            self.data['users'][user_id] = {'language': language}
-            self.data['stats']['total_users'] = len(self.data['users'])
-            return self._save_data()
+        user = self.data['users'].get(user_id)
+        if user is None:
+            bisect.insort(self._user_ids, user_id)
+            return self._commit('add_user', user_id, language)
+        if user.get('active') is False:
+            self._commit('set_active', user_id, True)
         return False
-    
+
+    def set_user_active(self, user_id: Union[int, str], active: bool) -> bool:
+        """Пометка пользователя, заблокировавшего бота (active=False)"""
+        user_id = str(user_id)
+        if user_id in self.data['users']:
+            return self._commit('set_active', user_id, active)
+        return False
+
+    def get_active_user_ids(self, after: str = '', limit: int = 500) -> List[str]:
+        """Порция активных пользователей с id больше after, по возрастанию id"""
+        users = self.data['users']
+        result: List[str] = []
+        position = bisect.bisect_right(self._user_ids, after)
+        while len(result) < limit and position < len(self._user_ids):
+            batch = self._user_ids[position:position + limit]
+            position += len(batch)
+            result.extend(user_id for user_id in batch if users[user_id].get('active', True))
+        return result[:limit]
+
+    def count_active_users(self) -> int:
+        """Количество пользователей, не заблокировавших бота"""
+        return sum(1 for user in self.data['users'].values() if user.get('active', True))
+
     def get_user_language(self, user_id: Union[int, str]) -> str:
         """Получение языка пользователя"""
         user_id = str(user_id)
         return self.data['users'].get(user_id, {}).get('language', 'ru')
-    
+
     def set_user_language(self, user_id: Union[int, str], language: str) -> bool:
         """Установка языка пользователя"""
         user_id = str(user_id)
         if user_id in self.data['users']:
-            self.data['users'][user_id]['language'] = language
-            return self._save_data()
+            return self._commit('set_language', user_id, language)
         return False
-    
-    def add_to_favorites(self, user_id: Union[int, str], book: Dict) -> bool:
+
+    def add_to_favorites(self, user_id: Union[int, str], book: Book) -> bool:
         """Добавление книги в избранное"""
         try:
             user_id = str(user_id)
-            if user_id not in self.data['favorites']:
-                self.data['favorites'][user_id] = []
-            
+
             book_data = {
-                'book_id': book['id'],
-                'title': book['volumeInfo']['title'],
-                'author': ', '.join(book['volumeInfo'].get('authors', [LANGUAGES['ru']['book_author'].format('Неизвестен')])),
-                'cover_url': book['volumeInfo'].get('imageLinks', {}).get('thumbnail', '')
+                'book_id': book.id,
+                'title': book.title or 'Без названия',
+                'author': ', '.join(book.authors or [LANGUAGES['ru']['book_author'].format('Неизвестен')]),
+                'cover_url': book.thumbnail
             }
-            
+
             # Проверяем, нет ли уже такой книги
-            if not any(b['book_id'] == book['id'] for b in self.data['favorites'][user_id]):
-                self.data['favorites'][user_id].append(book_data)
-                self.data['stats']['total_favorites'] = sum(len(v) for v in self.data['favorites'].values())
-                self._save_data()
+            if not any(b['book_id'] == book.id for b in self.data['favorites'].get(user_id, [])):
+                self._commit('add_favorite', user_id, book_data)
                 logger.info(f"Книга добавлена в избранное для user_id {user_id}")
                 return True
             return False
         except Exception as e:
             logger.error(f"Ошибка при добавлении в избранное: {e}")
             return False
-    
-    def get_favorites(self, user_id: Union[int, str]) -> List[Dict]:
-        """Получение избранных книг пользователя"""
+
+    def get_favorites(self, user_id: Union[int, str], offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Получение избранных книг пользователя (страницей offset/limit)"""
         user_id = str(user_id)
-        return self.data['favorites'].get(user_id, [])
-    
-    def cache_books(self, genre: str, books: List[Dict]) -> bool:
-        """Кэширование книг по жанру"""
-        try:
-            self.data['cache'][genre] = {
-                'books': books,
-                'timestamp': datetime.now().isoformat()
-            }
-            return self._save_data()
-        except Exception as e:
-            logger.error(f"Ошибка при кэшировании книг: {e}")
+        favorites = self.data['favorites'].get(user_id, [])
+        if offset or limit is not None:
+            return favorites[offset:None if limit is None else offset + limit]
+        return favorites
+
+    def count_favorites(self, user_id: Union[int, str]) -> int:
+        """Количество избранных книг пользователя"""
+        return len(self.data['favorites'].get(str(user_id), []))
+
+    def get_cover_file_id(self, book_id: str) -> Optional[str]:
+        """Telegram file_id обложки, если она уже отправлялась"""
+        return self.data['covers'].get(book_id)
+
+    def set_cover_file_id(self, book_id: str, file_id: Optional[str]) -> bool:
+        """Сохранение (или сброс при None) file_id обложки"""
+        if self.data['covers'].get(book_id) == file_id:
             return False
-    
-    def get_cached_books(self, genre: str) -> Optional[List[Dict]]:
-        """Получение кэшированных книг"""
-        cache = self.data['cache'].get(genre)
-        if not cache:
-            return None
-        
-        # Проверяем, не устарели ли данные (1 день)
-        cache_time = datetime.fromisoformat(cache['timestamp'])
-        if (datetime.now() - cache_time).days < 1:
-            return cache['books']
-        return None
-    
-    def clear_cache(self) -> bool:
-        """Очистка кэша"""
-        self.data['cache'] = {}
-        return self._save_data()
-    
+        return self._commit('set_cover', book_id, file_id)
+
     def get_stats(self) -> Dict:
         """Получение статистики"""
         return self.data['stats']
-    
-    def create_backup(self) -> bool:
-        """Создание резервной копии"""
-        try:
-            backup_filename = self.filename.parent / f"{self.filename.stem}.backup.{datetime.now().strftime('%Y%m%d%H%M%S')}{self.filename.suffix}"
-            with open(backup_filename, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка создания резервной копии: {e}")
-            return False
-    
\ No newline at end of file
+
+    def _snapshot(self) -> Dict:
+        """Копия всех разделов на два уровня: записи, которые меняются на месте, копируются"""
+        # Записи пользователей меняются на месте (язык, active), списки избранного дополняются,
+        # поэтому копируется каждое вложенное значение-контейнер; новые разделы попадают в копию сами
+        return {section: _copy_section(value) for section, value in self.data.items()}
+
+    async def export_data(self) -> Dict:
+        """Копия данных для резервного копирования"""
+        # В цикле событий, где меняются данные, снимается только поверхностная копия;
+        # глубокая копия через сериализацию делается в отдельном потоке
+        snapshot = self._snapshot()
+        return await asyncio.to_thread(lambda: json.loads(json.dumps(snapshot)))
+
+    async def export_favorites(self) -> Dict[str, List[Dict]]:
+        """Избранное всех пользователей без остальных разделов (для индекса рекомендаций)"""
+        # Записи избранного после добавления не меняются - достаточно копий списков
+        return {user_id: list(books) for user_id, books in self.data['favorites'].items()}
+
+
+Database = Union[JSONDatabase, SQLiteDatabase]
+
+
+def create_database(backend: str = STORAGE_BACKEND, shared: bool = False) -> Database:
+    """Создание хранилища выбранного в настройках бэкенда; shared - файл общий для нескольких процессов"""
+    if backend == 'sqlite':
+        return SQLiteDatabase(shared=shared)
+    if backend == 'json':
+        if shared:
+            raise ValueError("JSON-хранилище нельзя делить между процессами, нужен STORAGE_BACKEND=sqlite")
+        return JSONDatabase()
+    raise ValueError(f"Неизвестный бэкенд хранилища: {backend}")
@@ -0,0 +1,189 @@
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config.settings import (
+    FSM_STORAGE,
+    FSM_STORAGE_FILE,
+    FSM_REDIS_URL,
+    FSM_SESSION_TTL,
+    FSM_MAX_RESIDENT,
+    FSM_FLUSH_INTERVAL
+)
+from utils.metrics import cache_evictions, cache_requests
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite с ограниченным LRU-кэшем сессий в памяти и пакетной записью"""
+
+    def __init__(
+        self,
+        filename: Path = FSM_STORAGE_FILE,
+        ttl: int = FSM_SESSION_TTL,
+        max_resident: int = FSM_MAX_RESIDENT
+    ):
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(exist_ok=True)
+        self.ttl = ttl
+        self.max_resident = max_resident
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # key -> (state, data); в памяти держим не больше max_resident сессий
+        self._resident: OrderedDict = OrderedDict()
+        # Измененные сессии ждут общей записи одной транзакцией вне цикла событий
+        self._dirty: Dict[str, tuple] = {}
+        self._flushing: Dict[str, tuple] = {}
+        # Соединение используют и цикл событий, и поток записи
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.filename, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+        """)
+        self.conn.commit()
+
+    def _load(self, key: str) -> tuple:
+        """Сессия из памяти или с диска; истекшие сессии считаются пустыми"""
+        session = self._resident.get(key)
+        if session is not None:
+            cache_requests.inc(cache='fsm', result='hit')
+            self._resident.move_to_end(key)
+            return session
+        cache_requests.inc(cache='fsm', result='miss')
+
+        # Вытесненная из памяти сессия могла еще не попасть на диск
+        session = self._dirty.get(key) or self._flushing.get(key)
+        if session is not None:
+            self._remember(key, session)
+            return session
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT state, data, updated_at FROM sessions WHERE key = ?", (key,)
+            ).fetchone()
+        if row and time.time() - row[2] < self.ttl:
+            session = (row[0], json.loads(row[1]))
+        else:
+            session = (None, {})
+        self._remember(key, session)
+        return session
+
+    def _remember(self, key: str, session: tuple) -> None:
+        self._resident[key] = session
+        self._resident.move_to_end(key)
+        while len(self._resident) > self.max_resident:
+            self._resident.popitem(last=False)
+            cache_evictions.inc(cache='fsm')
+
+    def _store(self, key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._remember(key, (state, data))
+        self._dirty[key] = (state, data)
+
+    def _write(self, sessions: Dict[str, tuple]) -> None:
+        """Запись измененных сессий одной транзакцией"""
+        now = time.time()
+        with self._lock:
+            for key, (state, data) in sessions.items():
+                if state is None and not data:
+                    self.conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+                else:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO sessions (key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+                        (key, state, json.dumps(data, ensure_ascii=False), now)
+                    )
+            self.conn.commit()
+
+    async def flush(self) -> None:
+        """Сброс измененных сессий на диск в отдельном потоке"""
+        if not self._dirty:
+            return
+        self._flushing, self._dirty = self._dirty, {}
+        try:
+            await asyncio.to_thread(self._write, self._flushing)
+        except Exception as e:
+            logger.error(f"Ошибка записи FSM-сессий: {e}")
+            with self._lock:
+                self.conn.rollback()
+            # Более новые изменения тех же сессий остаются, остальные запишутся в следующий раз
+            for key, session in self._flushing.items():
+                self._dirty.setdefault(key, session)
+        finally:
+            self._flushing = {}
+
+    async def flush_periodically(self, interval: float = FSM_FLUSH_INTERVAL) -> None:
+        """Фоновая запись измененных сессий"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        _, data = self._load(storage_key)
+        self._store(storage_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(self.key_builder.build(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        state, _ = self._load(storage_key)
+        self._store(storage_key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._load(self.key_builder.build(key))[1].copy()
+
+    def evict_expired(self) -> int:
+        """Удаление сессий, неактивных дольше TTL"""
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                row[0] for row in
+                self.conn.execute("SELECT key FROM sessions WHERE updated_at < ?", (deadline,))
+            ]
+            self.conn.execute("DELETE FROM sessions WHERE updated_at < ?", (deadline,))
+            self.conn.commit()
+        for key in expired:
+            self._resident.pop(key, None)
+        return len(expired)
+
+    async def evict_periodically(self, interval: float = 600) -> None:
+        """Фоновая очистка неактивных сессий"""
+        while True:
+            await asyncio.sleep(interval)
+            removed = self.evict_expired()
+            if removed:
+                logger.info(f"Удалено неактивных FSM-сессий: {removed}")
+
+    async def close(self) -> None:
+        await self.flush()
+        self.conn.close()
+
+
+def create_fsm_storage(backend: str = FSM_STORAGE) -> BaseStorage:
+    """Создание FSM-хранилища выбранного в настройках типа"""
+    if backend == 'sqlite':
+        return SQLiteStorage()
+    if backend == 'redis':
+        # Опциональная зависимость: нужна только для общего хранилища нескольких воркеров
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(FSM_REDIS_URL, state_ttl=FSM_SESSION_TTL, data_ttl=FSM_SESSION_TTL)
+    if backend == 'memory':
+        return MemoryStorage()
+    raise ValueError(f"Неизвестное FSM-хранилище: {backend}")
@@ -0,0 +1,329 @@
+import json
+import time
+import zlib
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.settings import (
+    GENRE_CACHE_FILE,
+    GENRE_CACHE_TTL,
+    GENRE_CACHE_MAX_AGE,
+    GENRE_CACHE_MEMORY_BYTES,
+    GENRE_CACHE_DISK_BYTES
+)
+from utils.metrics import cache_evictions, cache_requests, genre_cache_bytes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    genre TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_genre ON entries (genre);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed);
+-- Номера очисток по жанрам: по ним другие процессы узнают, что их память устарела
+CREATE TABLE IF NOT EXISTS generations (
+    genre TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+-- Число и объем записей поддерживаются триггерами, чтобы не считать SUM по всей таблице при записи
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals (id, entries, size) SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM entries;
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET size = size + NEW.size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, size = size - OLD.size;
+END;
+"""
+
+# INSERT OR REPLACE удаляет старую строку без триггера удаления, поэтому запись - через upsert
+UPSERT = (
+    "INSERT INTO entries (key, genre, data, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET genre = excluded.genre, data = excluded.data, size = excluded.size, "
+    "created = excluded.created, accessed = excluded.accessed"
+)
+
+# Самые давно читанные страницы, кроме переданных JSON-списком ключей
+TRIM = (
+    "DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+    "WHERE key NOT IN (SELECT value FROM json_each(?)) ORDER BY accessed LIMIT ?)"
+)
+
+# Ключ в generations для очистки всего кэша (пустым жанр быть не может)
+ALL = ''
+
+
+def genre_of(key: str) -> str:
+    """Жанр (или поисковый запрос), к которому относится ключ страницы"""
+    return key.split('@', 1)[0]
+
+
+class GenreCache:
+    """Кэш страниц жанров: LRU в памяти поверх сжатого SQLite-файла, оба уровня ограничены по байтам"""
+
+    def __init__(
+        self,
+        filename: Path = GENRE_CACHE_FILE,
+        ttl: int = GENRE_CACHE_TTL,
+        max_age: int = GENRE_CACHE_MAX_AGE,
+        memory_bytes: int = GENRE_CACHE_MEMORY_BYTES,
+        disk_bytes: int = GENRE_CACHE_DISK_BYTES
+    ):
+        self.filename = Path(filename)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        # key -> (книги, время создания, размер в байтах)
+        self._memory: OrderedDict = OrderedDict()
+        self._memory_size = 0
+        # Подписчики на страницы в памяти: (ключ, книги) при записи, (ключ, None) при вытеснении
+        self._listeners: List[Callable[[str, Optional[List[Dict]]], None]] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        # Запись на диск идет в отдельном потоке; соединение используется под блокировкой
+        self._lock = threading.Lock()
+        # Время чтения страниц, которое еще не перенесено на диск: пишется вместе со следующей записью
+        self._touched: Dict[str, float] = {}
+        # Последние увиденные номера очисток и версия файла, при которой они прочитаны
+        self._generations: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Файл открывается при первом обращении, чтобы путь можно было поменять до старта
+        if self._conn is None:
+            self.filename.parent.mkdir(exist_ok=True)
+            self._conn = sqlite3.connect(self.filename, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._generations = self._read_generations()
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._write_touched()
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    def subscribe(self, listener: Callable[[str, Optional[List[Dict]]], None]) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self, key: str, books: Optional[List[Dict]]) -> None:
+        for listener in self._listeners:
+            listener(key, books)
+
+    def _read_generations(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT genre, value FROM generations"))
+
+    def _totals(self) -> Tuple[int, int]:
+        return self.conn.execute("SELECT entries, size FROM totals").fetchone()
+
+    def _write_touched(self) -> None:
+        if self._touched:
+            self.conn.executemany(
+                "UPDATE entries SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _sync(self) -> None:
+        """Сброс страниц в памяти, которые очистил другой процесс (режим нескольких воркеров)"""
+        with self._lock:
+            # data_version меняется только после записи из другого соединения - обычно это одно сравнение
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+            generations = self._read_generations()
+        changed = {
+            genre for genre in generations.keys() | self._generations.keys()
+            if generations.get(genre) != self._generations.get(genre)
+        }
+        self._generations = generations
+        for key in [key for key in self._memory if ALL in changed or genre_of(key) in changed]:
+            self._forget(key)
+        genre_cache_bytes.set(self._memory_size, tier='memory')
+
+    def _bump_generation(self, genre: str) -> None:
+        """Отметка об очистке для других процессов"""
+        self.conn.execute(
+            "INSERT INTO generations (genre, value) VALUES (?, 1) "
+            "ON CONFLICT (genre) DO UPDATE SET value = value + 1",
+            (genre,)
+        )
+        self._generations[genre] = self._generations.get(genre, 0) + 1
+
+    def _remember(self, key: str, books: List[Dict], created: float, size: int) -> None:
+        """Запись в память с вытеснением давно не читанных страниц сверх бюджета"""
+        self._forget(key)
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = (books, created, size)
+        self._memory_size += size
+        self._notify(key, books)
+        while self._memory_size > self.memory_bytes:
+            evicted_key = next(iter(self._memory))
+            self._forget(evicted_key)
+            # Чтения из памяти не трогают диск; время доступа переносится туда при вытеснении,
+            # чтобы дисковый уровень не удалял страницы, которые только что были популярны
+            self._touch(evicted_key)
+            cache_evictions.inc(cache='genre_memory')
+        genre_cache_bytes.set(self._memory_size, tier='memory')
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            self._touched[key] = time.time()
+
+    def _forget(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= entry[2]
+            self._notify(key, None)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[List[Dict], float, int]]:
+        with self._lock:
+            row = self.conn.execute("SELECT data, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        payload = zlib.decompress(row[0])
+        return json.loads(payload), row[1], len(payload)
+
+    def get_entry(self, key: str) -> Optional[Tuple[List[Dict], bool]]:
+        """Книги страницы и признак свежести; записи старше max_age считаются отсутствующими"""
+        now = time.time()
+        self._sync()
+        entry = self._memory.get(key)
+        if entry is not None and now - entry[1] < self.ttl:
+            self._memory.move_to_end(key)
+            cache_requests.inc(cache='genre_memory', result='hit')
+            return entry[0], True
+
+        # Устаревшую страницу в памяти мог уже обновить другой воркер - сверяемся с диском
+        with self._lock:
+            row = self.conn.execute("SELECT created FROM entries WHERE key = ?", (key,)).fetchone()
+        if entry is not None and row is not None and row[0] == entry[1] and now - entry[1] < self.max_age:
+            # На диске та же версия: распаковывать ее незачем
+            self._memory.move_to_end(key)
+            cache_requests.inc(cache='genre_memory', result='stale')
+            return entry[0], False
+        cache_requests.inc(cache='genre_memory', result='miss')
+
+        disk = self._read_disk(key) if row is not None and now - row[0] < self.max_age else None
+        if disk is None:
+            cache_requests.inc(cache='genre_disk', result='miss')
+            if row is not None:
+                self.invalidate_key(key)
+                cache_evictions.inc(cache='genre_expired')
+            return None
+        cache_requests.inc(cache='genre_disk', result='hit')
+        books, created, size = disk
+        self._remember(key, books, created, size)
+        # Время чтения уйдет на диск со следующей записью, без отдельной фиксации
+        self._touch(key)
+        return books, now - created < self.ttl
+
+    async def put(self, key: str, books: List[Dict]) -> None:
+        """Запись страницы в оба уровня; сериализация, сжатие и запись на диск - в отдельном потоке"""
+        now = time.time()
+        size = await asyncio.to_thread(self._write, key, books, now, list(self._memory))
+        self._remember(key, books, now, size)
+
+    def _write(self, key: str, books: List[Dict], now: float, resident: List[str]) -> int:
+        payload = json.dumps(books, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        data = zlib.compress(payload)
+        with self._lock:
+            self._write_touched()
+            self.conn.execute(UPSERT, (key, genre_of(key), data, len(data), now, now))
+            self._trim_disk(resident)
+            self.conn.commit()
+        return len(payload)
+
+    def _trim_disk(self, resident: List[str]) -> None:
+        """Удаление давно не читанных страниц, пока файл не уложится в бюджет"""
+        entries, total = self._totals()
+        # Страницы, которые сейчас в памяти, читаются оттуда и удаляются с диска последними
+        protected = json.dumps(resident)
+        while total > self.disk_bytes and entries:
+            # Сколько страниц удалить, оценивается по среднему размеру записи
+            count = -(-(total - self.disk_bytes) * entries // total)
+            deleted = self.conn.execute(TRIM, (protected, count)).rowcount
+            if not deleted:
+                if protected == '[]':
+                    break
+                protected = '[]'
+                continue
+            cache_evictions.inc(deleted, cache='genre_disk')
+            entries, total = self._totals()
+        genre_cache_bytes.set(total, tier='disk')
+
+    def age(self, key: str) -> Optional[float]:
+        """Возраст страницы в секундах"""
+        self._sync()
+        entry = self._memory.get(key)
+        if entry is not None:
+            return time.time() - entry[1]
+        with self._lock:
+            row = self.conn.execute("SELECT created FROM entries WHERE key = ?", (key,)).fetchone()
+        return time.time() - row[0] if row else None
+
+    def invalidate_key(self, key: str) -> None:
+        self._forget(key)
+        with self._lock:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def invalidate_genre(self, genre: str) -> int:
+        """Удаление всех страниц жанра; возвращает число удаленных записей"""
+        for key in [key for key in self._memory if genre_of(key) == genre]:
+            self._forget(key)
+        with self._lock:
+            cursor = self.conn.execute("DELETE FROM entries WHERE genre = ?", (genre,))
+            self._bump_generation(genre)
+            self.conn.commit()
+        genre_cache_bytes.set(self._memory_size, tier='memory')
+        return cursor.rowcount
+
+    def clear(self) -> int:
+        """Полная очистка обоих уровней"""
+        for key in list(self._memory):
+            self._forget(key)
+        with self._lock:
+            cursor = self.conn.execute("DELETE FROM entries")
+            self._bump_generation(ALL)
+            self.conn.commit()
+        genre_cache_bytes.set(0, tier='memory')
+        genre_cache_bytes.set(0, tier='disk')
+        return cursor.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._totals()
+        return {
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_size,
+            'disk_entries': entries,
+            'disk_bytes': size
+        }
+
+
+genre_cache = GenreCache()
@@ -1,4 +1,40 @@
-from .database import JSONDatabase
-from .api_client import get_books
+from .database import JSONDatabase, Database, create_database
+from .sqlite_database import SQLiteDatabase
+from .api_client import get_books, search_books
+from .books import Book, book_store
+from .cursor import GenreCursor, ListCursor
+from .search_index import SearchIndex, search_index
+from .fsm_storage import SQLiteStorage, create_fsm_storage
+from .sender import SendScheduler, send_scheduler, bulk_sends
+from .backup import BackupManager, backup_manager
+from .genre_cache import GenreCache, genre_cache
+from .broadcast import Broadcaster, broadcaster
+from .recommendations import CoFavoritesIndex, co_favorites
 
-__all__ = ['JSONDatabase', 'get_books']
\ No newline at end of file
+__all__ = [
+    'JSONDatabase',
+    'SQLiteDatabase',
+    'Database',
+    'create_database',
+    'get_books',
+    'search_books',
+    'Book',
+    'book_store',
+    'GenreCursor',
+    'ListCursor',
+    'SearchIndex',
+    'search_index',
+    'SQLiteStorage',
+    'create_fsm_storage',
+    'SendScheduler',
+    'send_scheduler',
+    'bulk_sends',
+    'BackupManager',
+    'backup_manager',
+    'GenreCache',
+    'genre_cache',
+    'Broadcaster',
+    'broadcaster',
+    'CoFavoritesIndex',
+    'co_favorites'
+]
\ No newline at end of file
@@ -0,0 +1,65 @@
+import random
+import asyncio
+import logging
+from typing import Dict
+
+from config.settings import (
+    GENRES,
+    GENRE_CACHE_TTL,
+    GENRE_REFRESH_MARGIN,
+    GENRE_REFRESH_JITTER,
+    GENRE_WARM_CONCURRENCY
+)
+from services.api_client import refresh_genre
+from services.database import Database
+from services.genre_cache import genre_cache
+
+logger = logging.getLogger(__name__)
+
+
+class GenreWarmer:
+    """Прогрев кэша всех жанров при старте и обновление незадолго до истечения TTL"""
+
+    def __init__(
+        self,
+        db: Database,
+        concurrency: int = GENRE_WARM_CONCURRENCY,
+        margin: int = GENRE_REFRESH_MARGIN,
+        jitter: int = GENRE_REFRESH_JITTER,
+        min_interval: float = 60
+    ):
+        self.db = db
+        self.margin = margin
+        self.jitter = jitter
+        self.min_interval = min_interval
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Случайный сдвиг на жанр, чтобы обновления не приходили одной пачкой
+        self._jitter: Dict[str, float] = {}
+
+    def _due_in(self, genre: str) -> float:
+        """Через сколько секунд жанр нужно обновить (0 - уже пора)"""
+        age = genre_cache.age(genre)
+        if age is None:
+            return 0
+        jitter = self._jitter.setdefault(genre, random.uniform(0, self.jitter))
+        return max(0.0, GENRE_CACHE_TTL - self.margin - jitter - age)
+
+    async def _refresh(self, genre: str) -> None:
+        async with self._semaphore:
+            books = await refresh_genre(GENRES[genre], genre, self.db)
+        self._jitter.pop(genre, None)
+        if books:
+            logger.info(f"Кэш жанра {genre} обновлен: {len(books)} книг")
+
+    async def refresh_due(self) -> None:
+        """Обновление всех жанров, у которых подошел срок"""
+        due = [genre for genre in GENRES if self._due_in(genre) <= 0]
+        await asyncio.gather(*(self._refresh(genre) for genre in due))
+
+    async def run(self) -> None:
+        # При старте прогреваются отсутствующие и почти истекшие жанры
+        await self.refresh_due()
+        while True:
+            delay = min(self._due_in(genre) for genre in GENRES)
+            await asyncio.sleep(max(delay, self.min_interval))
+            await self.refresh_due()
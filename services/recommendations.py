@@ -0,0 +1,149 @@
+import time
+import heapq
+import asyncio
+import logging
+from collections import defaultdict
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple, Union
+
+from config.settings import RECOMMENDATIONS_TOP_K, RECOMMENDATIONS_USER_WINDOW, RECOMMENDATIONS_SYNC_INTERVAL
+from services.database import Database
+from services.sqlite_database import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class CoFavoritesIndex:
+    """Индекс совместного избранного: для каждой книги заранее посчитан топ соседей"""
+
+    def __init__(self, top_k: int = RECOMMENDATIONS_TOP_K, user_window: int = RECOMMENDATIONS_USER_WINDOW):
+        self.top_k = top_k
+        self.user_window = user_window
+        # book_id -> book_id соседа -> сколько пользователей сохранили обе книги
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(dict)
+        # book_id -> [(book_id соседа, число пользователей)] по убыванию, не длиннее top_k
+        self._top: Dict[str, List[Tuple[str, int]]] = {}
+        # Записи избранного (название, автор, обложка) для показа соседей
+        self._books: Dict[str, Dict] = {}
+        self.pairs = 0
+        # Новое избранное, пришедшее во время полной перестройки; None - перестройка не идет
+        self._pending: Optional[List[Tuple[str, List[Dict]]]] = None
+
+    def __len__(self) -> int:
+        return len(self._top)
+
+    @property
+    def rebuilding(self) -> bool:
+        return self._pending is not None
+
+    def _record(self, books: List[Dict], position: int, update_top: bool = True) -> None:
+        """Учет книги books[position] вместе с предыдущими книгами пользователя в пределах окна"""
+        book = books[position]
+        book_id = book['book_id']
+        self._books[book_id] = book
+        for other in books[max(0, position - self.user_window):position]:
+            other_id = other['book_id']
+            if other_id == book_id:
+                continue
+            # Во время перестройки индекс пуст, и соседи могли еще не попасть в _books
+            self._books.setdefault(other_id, other)
+            for a, b in ((book_id, other_id), (other_id, book_id)):
+                count = self._counts[a].get(b, 0) + 1
+                self._counts[a][b] = count
+                if update_top:
+                    self._update_top(a, b, count)
+            if count == 1:
+                self.pairs += 1
+
+    def _update_top(self, book_id: str, neighbour: str, count: int) -> None:
+        """Поддержка топа соседей за O(top_k): счетчики только растут, поэтому топ остается точным"""
+        top = self._top.setdefault(book_id, [])
+        for index, (current, _) in enumerate(top):
+            if current == neighbour:
+                top[index] = (neighbour, count)
+                break
+        else:
+            if len(top) < self.top_k:
+                top.append((neighbour, count))
+            elif count > top[-1][1]:
+                top[-1] = (neighbour, count)
+            else:
+                return
+        top.sort(key=itemgetter(1), reverse=True)
+
+    def add_favorite(self, user_id: Union[int, str], books: List[Dict]) -> None:
+        """Инкрементальное обновление: последняя книга списка только что добавлена в избранное"""
+        if not books:
+            return
+        self._record(books, len(books) - 1)
+        if self._pending is not None:
+            # Копия: список избранного JSON-хранилища может пополниться до конца перестройки
+            self._pending.append((str(user_id), list(books)))
+
+    def record_favorite(self, db: Database, user_id: Union[int, str]) -> None:
+        """Учет нового избранного пользователя: из хранилища читается только окно последних книг"""
+        total = db.count_favorites(user_id)
+        self.add_favorite(user_id, db.get_favorites(user_id, offset=max(0, total - self.user_window - 1)))
+
+    async def follow_workers(
+        self,
+        db: SQLiteDatabase,
+        index: int,
+        count: int,
+        interval: float = RECOMMENDATIONS_SYNC_INTERVAL
+    ) -> None:
+        """Режим воркеров: подхват избранного пользователей других процессов из общего файла"""
+        # Пользователь живет в одном воркере, поэтому свое избранное уже учтено при добавлении
+        last = db.last_favorite_rowid()
+        while True:
+            await asyncio.sleep(interval)
+            while rows := db.get_new_favorites(last):
+                for rowid, user_id in rows:
+                    if int(user_id) % count != index:
+                        self.add_favorite(user_id, db.get_favorites_until(user_id, rowid, self.user_window + 1))
+                last = rows[-1][0]
+
+    def recommend(self, book_id: str) -> List[Tuple[Dict, int]]:
+        """Книги, которые чаще всего сохраняли вместе с данной, и число таких пользователей"""
+        return [
+            (self._books[neighbour], count)
+            for neighbour, count in self._top.get(book_id, ())
+            if neighbour in self._books
+        ]
+
+    def _build(self, favorites: Dict[str, List[Dict]]) -> 'CoFavoritesIndex':
+        """Полный подсчет по выгрузке избранного (выполняется в отдельном потоке)"""
+        index = CoFavoritesIndex(self.top_k, self.user_window)
+        for books in favorites.values():
+            for position in range(len(books)):
+                index._record(books, position, update_top=False)
+        index._top = {
+            book_id: heapq.nlargest(self.top_k, neighbours.items(), key=itemgetter(1))
+            for book_id, neighbours in index._counts.items()
+        }
+        return index
+
+    async def rebuild(self, db: Database) -> Optional[Dict]:
+        """Перестройка индекса по всему избранному в хранилище; None, если она уже идет"""
+        if self._pending is not None:
+            return None
+        self._pending = []
+        started = time.perf_counter()
+        try:
+            favorites = await db.export_favorites()
+            index = await asyncio.to_thread(self._build, favorites)
+        finally:
+            pending, self._pending = self._pending, None
+
+        self._counts, self._top, self._books, self.pairs = index._counts, index._top, index._books, index.pairs
+        for user_id, books in pending:
+            # Избранное, которое уже попало в выгрузку, второй раз не учитывается
+            if not any(book['book_id'] == books[-1]['book_id'] for book in favorites.get(user_id, ())):
+                self._record(books, len(books) - 1)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Индекс рекомендаций перестроен: книг {len(self)}, пар {self.pairs}, {elapsed:.2f} с")
+        return {'books': len(self), 'pairs': self.pairs, 'elapsed': elapsed}
+
+
+co_favorites = CoFavoritesIndex()
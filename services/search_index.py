@@ -0,0 +1,88 @@
+import re
+import bisect
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from services.books import Book, book_store
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _strip_accents(char: str) -> str:
+    """Диакритика снимается только вне кириллицы: й - отдельная буква, а не и с кратким"""
+    if char.isascii() or '\u0400' <= char <= '\u04ff':
+        return char
+    return ''.join(part for part in unicodedata.normalize('NFKD', char) if not unicodedata.combining(part))
+
+
+def normalize(text: str) -> List[str]:
+    """Токены в нижнем регистре без диакритики у латиницы; ё и е не различаются"""
+    text = unicodedata.normalize('NFC', text.casefold()).replace('ё', 'е')
+    text = ''.join(map(_strip_accents, text))
+    return [token for token in TOKEN_RE.findall(text) if len(token) > 1]
+
+
+class SearchIndex:
+    """Инвертированный индекс по названиям и авторам книг из памяти кэша жанров"""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        # book_id -> токены книги, чтобы убрать ее из индекса вместе со страницей
+        self._indexed: Dict[str, List[str]] = {}
+        # Отсортированный словарь для поиска по префиксу, перестраивается лениво
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._indexed)
+
+    def add_books(self, books: Iterable[Book]) -> None:
+        """Инкрементальное добавление новых книг в индекс"""
+        for book in books:
+            if book.id in self._indexed:
+                continue
+            tokens = self._indexed[book.id] = normalize(' '.join([book.title or '', *book.authors]))
+            for token in tokens:
+                if token not in self._postings:
+                    self._vocabulary_dirty = True
+                self._postings[token].add(book.id)
+
+    def remove_books(self, books: Iterable[Book]) -> None:
+        """Удаление книг, вытесненных из памяти кэша"""
+        for book in books:
+            for token in self._indexed.pop(book.id, ()):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.discard(book.id)
+                if not postings:
+                    del self._postings[token]
+                    self._vocabulary_dirty = True
+
+    def _expand(self, token: str) -> Set[str]:
+        """Книги по точному совпадению токена или по префиксу"""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        result: Set[str] = set()
+        start = bisect.bisect_left(self._vocabulary, token)
+        for word in self._vocabulary[start:]:
+            if not word.startswith(token):
+                break
+            result |= self._postings[word]
+        return result
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """id книг, отсортированные по числу совпавших слов запроса"""
+        scores: Dict[str, int] = defaultdict(int)
+        for token in set(normalize(query)):
+            for book_id in self._expand(token):
+                scores[book_id] += 1
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        return [book_id for book_id, _ in ranked[:limit]]
+
+
+search_index = SearchIndex()
+# Индекс повторяет общее хранилище: книги добавляются и удаляются вместе со страницами кэша
+book_store.subscribe(search_index.add_books, search_index.remove_books)
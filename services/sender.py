@@ -0,0 +1,260 @@
+import time
+import asyncio
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from config.settings import (
+    SEND_GLOBAL_RATE,
+    SEND_CHAT_RATE,
+    SEND_CHAT_BURST,
+    SEND_WORKERS,
+    SEND_MAX_RETRIES,
+    SEND_GLOBAL_FLOOD_CHATS,
+    SEND_GLOBAL_FLOOD_WINDOW
+)
+from utils.metrics import send_queue_depth, telegram_send_latency, telegram_sends
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - раньше
+INTERACTIVE = 0
+BULK = 1
+
+send_priority: ContextVar[int] = ContextVar('send_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def bulk_sends():
+    """Отправки внутри блока уступают очередь интерактивным ответам"""
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Сколько ждать до следующего токена"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Блокировка на время flood wait от Telegram"""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    chat_id: Any = field(compare=False)
+    make_request: NextRequestMiddlewareType = field(compare=False)
+    bot: Any = field(compare=False)
+    method: TelegramMethod = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued: float = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Центральная очередь исходящих сообщений с ограничением скорости"""
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: int = SEND_CHAT_BURST,
+        workers: int = SEND_WORKERS,
+        max_retries: int = SEND_MAX_RETRIES,
+        flood_chats: int = SEND_GLOBAL_FLOOD_CHATS,
+        flood_window: float = SEND_GLOBAL_FLOOD_WINDOW
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.flood_chats = flood_chats
+        self.flood_window = flood_window
+        self._chats: Dict[Any, TokenBucket] = {}
+        # Время последнего flood wait по чатам, только за окно flood_window
+        self._flood_waits: Dict[Any, float] = {}
+        # Задачи, отложенные до освобождения корзины чата, по порядковому номеру
+        self._delayed: Dict[int, _Job] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers_count = workers
+        self._workers = []
+        self._seq = itertools.count()
+        send_queue_depth.set_function(lambda: self.queue_depth)
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Отправители неотправленных сообщений получают отмену, а не ждут ответа вечно
+        pending = list(self._delayed.values())
+        self._delayed.clear()
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for job in pending:
+            job.future.cancel()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def stats(self) -> Dict:
+        """Сводка по очереди из общего реестра метрик"""
+        return {
+            'queue_depth': self.queue_depth,
+            'sent': telegram_sends.value(result='sent'),
+            'failed': telegram_sends.value(result='failed'),
+            'retried': telegram_sends.value(result='retried'),
+            'latency_avg': telegram_send_latency.average(),
+            'latency_max': telegram_send_latency.maximum(),
+        }
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        chat_id = getattr(method, 'chat_id', None)
+        # Методы без чата (getUpdates, answerCallbackQuery...) идут в обход очереди
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Job(
+            send_priority.get(), next(self._seq), chat_id, make_request,
+            bot, method, future, time.monotonic()
+        ))
+        return await future
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                # Полные корзины неактивных чатов можно забыть
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _requeue_later(self, job: _Job, delay: float) -> None:
+        self._delayed[job.seq] = job
+        asyncio.get_running_loop().call_later(delay, self._requeue, job)
+
+    def _requeue(self, job: _Job) -> None:
+        # После close() отложенная задача уже отменена и в очередь не возвращается
+        if self._delayed.pop(job.seq, None) is not None:
+            self._queue.put_nowait(job)
+
+    def _global_flood(self, chat_id) -> bool:
+        """Учет flood wait чата; True, если за окно их получили уже несколько разных чатов"""
+        now = time.monotonic()
+        self._flood_waits[chat_id] = now
+        self._flood_waits = {
+            chat: at for chat, at in self._flood_waits.items() if now - at < self.flood_window
+        }
+        return len(self._flood_waits) >= self.flood_chats
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                # Остановка планировщика посреди отправки
+                job.future.cancel()
+                raise
+
+    async def _process(self, job: _Job) -> None:
+        if job.future.done():
+            return
+
+        chat = self._chat_bucket(job.chat_id)
+        chat_wait = chat.wait_time()
+        if chat_wait > 0:
+            # Воркер не простаивает ради одного чата: задача вернется в очередь позже
+            self._requeue_later(job, chat_wait)
+            return
+
+        # После сна токен мог забрать другой воркер - корзина проверяется заново
+        while (global_wait := self.global_bucket.wait_time()) > 0:
+            await asyncio.sleep(global_wait)
+        chat_wait = chat.wait_time()
+        if chat_wait > 0:
+            self._requeue_later(job, chat_wait)
+            return
+        self.global_bucket.consume()
+        chat.consume()
+
+        try:
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            # Flood wait одного чата не задерживает ответы другим пользователям
+            chat.block(e.retry_after)
+            if self._global_flood(job.chat_id):
+                logger.warning(f"Flood wait сразу в нескольких чатах - пауза {e.retry_after} с для всех отправок")
+                self.global_bucket.block(e.retry_after)
+            job.attempts += 1
+            if job.attempts <= self.max_retries:
+                telegram_sends.inc(result='retried')
+                logger.warning(f"Flood wait {e.retry_after} с для чата {job.chat_id}, повтор {job.attempts}")
+                self._requeue_later(job, e.retry_after)
+                return
+            self._finish(job, error=e)
+        except Exception as e:
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+
+    def _finish(self, job: _Job, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if error is None:
+            telegram_sends.inc(result='sent')
+            telegram_send_latency.observe(time.monotonic() - job.enqueued)
+        else:
+            telegram_sends.inc(result='failed')
+        if job.future.done():
+            return
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+
+send_scheduler = SendScheduler()
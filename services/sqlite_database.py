@@ -0,0 +1,313 @@
+import json
+import sqlite3
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from config.settings import DATA_FILE, SQLITE_FILE, LANGUAGES, STORAGE_FLUSH_INTERVAL
+from services.books import Book
+from utils.metrics import storage_flush_duration
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    language TEXT NOT NULL DEFAULT 'ru',
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS favorites (
+    user_id TEXT NOT NULL,
+    book_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    cover_url TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (user_id, book_id)
+);
+CREATE INDEX IF NOT EXISTS idx_favorites_user ON favorites (user_id);
+-- Кэш жанров перенесен в отдельный файл (services/genre_cache.py)
+DROP TABLE IF EXISTS cache;
+CREATE TABLE IF NOT EXISTS covers (
+    book_id TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO stats (key, value) VALUES ('total_users', 0), ('total_favorites', 0);
+"""
+
+
+class SQLiteDatabase:
+    def __init__(self, filename: str = SQLITE_FILE, shared: bool = False):
+        self.filename = Path(filename)
+        # Файл используют несколько процессов: изменения фиксируются сразу, без накопления
+        self.shared = shared
+        self.filename.parent.mkdir(exist_ok=True)
+        self.conn = sqlite3.connect(self.filename, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Базы, созданные до появления рассылок, не содержат колонки active
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(users)")}
+        if 'active' not in columns:
+            self.conn.execute("ALTER TABLE users ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+        self.conn.commit()
+
+    def _bump_stat(self, key: str, delta: int = 1) -> None:
+        self.conn.execute("UPDATE stats SET value = value + ? WHERE key = ?", (delta, key))
+
+    def _written(self) -> None:
+        """Фиксация записи в общем режиме, чтобы не держать блокировку до периодического сброса"""
+        if self.shared:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Фиксация накопленной транзакции"""
+        try:
+            with storage_flush_duration.time(backend='sqlite'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка фиксации транзакции: {e}")
+            return False
+
+    async def flush_periodically(self, interval: float = STORAGE_FLUSH_INTERVAL) -> None:
+        """Фоновая фиксация накопленных изменений"""
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    def close(self) -> None:
+        """Фиксация изменений и закрытие соединения"""
+        self.flush()
+        self.conn.close()
+
+    def add_user(self, user_id: Union[int, str], language: str = 'ru') -> bool:
+        """Добавление пользователя; вернувшийся пользователь снова получает рассылки"""
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, language) VALUES (?, ?)",
+            (str(user_id), language)
+        )
+        if cursor.rowcount:
+            self._bump_stat('total_users')
+            self._written()
+            return True
+        if self.conn.execute(
+            "UPDATE users SET active = 1 WHERE user_id = ? AND active = 0", (str(user_id),)
+        ).rowcount:
+            self._written()
+        return False
+
+    def set_user_active(self, user_id: Union[int, str], active: bool) -> bool:
+        """Пометка пользователя, заблокировавшего бота (active=False)"""
+        cursor = self.conn.execute(
+            "UPDATE users SET active = ? WHERE user_id = ?", (int(active), str(user_id))
+        )
+        self._written()
+        return cursor.rowcount > 0
+
+    def get_active_user_ids(self, after: str = '', limit: int = 500) -> List[str]:
+        """Порция активных пользователей с id больше after, по возрастанию id"""
+        rows = self.conn.execute(
+            "SELECT user_id FROM users WHERE user_id > ? AND active = 1 ORDER BY user_id LIMIT ?",
+            (after, limit)
+        )
+        return [row['user_id'] for row in rows]
+
+    def count_active_users(self) -> int:
+        """Количество пользователей, не заблокировавших бота"""
+        return self.conn.execute("SELECT COUNT(*) FROM users WHERE active = 1").fetchone()[0]
+
+    def get_user_language(self, user_id: Union[int, str]) -> str:
+        """Получение языка пользователя"""
+        row = self.conn.execute(
+            "SELECT language FROM users WHERE user_id = ?", (str(user_id),)
+        ).fetchone()
+        return row['language'] if row else 'ru'
+
+    def set_user_language(self, user_id: Union[int, str], language: str) -> bool:
+        """Установка языка пользователя"""
+        cursor = self.conn.execute(
+            "UPDATE users SET language = ? WHERE user_id = ?", (language, str(user_id))
+        )
+        self._written()
+        return cursor.rowcount > 0
+
+    def add_to_favorites(self, user_id: Union[int, str], book: Book) -> bool:
+        """Добавление книги в избранное"""
+        try:
+            user_id = str(user_id)
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO favorites (user_id, book_id, title, author, cover_url) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    user_id,
+                    book.id,
+                    book.title or 'Без названия',
+                    ', '.join(book.authors or [LANGUAGES['ru']['book_author'].format('Неизвестен')]),
+                    book.thumbnail
+                )
+            )
+            # Дубликат отсекается первичным ключом (user_id, book_id)
+            if cursor.rowcount:
+                self._bump_stat('total_favorites')
+                self._written()
+                logger.info(f"Книга добавлена в избранное для user_id {user_id}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении в избранное: {e}")
+            return False
+
+    def get_favorites(self, user_id: Union[int, str], offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Получение избранных книг пользователя (страницей offset/limit)"""
+        rows = self.conn.execute(
+            "SELECT book_id, title, author, cover_url FROM favorites "
+            "WHERE user_id = ? ORDER BY rowid LIMIT ? OFFSET ?",
+            (str(user_id), -1 if limit is None else limit, offset)
+        )
+        return [dict(row) for row in rows]
+
+    def get_new_favorites(self, after: int, limit: int = 500) -> List[Tuple[int, str]]:
+        """Записи избранного всех пользователей с rowid больше after: (rowid, user_id) по возрастанию"""
+        return [tuple(row) for row in self.conn.execute(
+            "SELECT rowid, user_id FROM favorites WHERE rowid > ? ORDER BY rowid LIMIT ?", (after, limit)
+        )]
+
+    def last_favorite_rowid(self) -> int:
+        return self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM favorites").fetchone()[0]
+
+    def get_favorites_until(self, user_id: Union[int, str], rowid: int, limit: int) -> List[Dict]:
+        """Последние limit книг избранного пользователя до записи rowid включительно, по порядку"""
+        rows = self.conn.execute(
+            "SELECT book_id, title, author, cover_url FROM favorites "
+            "WHERE user_id = ? AND rowid <= ? ORDER BY rowid DESC LIMIT ?",
+            (str(user_id), rowid, limit)
+        )
+        return [dict(row) for row in rows][::-1]
+
+    def count_favorites(self, user_id: Union[int, str]) -> int:
+        """Количество избранных книг пользователя"""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM favorites WHERE user_id = ?", (str(user_id),)
+        ).fetchone()[0]
+
+    def get_cover_file_id(self, book_id: str) -> Optional[str]:
+        """Telegram file_id обложки, если она уже отправлялась"""
+        row = self.conn.execute("SELECT file_id FROM covers WHERE book_id = ?", (book_id,)).fetchone()
+        return row['file_id'] if row else None
+
+    def set_cover_file_id(self, book_id: str, file_id: Optional[str]) -> bool:
+        """Сохранение (или сброс при None) file_id обложки"""
+        if file_id:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO covers (book_id, file_id) VALUES (?, ?)", (book_id, file_id)
+            )
+        else:
+            self.conn.execute("DELETE FROM covers WHERE book_id = ?", (book_id,))
+        self._written()
+        return True
+
+    def get_stats(self) -> Dict:
+        """Получение статистики"""
+        return {row['key']: row['value'] for row in self.conn.execute("SELECT key, value FROM stats")}
+
+    @staticmethod
+    def _read_favorites(conn: sqlite3.Connection) -> Dict[str, List[Dict]]:
+        favorites = {}
+        for user_id, book_id, title, author, cover_url in conn.execute(
+            "SELECT user_id, book_id, title, author, cover_url FROM favorites ORDER BY rowid"
+        ):
+            favorites.setdefault(user_id, []).append(
+                {'book_id': book_id, 'title': title, 'author': author, 'cover_url': cover_url}
+            )
+        return favorites
+
+    def _export(self) -> Dict:
+        """Чтение данных отдельным соединением, одной читающей транзакцией"""
+        conn = sqlite3.connect(self.filename)
+        try:
+            with conn:
+                users = {
+                    user_id: {'language': language} if active else {'language': language, 'active': False}
+                    for user_id, language, active in conn.execute("SELECT user_id, language, active FROM users")
+                }
+                favorites = self._read_favorites(conn)
+                covers = dict(conn.execute("SELECT book_id, file_id FROM covers"))
+                stats = dict(conn.execute("SELECT key, value FROM stats"))
+        finally:
+            conn.close()
+        return {'users': users, 'favorites': favorites, 'covers': covers, 'stats': stats}
+
+    async def export_data(self) -> Dict:
+        """Копия данных для резервного копирования"""
+        # Накопленная транзакция фиксируется, чтобы ее увидело отдельное соединение
+        self.flush()
+        return await asyncio.to_thread(self._export)
+
+    async def export_favorites(self) -> Dict[str, List[Dict]]:
+        """Избранное всех пользователей без остальных таблиц (для индекса рекомендаций)"""
+        self.flush()
+        return await asyncio.to_thread(self._export_favorites)
+
+    def _export_favorites(self) -> Dict[str, List[Dict]]:
+        conn = sqlite3.connect(self.filename)
+        try:
+            return self._read_favorites(conn)
+        finally:
+            conn.close()
+
+    def import_data(self, data: Dict) -> Dict:
+        """Загрузка данных в формате books_data.json"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO users (user_id, language, active) VALUES (?, ?, ?)",
+                (
+                    (user_id, user.get('language', 'ru'), int(user.get('active', True)))
+                    for user_id, user in data.get('users', {}).items()
+                )
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO favorites (user_id, book_id, title, author, cover_url) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    (user_id, b['book_id'], b['title'], b['author'], b.get('cover_url') or '')
+                    for user_id, books in data.get('favorites', {}).items()
+                    for b in books
+                )
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO covers (book_id, file_id) VALUES (?, ?)",
+                data.get('covers', {}).items()
+            )
+            # Счетчики пересчитываются один раз по факту импорта
+            self.conn.execute(
+                "UPDATE stats SET value = (SELECT COUNT(*) FROM users) WHERE key = 'total_users'"
+            )
+            self.conn.execute(
+                "UPDATE stats SET value = (SELECT COUNT(*) FROM favorites) WHERE key = 'total_favorites'"
+            )
+        return self.get_stats()
+
+    def migrate_from_json(self, json_file: Union[str, Path] = DATA_FILE) -> Dict:
+        """Однократный импорт данных из books_data.json"""
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return self.import_data(data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Импорт books_data.json в SQLite")
+    parser.add_argument('source', nargs='?', default=str(DATA_FILE))
+    parser.add_argument('target', nargs='?', default=str(SQLITE_FILE))
+    args = parser.parse_args()
+
+    db = SQLiteDatabase(args.target)
+    stats = db.migrate_from_json(args.source)
+    db.close()
+    print(f"Импорт завершен: {stats}")
@@ -0,0 +1,4 @@
+from aiogram.fsm.state import State, StatesGroup
+
+class AdminStates(StatesGroup):
+    waiting_for_broadcast_text = State()
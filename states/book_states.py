@@ -2,4 +2,5 @@ from aiogram.fsm.state import State, StatesGroup
 
 class BookStates(StatesGroup):
     waiting_for_book_choice = State()
-    waiting_for_genre = State()
\ No newline at end of file
+    waiting_for_genre = State()
+    waiting_for_search_query = State()
\ No newline at end of file
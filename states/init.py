@@ -1,3 +1,4 @@
 from .book_states import BookStates
+from .admin_states import AdminStates
 
-__all__ = ['BookStates']
\ No newline at end of file
+__all__ = ['BookStates', 'AdminStates']
\ No newline at end of file
@@ -0,0 +1,46 @@
+import asyncio
+
+from services.books import BookStore
+from services.cursor import ListCursor
+from services.genre_cache import GenreCache, genre_cache
+from services.search_index import SearchIndex
+
+
+def page(*ids):
+    return [{'id': book_id, 'title': f'Title {book_id}', 'authors': ['Author']} for book_id in ids]
+
+
+def test_books_leave_with_pages_evicted_from_memory(tmp_path):
+    cache, store, index = GenreCache(tmp_path / 'cache.sqlite', memory_bytes=200), BookStore(), SearchIndex()
+    cache.subscribe(store.on_page)
+    store.subscribe(index.add_books, index.remove_books)
+
+    asyncio.run(cache.put('Fantasy', page('a', 'b')))
+    asyncio.run(cache.put('History', page('b', 'c')))
+    assert cache.stats()['memory_entries'] == 1
+    # Книга b осталась на странице History, a ушла вместе с Fantasy
+    assert store.get('a') is None and store.get('b') is not None
+    assert len(store) == len(index) == 2
+    assert index.search('title') and 'a' not in index.search('title')
+
+    # Страница с диска возвращает книги и в хранилище, и в индекс
+    cache.get_entry('Fantasy')
+    assert store.page('Fantasy')[0] is store.get('a')
+    assert 'a' in index.search('title a')
+
+    cache.clear()
+    assert len(store) == len(index) == 0
+    assert index.search('title') == []
+
+
+def test_list_cursor_reloads_evicted_books(tmp_path, monkeypatch):
+    monkeypatch.setattr(genre_cache, 'filename', tmp_path / 'cache.sqlite')
+    monkeypatch.setattr(genre_cache, '_conn', None)
+    asyncio.run(genre_cache.put('results:title', page('a', 'b')))
+    genre_cache._forget('results:title')
+
+    cursor = ListCursor(['a', 'b'], key='results:title')
+    book = asyncio.run(cursor.current(None))
+    assert book is not None and book.id == 'a'
+    genre_cache.clear()
+    genre_cache.close()
@@ -0,0 +1,109 @@
+import asyncio
+
+from services.broadcast import Broadcaster
+from services.database import JSONDatabase
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+
+class FailingDatabase(JSONDatabase):
+    """Хранилище, которое падает на второй порции получателей"""
+
+    calls = 0
+
+    def get_active_user_ids(self, after='', limit=500):
+        self.calls += 1
+        if self.calls == 2:
+            raise RuntimeError("database is locked")
+        return super().get_active_user_ids(after, limit)
+
+
+def make_db(tmp_path, cls=JSONDatabase, users=10):
+    db = cls(tmp_path / 'data.json', journal=False)
+    for user_id in range(1, users + 1):
+        db.add_user(user_id)
+    return db
+
+
+def test_failed_broadcast_can_be_resumed(tmp_path):
+    db = make_db(tmp_path, FailingDatabase)
+    bot = FakeBot()
+    broadcaster = Broadcaster(tmp_path / 'broadcast.json', chunk_size=4)
+
+    async def scenario():
+        assert broadcaster.start(bot, db, 'hello', 1)
+        await broadcaster._task
+        assert broadcaster.state['status'] == 'failed'
+        assert broadcaster.processed == 4
+        assert broadcaster.resume(bot, db)
+        await broadcaster._task
+
+    asyncio.run(scenario())
+
+    assert broadcaster.state['status'] == 'done'
+    assert broadcaster.state['sent'] == 10
+    # Администратору ушли сообщения об ошибке и о завершении
+    assert sorted(bot.sent) == sorted([*range(1, 11), 1, 1])
+
+
+def test_cancel_clears_broadcast_without_task(tmp_path):
+    db = make_db(tmp_path)
+    broadcaster = Broadcaster(tmp_path / 'broadcast.json')
+    broadcaster.state = {
+        'text': 'hello', 'admin_chat_id': 1, 'status': 'running', 'cursor': '5',
+        'total': 10, 'sent': 5, 'blocked': 0, 'failed': 0, 'started': ''
+    }
+    broadcaster._save()
+
+    assert asyncio.run(broadcaster.cancel())
+    assert Broadcaster(tmp_path / 'broadcast.json').state['status'] == 'cancelled'
+    assert not asyncio.run(broadcaster.cancel())
+
+    async def start():
+        started = broadcaster.start(FakeBot(), db, 'next', 1)
+        await broadcaster._task
+        return started
+
+    assert asyncio.run(start())
+    assert broadcaster.state['status'] == 'done'
+
+
+def test_cancel_from_another_process(tmp_path):
+    db = make_db(tmp_path, users=20)
+    bot = FakeBot()
+    owner = Broadcaster(tmp_path / 'broadcast.json', chunk_size=5)
+    other = Broadcaster(tmp_path / 'broadcast.json')
+
+    async def scenario():
+        owner.start(bot, db, 'hello', 1)
+        await asyncio.sleep(0)
+        assert await other.cancel()
+        await owner._task
+
+    asyncio.run(scenario())
+
+    assert owner.state['status'] == 'cancelled'
+    assert owner.processed == 5
+    assert Broadcaster(tmp_path / 'broadcast.json').state['status'] == 'cancelled'
+
+
+def test_progress_save_does_not_overwrite_cancel(tmp_path):
+    owner = Broadcaster(tmp_path / 'broadcast.json')
+    owner.state = {
+        'text': 'hello', 'admin_chat_id': 1, 'status': 'running', 'cursor': '',
+        'total': 10, 'sent': 0, 'blocked': 0, 'failed': 0, 'started': '2024-01-01T00:00:00'
+    }
+    assert owner._save()
+
+    # Отмена из другого процесса пришла уже после проверки в конце порции
+    assert asyncio.run(Broadcaster(tmp_path / 'broadcast.json').cancel())
+    owner.state['sent'] = 5
+    assert not owner._save()
+    assert owner.state['status'] == 'cancelled'
+    assert Broadcaster(tmp_path / 'broadcast.json').state['sent'] == 0
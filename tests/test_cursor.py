@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from config.settings import GENRES, GENRE_MAX_PAGES, GENRE_PAGE_SIZE
+from services import cursor as cursor_module
+from services.books import Book
+from services.cursor import GenreCursor
+
+GENRE = next(iter(GENRES))
+
+
+def books(*ids):
+    return [Book(book_id, book_id, (), '', None, None) for book_id in ids]
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    """Страницы жанра по номеру вместо кэша и Google Books"""
+    pages = {}
+
+    async def get_books(genre_query, genre_name, db, start_index=0):
+        return pages.get(start_index // GENRE_PAGE_SIZE)
+
+    monkeypatch.setattr(cursor_module, 'get_books', get_books)
+    monkeypatch.setattr(cursor_module, 'prefetch_books', lambda *args: None)
+    return pages
+
+
+def walk(cursor, steps):
+    async def scenario():
+        return [(await cursor.advance(None)).id for _ in range(steps)]
+    return asyncio.run(scenario())
+
+
+def test_cursor_moves_through_pages_and_wraps_around(pages):
+    pages.update({0: books('a', 'b'), 1: books('c')})
+    assert walk(GenreCursor(GENRE), 4) == ['b', 'c', 'a', 'b']
+
+
+def test_page_emptied_by_dedup_is_skipped(pages):
+    pages.update({0: books('a'), 1: [], 2: books('c')})
+    cursor = GenreCursor(GENRE)
+    assert walk(cursor, 1) == ['c']
+    assert cursor.page == 2
+
+
+def test_cursor_follows_shown_book_after_page_refresh(pages):
+    pages[0] = books('a', 'b', 'c')
+    cursor = GenreCursor(GENRE, offset=1)
+    assert asyncio.run(cursor.current(None)).id == 'b'
+
+    # Фоновое обновление поменяло порядок книг на странице
+    pages[0] = books('b', 'c', 'a')
+    assert asyncio.run(cursor.current(None)).id == 'b'
+    assert cursor.offset == 0
+    assert walk(cursor, 1) == ['c']
+
+    # Показанной книги на странице больше нет - действие не выполняется над чужой книгой
+    pages[0] = books('a', 'b')
+    assert asyncio.run(cursor.current(None)) is None
+
+
+def test_exhausted_genre_restarts_from_first_page(pages):
+    pages[0] = books('a', 'b')
+    cursor = GenreCursor(GENRE, page=0, offset=1)
+    assert walk(cursor, 1) == ['a']
+    assert cursor.page == 0 and GENRE_MAX_PAGES > 1
@@ -0,0 +1,101 @@
+from services.books import Book
+from services.database import JSONDatabase
+
+
+def test_active_user_ids_are_paged_in_id_order(tmp_path):
+    db = JSONDatabase(tmp_path / 'data.json', journal=False)
+    for user_id in (30, 4, 125, 7, 1000, 56):
+        db.add_user(user_id)
+    db.set_user_active(7, False)
+
+    assert db.get_active_user_ids('', 3) == ['1000', '125', '30']
+    assert db.get_active_user_ids('30', 3) == ['4', '56']
+
+    # Порядок восстанавливается из сохраненных данных и поддерживается для новых пользователей
+    db.flush()
+    reloaded = JSONDatabase(tmp_path / 'data.json', journal=False)
+    reloaded.add_user(5)
+    reloaded.add_user(7)
+    assert reloaded.get_active_user_ids('4', 10) == ['5', '56', '7']
+
+
+def book(book_id):
+    return Book(book_id, f'Title {book_id}', ('Author',), '', None, None)
+
+
+def test_journal_is_replayed_on_open(tmp_path):
+    db = JSONDatabase(tmp_path / 'data.json', journal=True)
+    db.add_user(1, 'en')
+    db.add_to_favorites(1, book('a'))
+    db.close()
+    assert not (tmp_path / 'data.json').exists()
+
+    reloaded = JSONDatabase(tmp_path / 'data.json', journal=True)
+    assert reloaded.get_user_language(1) == 'en'
+    assert [b['book_id'] for b in reloaded.get_favorites(1)] == ['a']
+    reloaded.close()
+
+
+def test_torn_journal_tail_does_not_swallow_next_record(tmp_path):
+    db = JSONDatabase(tmp_path / 'data.json', journal=True)
+    db.add_user(1)
+    db.close()
+    # Аварийная остановка посреди записи оставила половину строки
+    with open(tmp_path / 'data.log', 'ab') as f:
+        f.write(b'{"op":"add_user","args":["2",')
+
+    db = JSONDatabase(tmp_path / 'data.json', journal=True)
+    db.add_user(3)
+    db.close()
+
+    reloaded = JSONDatabase(tmp_path / 'data.json', journal=True)
+    assert reloaded.get_active_user_ids('', 10) == ['1', '3']
+    reloaded.close()
+
+
+def test_compaction_writes_snapshot_and_rotates_journal(tmp_path):
+    db = JSONDatabase(tmp_path / 'data.json', journal=True, compact_size=200)
+    for user_id in range(1, 6):
+        db.add_user(user_id)
+        db.flush()
+    db.add_to_favorites(5, book('a'))
+    db.close()
+
+    assert (tmp_path / 'data.json').exists()
+    assert not (tmp_path / 'data.log.old').exists()
+    # После сжатия журнал содержит только записи, сделанные позже снимка
+    assert (tmp_path / 'data.log').stat().st_size < 200
+
+    reloaded = JSONDatabase(tmp_path / 'data.json', journal=True)
+    assert reloaded.get_stats()['total_users'] == 5
+    assert [b['book_id'] for b in reloaded.get_favorites(5)] == ['a']
+    reloaded.close()
+
+
+class BrokenFile:
+    """Файл журнала, запись в который обрывается ошибкой (например, кончилось место)"""
+
+    def write(self, data):
+        raise OSError(28, 'No space left on device')
+
+    def close(self):
+        pass
+
+
+def test_failed_flush_keeps_batch_for_next_flush(tmp_path):
+    db = JSONDatabase(tmp_path / 'data.json', journal=True)
+    db.add_user(1)
+    db.flush()
+    db.add_user(2)
+    db._journal_fh.close()
+    db._journal_fh = BrokenFile()
+    assert not db.flush()
+
+    # Журнал открыт заново, и пачка уходит при следующем сбросе
+    db.add_user(3)
+    assert db.flush()
+    db.close()
+
+    reloaded = JSONDatabase(tmp_path / 'data.json', journal=True)
+    assert reloaded.get_active_user_ids('', 10) == ['1', '2', '3']
+    reloaded.close()
@@ -0,0 +1,32 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from services.fsm_storage import SQLiteStorage
+
+
+def key(user_id):
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_sessions_are_written_in_batches(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(tmp_path / 'fsm.sqlite', max_resident=1)
+        for user_id in (1, 2, 3):
+            await storage.set_state(key(user_id), 'waiting')
+        await storage.set_data(key(1), {'page': 2})
+        assert storage.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0
+        # Вытесненная из памяти сессия до записи читается из очереди изменений
+        assert await storage.get_data(key(1)) == {'page': 2}
+
+        await storage.flush()
+        assert storage.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 3
+        await storage.set_state(key(2), None)
+        await storage.close()
+
+        reopened = SQLiteStorage(tmp_path / 'fsm.sqlite')
+        assert await reopened.get_state(key(1)) == 'waiting'
+        assert await reopened.get_state(key(2)) is None
+        await reopened.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import asyncio
+
+from services.genre_cache import GenreCache
+
+
+def test_invalidation_reaches_memory_of_other_workers(tmp_path):
+    # Два экземпляра с отдельными соединениями к одному файлу - как два воркера
+    worker, admin = GenreCache(tmp_path / 'cache.sqlite'), GenreCache(tmp_path / 'cache.sqlite')
+    asyncio.run(worker.put('Fantasy', [{'id': 'a'}]))
+    asyncio.run(worker.put('History', [{'id': 'b'}]))
+    assert worker.get_entry('Fantasy') == ([{'id': 'a'}], True)
+
+    admin.invalidate_genre('Fantasy')
+    assert worker.get_entry('Fantasy') is None
+    assert worker.get_entry('History') == ([{'id': 'b'}], True)
+
+    admin.clear()
+    assert worker.get_entry('History') is None
+    assert worker.stats()['memory_entries'] == 0
+
+
+def test_disk_tier_stays_within_budget_and_keeps_resident_pages(tmp_path):
+    cache = GenreCache(tmp_path / 'cache.sqlite', disk_bytes=2000, memory_bytes=400)
+    for index in range(40):
+        asyncio.run(cache.put(f'Genre{index}', [{'id': f'{index}-{n}', 'title': 'x' * 50} for n in range(3)]))
+
+    entries, size = cache.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+    # Итоги из триггеров совпадают с таблицей, а файл укладывается в бюджет
+    assert cache.stats()['disk_entries'] == entries and cache.stats()['disk_bytes'] == size
+    assert 0 < size <= 2000
+    # Последние страницы в памяти есть и на диске
+    resident = list(cache._memory)
+    assert resident and all(cache.age(key) is not None for key in resident)
+
+    cache.clear()
+    assert cache.stats()['disk_entries'] == cache.stats()['disk_bytes'] == 0
+
+
+def test_stale_memory_page_is_not_read_from_disk_again(tmp_path, monkeypatch):
+    cache = GenreCache(tmp_path / 'cache.sqlite', ttl=0)
+    asyncio.run(cache.put('Fantasy', [{'id': 'a'}]))
+
+    def read_disk(key):
+        raise AssertionError('страница на диске не изменилась')
+
+    monkeypatch.setattr(cache, '_read_disk', read_disk)
+    assert cache.get_entry('Fantasy') == ([{'id': 'a'}], False)
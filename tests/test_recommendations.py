@@ -0,0 +1,71 @@
+import asyncio
+
+from services.books import Book
+from services.recommendations import CoFavoritesIndex
+from services.sqlite_database import SQLiteDatabase
+
+
+def favorite(book_id):
+    return {'book_id': book_id, 'title': book_id, 'author': 'A', 'cover_url': ''}
+
+
+class FavoritesDB:
+    """Хранилище с одним методом, который читает перестройка индекса"""
+
+    def __init__(self, favorites):
+        self.favorites = favorites
+
+    async def export_favorites(self):
+        return {user_id: list(books) for user_id, books in self.favorites.items()}
+
+
+def test_recommend_during_rebuild():
+    index = CoFavoritesIndex()
+    index._pending = []
+    index.add_favorite(1, [favorite('A'), favorite('B')])
+
+    assert index.recommend('B') == [(favorite('A'), 1)]
+    assert index.recommend('A') == [(favorite('B'), 1)]
+
+
+def test_favorite_added_during_rebuild_is_kept():
+    db = FavoritesDB({'1': [favorite('A'), favorite('B')]})
+    index = CoFavoritesIndex()
+
+    async def scenario():
+        rebuild = asyncio.create_task(index.rebuild(db))
+        await asyncio.sleep(0)
+        assert index.rebuilding
+        # Избранное, добавленное после выгрузки, но до замены индекса
+        db.favorites['2'] = [favorite('A'), favorite('C')]
+        index.add_favorite('2', db.favorites['2'])
+        assert index.recommend('C') == [(favorite('A'), 1)]
+        await rebuild
+
+    asyncio.run(scenario())
+
+    assert not index.rebuilding
+    assert [book['book_id'] for book, _ in index.recommend('A')] == ['B', 'C']
+    assert index.recommend('C') == [(favorite('A'), 1)]
+    assert index.pairs == 2
+
+
+def test_worker_picks_up_favorites_of_other_workers(tmp_path):
+    # Два воркера с общим файлом: пользователь 1 живет в воркере 1, индекс смотрим у воркера 0
+    own, other = (SQLiteDatabase(tmp_path / 'books.sqlite', shared=True) for _ in range(2))
+    index = CoFavoritesIndex()
+
+    async def scenario():
+        follower = asyncio.create_task(index.follow_workers(own, 0, 2, interval=0.01))
+        await asyncio.sleep(0)
+        for book_id in ('A', 'B', 'C'):
+            other.add_to_favorites(1, Book(book_id, book_id, ('A',), '', None, None))
+        # Свой пользователь уже учтен при добавлении и повторно не считается
+        own.add_to_favorites(2, Book('A', 'A', ('A',), '', None, None))
+        own.add_to_favorites(2, Book('B', 'B', ('A',), '', None, None))
+        await asyncio.sleep(0.05)
+        follower.cancel()
+
+    asyncio.run(scenario())
+    assert index.recommend('C') == [(favorite('A'), 1), (favorite('B'), 1)]
+    assert dict((book['book_id'], count) for book, count in index.recommend('A')) == {'B': 1, 'C': 1}
@@ -0,0 +1,36 @@
+from services.books import Book
+from services.search_index import SearchIndex, normalize
+
+
+def book(book_id, title, *authors):
+    return Book(book_id, title, authors, '', None, None)
+
+
+def test_normalize_folds_case_accents_and_yo():
+    assert normalize('Les Misérables, Victor HUGO') == ['les', 'miserables', 'victor', 'hugo']
+    assert normalize('Ёжик в тумане') == ['ежик', 'тумане']
+    # Кириллица не теряет букву й, однобуквенные токены отбрасываются
+    assert normalize('Мой край') == ['мой', 'край']
+    assert normalize('A b c') == []
+
+
+def test_prefix_search_ranks_by_matched_words():
+    index = SearchIndex()
+    index.add_books([
+        book('1', 'War and Peace', 'Leo Tolstoy'),
+        book('2', 'The Art of War', 'Sun Tzu'),
+        book('3', 'Анна Каренина', 'Лев Толстой'),
+        book('4', 'Les Misérables', 'Victor Hugo'),
+    ])
+
+    assert sorted(index.search('war')) == ['1', '2']
+    # Книга, совпавшая с обоими словами запроса, идет первой
+    assert index.search('war tolst') == ['1', '2']
+    assert index.search('толст') == ['3']
+    assert index.search('MISÉR') == ['4']
+    assert index.search('war', limit=1) in (['1'], ['2'])
+
+    index.remove_books([book('1', 'War and Peace', 'Leo Tolstoy')])
+    assert index.search('war') == ['2']
+    assert index.search('tolst') == []
+    assert len(index) == 3
@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+
+from services.sender import SendScheduler, TokenBucket, bulk_sends
+
+
+def test_token_bucket_refills_and_blocks():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.wait_time() == 0
+    bucket.consume()
+    bucket.consume()
+    assert 0 < bucket.wait_time() <= 0.1
+    bucket.block(1)
+    assert bucket.wait_time() > 1
+
+
+def test_interactive_replies_go_before_bulk():
+    async def scenario():
+        scheduler = SendScheduler(global_rate=1000, workers=1)
+        order = []
+
+        async def make_request(bot, method):
+            order.append(method.chat_id)
+
+        def send(chat_id):
+            return asyncio.create_task(scheduler(make_request, None, SimpleNamespace(chat_id=chat_id)))
+
+        with bulk_sends():
+            bulk = [send(chat_id) for chat_id in (1, 2, 3)]
+        interactive = send(4)
+        await asyncio.gather(*bulk, interactive)
+        await scheduler.close()
+        return order
+
+    assert asyncio.run(scenario()) == [4, 1, 2, 3]
+
+
+def test_flood_wait_of_one_chat_does_not_stop_other_chats():
+    async def scenario():
+        scheduler = SendScheduler(global_rate=1000, max_retries=0, flood_chats=3)
+
+        async def make_request(bot, method):
+            raise TelegramRetryAfter(method, 'Too Many Requests', 10)
+
+        for chat_id in (1, 2):
+            with pytest.raises(TelegramRetryAfter):
+                await scheduler(make_request, None, SimpleNamespace(chat_id=chat_id))
+            assert scheduler._chats[chat_id].wait_time() > 0
+            assert scheduler.global_bucket.wait_time() == 0
+
+        # Третий чат подряд - это уже общий лимит бота
+        with pytest.raises(TelegramRetryAfter):
+            await scheduler(make_request, None, SimpleNamespace(chat_id=3))
+        assert scheduler.global_bucket.wait_time() > 0
+        await scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_cancels_queued_sends():
+    async def scenario():
+        # Меньше одного токена в секунду: первая отправка ждет глобальную корзину, вторая - в очереди
+        scheduler = SendScheduler(global_rate=0.01, workers=1)
+
+        async def make_request(bot, method):
+            return True
+
+        sends = [
+            asyncio.create_task(scheduler(make_request, None, SimpleNamespace(chat_id=chat_id)))
+            for chat_id in (1, 2)
+        ]
+        await asyncio.sleep(0.01)
+        await scheduler.close()
+        return await asyncio.gather(*sends, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
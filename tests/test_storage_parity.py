@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from services.books import Book
+from services.database import JSONDatabase
+from services.sqlite_database import SQLiteDatabase
+
+
+def book(book_id, thumbnail='https://example.com/cover.jpg'):
+    return Book(book_id, f'Title {book_id}', ('Author',), '', thumbnail, None)
+
+
+def open_db(backend, tmp_path):
+    if backend == 'json':
+        return JSONDatabase(tmp_path / 'data.json', journal=True)
+    return SQLiteDatabase(tmp_path / 'data.sqlite')
+
+
+def fill(db):
+    """Одинаковая последовательность операций для обоих хранилищ"""
+    results = [db.add_user(user_id, 'en' if user_id % 2 else 'ru') for user_id in (30, 4, 125, 7)]
+    results.append(db.add_user(4))
+    results.append(db.set_user_language(7, 'ru'))
+    results.append(db.set_user_active(125, False))
+    results += [db.add_to_favorites(4, book(book_id)) for book_id in ('a', 'b')]
+    results.append(db.add_to_favorites(4, book('c', thumbnail=None)))
+    results.append(db.add_to_favorites(4, book('a')))
+    results.append(db.add_to_favorites(30, book('b')))
+    results.append(db.set_cover_file_id('a', 'file-a'))
+    db.flush()
+    return results
+
+
+def read(db):
+    return {
+        'language': [db.get_user_language(user_id) for user_id in (30, 4, 125, 7, 999)],
+        'active': db.get_active_user_ids('', 10),
+        'active_after': db.get_active_user_ids('30', 10),
+        'count_active': db.count_active_users(),
+        'favorites': db.get_favorites(4),
+        'favorites_page': db.get_favorites(4, offset=1, limit=1),
+        'count_favorites': [db.count_favorites(user_id) for user_id in (4, 30, 7)],
+        'covers': [db.get_cover_file_id(book_id) for book_id in ('a', 'b')],
+        'stats': db.get_stats(),
+        'export': asyncio.run(db.export_data()),
+        'favorites_export': asyncio.run(db.export_favorites()),
+    }
+
+
+@pytest.fixture
+def results(tmp_path):
+    results = {}
+    for backend in ('json', 'sqlite'):
+        db = open_db(backend, tmp_path)
+        results[backend] = fill(db), read(db)
+        db.close()
+        # После перезапуска хранилище отдает те же данные
+        reopened = open_db(backend, tmp_path)
+        assert read(reopened) == results[backend][1]
+        reopened.close()
+    return results
+
+
+def test_backends_return_the_same_results(results):
+    assert results['json'][0] == results['sqlite'][0]
+    json_read, sqlite_read = results['json'][1], results['sqlite'][1]
+    for key in json_read:
+        assert json_read[key] == sqlite_read[key], key
+
+
+def test_json_data_migrates_to_sqlite_unchanged(tmp_path):
+    source = JSONDatabase(tmp_path / 'data.json', journal=False)
+    fill(source)
+    source.close()
+
+    target = SQLiteDatabase(tmp_path / 'data.sqlite')
+    target.migrate_from_json(tmp_path / 'data.json')
+    assert read(target) == read(JSONDatabase(tmp_path / 'data.json', journal=False))
+    target.close()
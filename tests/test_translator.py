@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+from utils import translator
+from utils.metrics import translate_duration
+
+
+def test_concurrent_translations_are_timed_once(tmp_path, monkeypatch):
+    calls = []
+
+    def translate(text, target_lang):
+        calls.append(text)
+        time.sleep(0.05)
+        return 'перевод'
+
+    monkeypatch.setattr(translator, '_translate', translate)
+    monkeypatch.setattr(translator, 'translation_cache', translator.TranslationCache(tmp_path / 'translations.json'))
+    before = translate_duration.count()
+
+    async def scenario():
+        return await asyncio.gather(*(translator.translate_description('A long enough description') for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ['перевод'] * 3
+    # Запрос к сервису один, и замер один - ожидание ведомых вызовов не попадает в гистограмму
+    assert len(calls) == 1
+    assert translate_duration.count() == before + 1
@@ -0,0 +1,82 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiohttp.test_utils import TestClient, TestServer
+
+import bot as bot_module
+from config.settings import WEBHOOK_PATH
+from services.database import JSONDatabase
+
+SECRET = 'test-secret'
+
+
+class RecordingSession(BaseSession):
+    """Сессия без сети: запросы к Bot API только запоминаются"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def start_update(update_id, user_id):
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Reader'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user,
+            'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+        }
+    }
+
+
+def test_webhook_feeds_updates_only_with_secret(tmp_path, monkeypatch):
+    async def no_services(*args):
+        return []
+
+    # Фоновые задачи бота (прогрев жанров, сброс хранилища) к приему обновлений не относятся
+    monkeypatch.setattr(bot_module, 'start_services', no_services)
+    monkeypatch.setattr(bot_module, 'stop_services', no_services)
+    monkeypatch.setattr(bot_module.broadcaster, 'resume', lambda *args: False)
+    monkeypatch.setattr(bot_module, 'WEBHOOK_SECRET', SECRET)
+
+    session = RecordingSession()
+    bot = Bot(token='42:TEST', session=session)
+    db = JSONDatabase(tmp_path / 'data.json', journal=False)
+    storage = MemoryStorage()
+    dp = bot_module.create_dispatcher(db, storage)
+    app = bot_module.create_webhook_app(bot, dp, db, storage)
+
+    async def scenario():
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(
+                WEBHOOK_PATH, json=start_update(1, 100),
+                headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}
+            )
+            assert response.status == 200
+
+            response = await client.post(
+                WEBHOOK_PATH, json=start_update(2, 200),
+                headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'}
+            )
+            assert response.status == 401
+
+    asyncio.run(scenario())
+
+    # Обработано только обновление с верным секретом
+    assert [method.chat_id for method in session.requests] == [100]
+    assert db.get_stats()['total_users'] == 1
@@ -1,4 +1,5 @@
 from .translator import translate_description
 from .logger import setup_logger
+from .texts import Texts, get_texts
 
-__all__ = ['translate_description', 'setup_logger']
\ No newline at end of file
+__all__ = ['translate_description', 'setup_logger', 'Texts', 'get_texts']
@@ -1,13 +1,115 @@
+import copy
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
+from contextvars import ContextVar
 from pathlib import Path
+from typing import Optional
 
+from config.settings import (
+    LOG_FILE,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_FORMAT,
+    LOG_MAX_BYTES,
+    LOG_ROTATE_WHEN,
+    LOG_BACKUP_COUNT
+)
 
-def setup_logger():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(Path(__file__).parent.parent / 'utils/bot.log'),
-            logging.StreamHandler()
-        ]
-    )
\ No newline at end of file
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONTEXT_FIELDS = ('update_id', 'user_id', 'handler')
+
+# Контекст текущего обновления, заполняется middleware
+update_id_var: ContextVar[Optional[int]] = ContextVar('update_id', default=None)
+user_id_var: ContextVar[Optional[int]] = ContextVar('user_id', default=None)
+handler_var: ContextVar[Optional[str]] = ContextVar('handler', default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Копирует контекст обновления в запись до того, как она уйдет в очередь"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.update_id = update_id_var.get()
+        record.user_id = user_id_var.get()
+        record.handler = handler_var.get()
+        return True
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """В очередь уходит готовый текст сообщения, а трассировка отдельно в exc_text"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _file_handler(filename: Path) -> logging.Handler:
+    if LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(
+            filename, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+
+
+def _apply_module_levels(levels: str) -> None:
+    """Разбор строки вида "module=LEVEL,other=LEVEL" """
+    for item in filter(None, (part.strip() for part in levels.split(','))):
+        name, _, level = item.partition('=')
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+def setup_logger(filename: Path = LOG_FILE) -> logging.handlers.QueueListener:
+    """Логи пишутся в очередь, а на диск и в консоль - в потоке QueueListener"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [_file_handler(filename), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL.upper())
+    _apply_module_levels(LOG_LEVELS)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Остаток очереди дописывается при выходе
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,272 @@
+import abc
+import time
+import bisect
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Строки значений метрики в текстовом формате Prometheus"""
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + ''.join(f"{line}\n" for line in self._samples())
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """Текущее значение; может вычисляться функцией в момент чтения"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {self._function()}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in self._values.items()
+        ]
+
+
+class _HistogramSeries:
+    __slots__ = ('buckets', 'sum', 'count', 'max')
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+
+class Histogram(_Metric):
+    """Распределение длительностей по корзинам"""
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(buckets)
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _HistogramSeries(len(self.bounds))
+        index = bisect.bisect_left(self.bounds, value)
+        if index < len(self.bounds):
+            series.buckets[index] += 1
+        series.sum += value
+        series.count += 1
+        series.max = max(series.max, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Замер длительности блока"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _merged(self) -> _HistogramSeries:
+        merged = _HistogramSeries(len(self.bounds))
+        for series in self._series.values():
+            merged.buckets = [a + b for a, b in zip(merged.buckets, series.buckets)]
+            merged.sum += series.sum
+            merged.count += series.count
+            merged.max = max(merged.max, series.max)
+        return merged
+
+    def count(self) -> int:
+        return sum(series.count for series in self._series.values())
+
+    def average(self) -> float:
+        merged = self._merged()
+        return merged.sum / merged.count if merged.count else 0.0
+
+    def maximum(self) -> float:
+        return self._merged().max
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по всем сериям: верхняя граница корзины"""
+        merged = self._merged()
+        if not merged.count:
+            return 0.0
+        rank = q * merged.count
+        seen = 0
+        for bound, count in zip(self.bounds, merged.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return merged.max
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds, series.buckets):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series.count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series.sum}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        return ''.join(metric.render() for metric in self._metrics.values())
+
+
+registry = MetricsRegistry()
+
+# Метрики горячих путей объявлены здесь, чтобы /metrics и админ-панель видели их все
+handler_duration = registry.histogram(
+    'bot_handler_duration_seconds', 'Время работы хендлеров', ('router', 'handler')
+)
+handler_errors = registry.counter(
+    'bot_handler_errors_total', 'Исключения в хендлерах', ('router', 'handler')
+)
+google_books_duration = registry.histogram(
+    'google_books_request_duration_seconds', 'Длительность запросов к Google Books'
+)
+google_books_requests = registry.counter(
+    'google_books_requests_total', 'Запросы к Google Books по результату', ('status',)
+)
+translate_duration = registry.histogram(
+    'translate_duration_seconds', 'Длительность перевода внешним сервисом'
+)
+storage_flush_duration = registry.histogram(
+    'storage_flush_duration_seconds', 'Длительность сброса хранилища на диск', ('backend',)
+)
+storage_compactions = registry.counter(
+    'storage_compactions_total', 'Сжатия журнала в снимок'
+)
+backup_duration = registry.histogram(
+    'backup_duration_seconds', 'Длительность резервного копирования', ('kind',)
+)
+cache_requests = registry.counter(
+    'cache_requests_total', 'Обращения к кэшам', ('cache', 'result')
+)
+cache_evictions = registry.counter(
+    'cache_evictions_total', 'Вытеснения из кэшей', ('cache',)
+)
+genre_cache_bytes = registry.gauge(
+    'genre_cache_bytes', 'Объем кэша жанров по уровням', ('tier',)
+)
+telegram_sends = registry.counter(
+    'telegram_sends_total', 'Исходящие запросы к Telegram по результату', ('result',)
+)
+telegram_send_latency = registry.histogram(
+    'telegram_send_latency_seconds', 'Время от постановки в очередь до ответа Telegram'
+)
+broadcast_messages = registry.counter(
+    'broadcast_messages_total', 'Сообщения рассылки по результату', ('result',)
+)
+send_queue_depth = registry.gauge(
+    'telegram_send_queue_depth', 'Длина очереди исходящих сообщений'
+)
+
+
+def hit_rate(cache: str) -> float:
+    """Доля ответов из кэша (включая устаревшие), в процентах"""
+    served = cache_requests.value(cache=cache, result='hit') + cache_requests.value(cache=cache, result='stale')
+    total = served + cache_requests.value(cache=cache, result='miss')
+    return 100 * served / total if total else 0.0
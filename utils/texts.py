@@ -0,0 +1,34 @@
+from typing import Dict
+
+from config.settings import LANGUAGES
+from services.books import Book
+
+DEFAULT_LANGUAGE = 'ru'
+
+
+class Texts:
+    """Тексты одного языка и готовые форматтеры подписей"""
+    __slots__ = ('lang', '_strings')
+
+    def __init__(self, lang: str):
+        self.lang = lang
+        self._strings = LANGUAGES[lang]
+
+    def __getitem__(self, key: str) -> str:
+        return self._strings[key]
+
+    def caption(self, title: str, author: str) -> str:
+        """Подпись книги: название и автор"""
+        return f"{self._strings['book_title'].format(title)}\n{self._strings['book_author'].format(author)}"
+
+    def book_caption(self, book: Book) -> str:
+        authors = ", ".join(book.authors) or self._strings["unknown_author"]
+        return self.caption(book.title or self._strings["no_title"], authors)
+
+
+# Один экземпляр на язык на весь процесс
+TEXTS: Dict[str, Texts] = {lang: Texts(lang) for lang in LANGUAGES}
+
+
+def get_texts(lang: str) -> Texts:
+    return TEXTS.get(lang, TEXTS[DEFAULT_LANGUAGE])
@@ -1,17 +1,147 @@
-from deep_translator import GoogleTranslator
+import os
+import json
+import time
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from deep_translator import GoogleTranslator
+
+from config.settings import (
+    TRANSLATE_MAX_CHARS,
+    TRANSLATION_CACHE_FILE,
+    TRANSLATION_CACHE_SIZE,
+    TRANSLATION_CACHE_TTL
+)
+from utils.metrics import cache_evictions, cache_requests, translate_duration
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """LRU-кэш переводов с TTL, ключ - хэш исходного текста"""
+
+    def __init__(
+        self,
+        filename: Path = TRANSLATION_CACHE_FILE,
+        max_size: int = TRANSLATION_CACHE_SIZE,
+        ttl: int = TRANSLATION_CACHE_TTL
+    ):
+        self.filename = Path(filename)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def make_key(text: str, target_lang: str) -> str:
+        return hashlib.sha256(f"{target_lang}:{text}".encode('utf-8')).hexdigest()
+
+    def _load(self) -> None:
+        """Загрузка кэша с диска"""
+        try:
+            if self.filename.exists():
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                now = time.time()
+                # Файл хранится в порядке LRU, просроченные записи отбрасываются
+                for key, (translated, created) in entries.items():
+                    if now - created < self.ttl:
+                        self._entries[key] = (translated, created)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки кэша переводов: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        translated, created = entry
+        if time.time() - created >= self.ttl:
+            del self._entries[key]
+            self._dirty = True
+            return None
+        self._entries.move_to_end(key)
+        return translated
+
+    def set(self, key: str, translated: str) -> None:
+        self._entries[key] = (translated, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            cache_evictions.inc(cache='translation')
+        self._dirty = True
+
+    def save(self) -> bool:
+        """Атомарное сохранение кэша на диск"""
+        if not self._dirty:
+            return True
+        self._dirty = False
+        payload = json.dumps(self._entries, ensure_ascii=False, separators=(',', ':'))
+        return self._write(payload)
+
+    def _write(self, payload: str) -> bool:
+        tmp = self.filename.with_suffix('.tmp')
+        try:
+            self.filename.parent.mkdir(exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp, self.filename)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша переводов: {e}")
+            return False
+
+    async def save_periodically(self, interval: float = 60) -> None:
+        """Фоновое сохранение кэша; запись на диск вынесена из event loop"""
+        while True:
+            await asyncio.sleep(interval)
+            if self._dirty:
+                self._dirty = False
+                payload = json.dumps(self._entries, ensure_ascii=False, separators=(',', ':'))
+                await asyncio.to_thread(self._write, payload)
+
+
+translation_cache = TranslationCache()
+_in_flight = SingleFlight()
+
+
+def _translate(text: str, target_lang: str) -> str:
+    return GoogleTranslator(source='auto', target=target_lang).translate(text)
+
+
+async def _translate_timed(text: str, target_lang: str) -> str:
+    """Перевод в пуле потоков; замеряется только сам запрос, без ожидания чужого перевода"""
+    with translate_duration.time():
+        return await asyncio.to_thread(_translate, text, target_lang)
+
+
 async def translate_description(text, target_lang='ru'):
     try:
         if not text or len(text) < 10:
             return None
-        
+
         if any(ord(char) > 127 for char in text[:100]):
             return None
-        
-        translated = GoogleTranslator(source='auto', target=target_lang).translate(text[:5000])
+
+        # Переводим только ту часть, которая показывается пользователю
+        text = text[:TRANSLATE_MAX_CHARS]
+        key = TranslationCache.make_key(text, target_lang)
+        cached = translation_cache.get(key)
+        if cached is not None:
+            cache_requests.inc(cache='translation', result='hit')
+            return cached
+        cache_requests.inc(cache='translation', result='miss')
+
+        # Синхронный клиент уходит в пул потоков; одинаковые тексты переводятся один раз
+        translated = await _in_flight.do(key, lambda: _translate_timed(text, target_lang))
+        if translated:
+            translation_cache.set(key, translated)
         return translated
     except Exception as e:
         logger.error(f"Ошибка перевода: {e}")
-        return None
\ No newline at end of file
+        return None